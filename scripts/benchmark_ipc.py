@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of worker IPC: round trip latency of commands and the rate
+of small messages, such as progress reports and log lines, comparing one
+pipe per message type to the framed and batched channel used by workers.
+Also times large array results, pickled through the connection or placed
+in shared memory.
+"""
+
+import argparse
+import math
+import multiprocessing as mp
+from multiprocessing import resource_tracker
+from statistics import median
+from time import perf_counter
+
+from itaxotools.decontaminator_gui.channel import SHARED_THRESHOLD, Channel, Kind
+from itaxotools.decontaminator_gui.threading_loop import ReportProgress
+
+
+def pipes_echo(commands, results):
+    while (message := commands.recv()) is not None:
+        results.send(message)
+
+
+def pipes_stream(results, reports, output, count):
+    for index in range(count):
+        reports.send(ReportProgress('Calculating', index, 0, count))
+        output.send((1, f'line {index}\n'))
+    results.send(None)
+
+
+def channel_echo(connection):
+    channel = Channel(connection)
+    while True:
+        for _, message in channel.receive():
+            if message is None:
+                return
+            channel.send(Kind.Result, message)
+
+
+def channel_stream(connection, count):
+    channel = Channel(connection)
+    channel.start()
+    for index in range(count):
+        channel.post(Kind.Progress, ReportProgress('Calculating', index, 0, count))
+        channel.post(Kind.Stdout, f'line {index}\n')
+    channel.send(Kind.Result, None)
+
+
+def channel_payload(connection, megabytes, threshold):
+    import numpy as np
+    channel = Channel(connection, threshold=threshold)
+    payload = np.random.default_rng(0).random(megabytes * (1 << 20) // 8)
+    channel.receive()
+    channel.send(Kind.Result, payload)
+    channel.receive()
+
+
+def transfer_payload(megabytes, threshold, repeats=5):
+    times = []
+    for _ in range(repeats):
+        connection, child = mp.Pipe(duplex=True)
+        process = mp.Process(target=channel_payload, args=(child, megabytes, threshold), daemon=True)
+        process.start()
+        channel = Channel(connection, threshold=threshold)
+        start = perf_counter()
+        channel.send(Kind.Command, None)
+        channel.receive()
+        times.append(perf_counter() - start)
+        channel.send(Kind.Command, None)
+        process.join()
+    return min(times)
+
+
+def round_trips_pipes(rounds):
+    child_commands, commands = mp.Pipe(duplex=False)
+    results, child_results = mp.Pipe(duplex=False)
+    process = mp.Process(target=pipes_echo, args=(child_commands, child_results), daemon=True)
+    process.start()
+    times = []
+    for index in range(rounds):
+        start = perf_counter()
+        commands.send(index)
+        results.recv()
+        times.append(perf_counter() - start)
+    commands.send(None)
+    process.join()
+    return times
+
+
+def round_trips_channel(rounds):
+    connection, child = mp.Pipe(duplex=True)
+    process = mp.Process(target=channel_echo, args=(child,), daemon=True)
+    process.start()
+    channel = Channel(connection)
+    times = []
+    for index in range(rounds):
+        start = perf_counter()
+        channel.send(Kind.Command, index)
+        channel.receive()
+        times.append(perf_counter() - start)
+    channel.send(Kind.Command, None)
+    process.join()
+    return times
+
+
+def stream_pipes(count):
+    results, child_results = mp.Pipe(duplex=False)
+    reports, child_reports = mp.Pipe(duplex=False)
+    output, child_output = mp.Pipe(duplex=False)
+    process = mp.Process(target=pipes_stream, args=(child_results, child_reports, child_output, count), daemon=True)
+    start = perf_counter()
+    process.start()
+    received = 0
+    waiting = [results, reports, output]
+    done = False
+    while not done:
+        for connection in mp.connection.wait(waiting):
+            while connection.poll():
+                message = connection.recv()
+                if connection is results:
+                    done = True
+                else:
+                    received += 1
+    for connection in (reports, output):
+        while connection.poll():
+            connection.recv()
+            received += 1
+    elapsed = perf_counter() - start
+    process.join()
+    return received, elapsed
+
+
+def stream_channel(count):
+    connection, child = mp.Pipe(duplex=True)
+    process = mp.Process(target=channel_stream, args=(child, count), daemon=True)
+    start = perf_counter()
+    process.start()
+    channel = Channel(connection)
+    received = 0
+    done = False
+    while not done:
+        for kind, _ in channel.receive():
+            if kind == Kind.Result:
+                done = True
+            else:
+                received += 1
+    elapsed = perf_counter() - start
+    process.join()
+    return received, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-r', '--rounds', type=int, default=2000, help='command round trips')
+    parser.add_argument('-m', '--messages', type=int, default=100000, help='progress reports and log lines, each')
+    parser.add_argument('-p', '--payload', type=int, default=256, help='size of array results in MiB, 0 to skip')
+    args = parser.parse_args()
+
+    print(f'{"transport":<10}{"median RTT":>14}{"p99 RTT":>12}{"messages/s":>14}')
+    for name, round_trips, stream in [
+        ('pipes', round_trips_pipes, stream_pipes),
+        ('channel', round_trips_channel, stream_channel),
+    ]:
+        times = sorted(round_trips(args.rounds))
+        received, elapsed = stream(args.messages)
+        p99 = times[int(len(times) * 0.99) - 1]
+        print(
+            f'{name:<10}'
+            f'{median(times) * 1e6:>11.1f} us'
+            f'{p99 * 1e6:>9.1f} us'
+            f'{received / elapsed:>14,.0f}')
+
+    if not args.payload:
+        return
+    print()
+    print(f'{args.payload} MiB array result')
+    resource_tracker.ensure_running()
+    for name, threshold in [('pickled', math.inf), ('shared', SHARED_THRESHOLD)]:
+        seconds = transfer_payload(args.payload, threshold)
+        print(f'{name:<10}{seconds * 1e3:>11.1f} ms{args.payload / seconds:>12,.0f} MiB/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -40,6 +40,8 @@ setup(
     entry_points={
         'console_scripts': [
             'decontaminator-gui = itaxotools.decontaminator_gui:run',
+            'decontaminator-batch = itaxotools.decontaminator_gui.batch:main',
+            'decontaminator-worker = itaxotools.decontaminator_gui.remote:main',
         ]
     },
     classifiers=[
@@ -18,7 +18,7 @@
 
 """Program globals"""
 
-from . import model, resources, skin
+from . import model, resources, scratch, skin, workers
 from .tasks import tasks
 
 title = 'Decontaminator'
@@ -0,0 +1,40 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Workers shared by all tasks, started on first use, and how all workers are run"""
+
+from __future__ import annotations
+
+from ..limits import WorkerLimits
+from ..remote import RemoteExecutor
+from ..threading import SharedWorker
+
+limits = WorkerLimits.from_environment()
+
+# Task workers run on a remote host if one is configured, the I/O worker always runs locally
+executor = RemoteExecutor.from_environment()
+
+_io: SharedWorker | None = None
+
+
+def io() -> SharedWorker:
+    """Fast lane for inspecting files and other short commands"""
+    global _io
+    if _io is None:
+        _io = SharedWorker('I/O', limits=limits)
+    return _io
@@ -0,0 +1,606 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+Headless batch runner: execute tasks from a job file without loading Qt.
+
+Job files are JSON or YAML. Each job names a task and sets the properties
+of its model, anything omitted takes the same default as in the GUI.
+Relative paths are resolved against the job file.
+
+    workers: 4
+    output: results
+    jobs:
+      - task: versus_all
+        name: barcodes
+        input_sequences: barcodes.fas
+        alignment_mode: NoAlignment
+        distance_metrics: [p, jc]
+      - task: dereplicate
+        input_sequences: barcodes.fas
+        similarity_sweep: [0.01, 0.02, 0.03, 0.05]
+      - task: length_decontamination
+        input: alignments
+        threshold: 0.5
+
+The distances of a versus_all job can be calculated in blocks across
+several processes, on this host or on hosts running decontaminator-worker,
+by setting its endpoints, or DECONTAMINATOR_ENDPOINTS for all jobs. This
+is only available to batch jobs, since the GUI runs tasks on daemonic
+worker processes, which cannot start the processes of local endpoints:
+
+      - task: versus_all
+        input_sequences: barcodes.fas
+        endpoints: local*4,node1:6150*16
+
+Aligned pairs of a versus_all job are written selectively by default,
+the 10 closest to each sequence, gzip compressed. They are ranked by the
+first of its distance_metrics, unless alignment_pairs_metric names another.
+
+Results of each run of a job are written to a new subdirectory of the
+output directory, named after the job and then the time of the run.
+Tasks that work in place, such as length decontamination, write next to
+their input as they do in the GUI.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import suppress
+from datetime import datetime
+from enum import Enum
+from functools import partial
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, NamedTuple
+
+from .types import (
+    AlignmentMode, ColumnFilter, DecontaminateMode, DistanceMetric, FileFormat,
+    PairCompression, PairPolicy, PairwiseScore, PlotFormat, StatisticsGroup)
+from .types import branch_decontamination as branch_types
+from .types import gene_subset_selector as gene_types
+from .types import length_decontamination as length_types
+from .types import scafospy as scafospy_types
+
+SUMMARY_NAME = 'batch_summary.json'
+
+
+class BatchError(Exception):
+    pass
+
+
+class Job(NamedTuple):
+    name: str
+    task: str
+    properties: dict[str, Any]
+    base: Path
+    output: Path
+
+
+class JobResult(NamedTuple):
+    name: str
+    task: str
+    ok: bool
+    seconds: float
+    output: str | None = None
+    error: str | None = None
+
+
+def _enum(enum: type[Enum], value: Any) -> Enum | None:
+    """Accept members by name, value or key, case insensitive"""
+    if value is None or isinstance(value, enum):
+        return value
+    for member in enum:
+        candidates = [member.name, member.value, getattr(member, 'key', None)]
+        if any(str(candidate).lower() == str(value).lower() for candidate in candidates):
+            return member
+    choices = ', '.join(member.name for member in enum)
+    raise BatchError(f'Invalid {enum.__name__}: {value!r}, expected one of: {choices}')
+
+
+class Properties:
+    """Job properties with model defaults, converted on access"""
+
+    def __init__(self, job: Job, defaults: dict[str, Any]):
+        unknown = set(job.properties) - set(defaults)
+        if unknown:
+            raise BatchError(f'Unknown properties for {job.task}: {", ".join(sorted(unknown))}')
+        self.job = job
+        self.values = dict(defaults, **job.properties)
+
+    def __getitem__(self, name: str) -> Any:
+        return self.values[name]
+
+    def enum(self, name: str, enum: type[Enum]) -> Enum | None:
+        return _enum(enum, self.values[name])
+
+    def path(self, name: str) -> Path | None:
+        value = self.values[name]
+        if value is None:
+            return None
+        return self.job.base / Path(value).expanduser()
+
+    def flags(self, name: str, enum: type[Enum]) -> list[Enum]:
+        """Selected members of a property enum, as a list or a mapping of keys to booleans"""
+        value = self.values[name]
+        if value is None:
+            return [member for member in enum if member.default]
+        if isinstance(value, dict):
+            return [_enum(enum, key) for key, checked in value.items() if checked]
+        return [_enum(enum, key) for key in value]
+
+    def scores(self) -> dict[str, int]:
+        value = self.values['pairwise_scores'] or {}
+        scores = {score.key: score.default for score in PairwiseScore}
+        scores.update({_enum(PairwiseScore, key).key: score for key, score in value.items()})
+        return scores
+
+    def sequences(self, name: str) -> dict | None:
+        return input_file(self.values[name], self.job.base, partition=False)
+
+    def partition(self, name: str, preference: str | None = None) -> dict | None:
+        return input_file(self.values[name], self.job.base, partition=True, preference=preference)
+
+
+def input_file(spec: str | dict | None, base: Path, partition: bool, preference: str | None = None) -> dict | None:
+    """
+    Mirror the sequence and partition models: a file given only by path is
+    inspected to detect its format and columns, as when added in the GUI.
+    Columns may be given by header name or index.
+    """
+    from itaxotools.common.utility import AttrDict
+    from .tasks.versus_all import get_file_info
+    from .types import InputFile
+
+    if spec is None:
+        return None
+    if not isinstance(spec, dict):
+        spec = dict(path=spec)
+    spec = dict(spec)
+    path = base / Path(spec.pop('path')).expanduser()
+    if not path.exists():
+        raise BatchError(f'Input file not found: {path}')
+
+    type = _enum(FileFormat, spec.pop('type', None))
+    explicit = type is not None and all(
+        isinstance(value, int) for key, value in spec.items() if key.endswith('_column'))
+    info = None if explicit else get_file_info(path)
+    type = type or {
+        InputFile.Tabfile: FileFormat.Tabfile,
+        InputFile.Fasta: FileFormat.Fasta,
+        InputFile.Spart: FileFormat.Spart,
+    }.get(info.type)
+    if type is None:
+        raise BatchError(f'Unrecognized input file format: {path}')
+
+    def column(key: str, field: str) -> int:
+        value = spec.pop(key, getattr(info, field, None))
+        if isinstance(value, int):
+            return value
+        headers = getattr(info, 'headers', None) or []
+        return headers.index(value) if value in headers else -1
+
+    result = AttrDict(type=type, path=path)
+    if type == FileFormat.Tabfile and not partition:
+        result.index_column = column('index_column', 'individuals')
+        result.sequence_column = column('sequence_column', 'sequences')
+    elif type == FileFormat.Tabfile:
+        subset = preference if getattr(info, str(preference), None) else 'organism'
+        result.individual_column = column('individual_column', 'individuals')
+        result.subset_column = column('subset_column', subset)
+        default_filter = ColumnFilter.First if preference == 'genera' and subset == 'organism' else ColumnFilter.All
+        result.subset_filter = _enum(ColumnFilter, spec.pop('subset_filter', default_filter))
+        result.individual_filter = _enum(ColumnFilter, spec.pop('individual_filter', ColumnFilter.All))
+    elif type == FileFormat.Fasta and not partition:
+        result.parse_organism = bool(spec.pop('parse_organism', False))
+    elif type == FileFormat.Fasta:
+        default_filter = ColumnFilter.First if preference == 'genera' else ColumnFilter.All
+        result.subset_filter = _enum(ColumnFilter, spec.pop('subset_filter', default_filter))
+    elif type == FileFormat.Spart:
+        spartitions = getattr(info, 'spartitions', None) or [None]
+        result.spartition = spec.pop('spartition', spartitions[0])
+        result.is_xml = getattr(info, 'is_xml', None)
+    if spec:
+        raise BatchError(f'Unknown fields for input file {path.name}: {", ".join(sorted(spec))}')
+    return result
+
+
+ALIGNMENT_DEFAULTS = dict(
+    alignment_mode=AlignmentMode.PairwiseAlignment,
+    alignment_write_pairs=True,
+    alignment_pairs_policy=PairPolicy.TopK,
+    alignment_pairs_cutoff=0.05,
+    alignment_pairs_top_k=10,
+    alignment_pairs_compression=PairCompression.Gzip,
+    pairwise_scores=None,
+)
+
+DISTANCE_FORMAT_DEFAULTS = dict(
+    distance_linear=True,
+    distance_matricial=True,
+    distance_percentile=False,
+    distance_precision=4,
+    distance_missing='NA',
+)
+
+
+def _alignment_arguments(p: Properties) -> dict:
+    return dict(
+        alignment_mode=p.enum('alignment_mode', AlignmentMode),
+        alignment_write_pairs=p['alignment_write_pairs'],
+        alignment_pairs_policy=p.enum('alignment_pairs_policy', PairPolicy),
+        alignment_pairs_cutoff=p['alignment_pairs_cutoff'],
+        alignment_pairs_top_k=p['alignment_pairs_top_k'],
+        alignment_pairs_compression=p.enum('alignment_pairs_compression', PairCompression),
+        alignment_pairwise_scores=p.scores(),
+    )
+
+
+def _distance_format_arguments(p: Properties) -> dict:
+    return {key: p[key] for key in DISTANCE_FORMAT_DEFAULTS}
+
+
+def _endpoints(p: Properties) -> str | None:
+    from .distributed import ENV_ENDPOINTS, parse_endpoints
+
+    endpoints = p['endpoints'] or os.environ.get(ENV_ENDPOINTS)
+    if endpoints:
+        parse_endpoints(endpoints)
+    return endpoints
+
+
+def versus_all_arguments(p: Properties) -> dict:
+    groups = p.flags('statistics_groups', StatisticsGroup)
+    endpoints = _endpoints(p)
+    return dict(
+        perform_species=p['perform_species'],
+        perform_genera=p['perform_genera'],
+        input_sequences=p.sequences('input_sequences'),
+        input_species=p.partition('input_species', 'species'),
+        input_genera=p.partition('input_genera', 'genera'),
+        **_alignment_arguments(p),
+        alignment_pairs_metric=p.enum('alignment_pairs_metric', DistanceMetric),
+        distance_metrics=p.flags('distance_metrics', DistanceMetric),
+        distance_metrics_bbc_k=p['distance_metrics_bbc_k'],
+        **_distance_format_arguments(p),
+        statistics_all=StatisticsGroup.All in groups,
+        statistics_species=StatisticsGroup.Species in groups,
+        statistics_genus=StatisticsGroup.Genus in groups,
+        statistics_spread=p['statistics_spread'],
+        plot_histograms=p['plot_histograms'],
+        plot_binwidth=p['plot_binwidth'],
+        plot_formats=[format.key for format in p.flags('plot_formats', PlotFormat)],
+        **(dict(endpoints=endpoints) if endpoints else {}),
+    )
+
+
+def dereplicate_arguments(p: Properties) -> dict:
+    return dict(
+        input_sequences=p.sequences('input_sequences'),
+        **_alignment_arguments(p),
+        distance_metric=p.enum('distance_metric', DistanceMetric),
+        distance_metric_bbc_k=p['distance_metric_bbc_k'],
+        **_distance_format_arguments(p),
+        similarity_threshold=p['similarity_threshold'],
+        length_threshold=p['length_threshold'],
+        similarity_sweep=p['similarity_sweep'],
+    )
+
+
+def decontaminate_arguments(p: Properties) -> dict:
+    return dict(
+        decontaminate_mode=p.enum('decontaminate_mode', DecontaminateMode),
+        input_sequences=p.sequences('input_sequences'),
+        outgroup_sequences=p.sequences('outgroup_sequences'),
+        ingroup_sequences=p.sequences('ingroup_sequences'),
+        **_alignment_arguments(p),
+        distance_metric=p.enum('distance_metric', DistanceMetric),
+        distance_metric_bbc_k=p['distance_metric_bbc_k'],
+        **_distance_format_arguments(p),
+        similarity_threshold=p['similarity_threshold'],
+        outgroup_weight=p['outgroup_weight'],
+        ingroup_weight=p['ingroup_weight'],
+    )
+
+
+def versus_reference_arguments(p: Properties) -> dict:
+    return dict(
+        input_data=p.sequences('input_data'),
+        input_reference=p.sequences('input_reference'),
+        **_alignment_arguments(p),
+        distance_metrics=p.flags('distance_metrics', DistanceMetric),
+        distance_metrics_bbc_k=p['distance_metrics_bbc_k'],
+        main_metric=p.enum('main_metric', DistanceMetric),
+        **_distance_format_arguments(p),
+    )
+
+
+def _text(value: Any) -> str:
+    return '' if value is None else str(value)
+
+
+class TaskSpec(NamedTuple):
+    module: str
+    function: str | Callable[[Properties], str]
+    defaults: dict[str, Any]
+    arguments: Callable[[Properties], dict]
+    required: tuple[str, ...]
+    work_dir: bool = False
+
+
+TASKS: dict[str, TaskSpec] = dict(
+    versus_all=TaskSpec(
+        'versus_all',
+        lambda p: 'versus_all_distributed' if _endpoints(p) else 'versus_all',
+        dict(
+            perform_species=False, perform_genera=False,
+            input_sequences=None, input_species=None, input_genera=None,
+            **ALIGNMENT_DEFAULTS, alignment_pairs_metric=None,
+            distance_metrics=None, distance_metrics_bbc_k=10,
+            **DISTANCE_FORMAT_DEFAULTS,
+            statistics_groups=None, statistics_spread=False,
+            plot_histograms=True, plot_binwidth=0.05, plot_formats=None,
+            endpoints=None,
+        ),
+        versus_all_arguments, ('input_sequences',), work_dir=True),
+    dereplicate=TaskSpec(
+        'dereplicate', 'dereplicate',
+        dict(
+            input_sequences=None,
+            **ALIGNMENT_DEFAULTS,
+            distance_metric=DistanceMetric.Uncorrected, distance_metric_bbc_k=10,
+            **DISTANCE_FORMAT_DEFAULTS,
+            similarity_threshold=0.03, length_threshold=0, similarity_sweep=None,
+        ),
+        dereplicate_arguments, ('input_sequences',), work_dir=True),
+    decontaminate=TaskSpec(
+        'decontaminate', 'decontaminate',
+        dict(
+            decontaminate_mode=DecontaminateMode.DECONT,
+            input_sequences=None, outgroup_sequences=None, ingroup_sequences=None,
+            **ALIGNMENT_DEFAULTS,
+            distance_metric=DistanceMetric.Uncorrected, distance_metric_bbc_k=10,
+            **DISTANCE_FORMAT_DEFAULTS,
+            similarity_threshold=0.03, outgroup_weight=1.0, ingroup_weight=1.0,
+        ),
+        decontaminate_arguments, ('input_sequences', 'outgroup_sequences'), work_dir=True),
+    versus_reference=TaskSpec(
+        'versus_reference', 'versus_reference',
+        dict(
+            input_data=None, input_reference=None,
+            **ALIGNMENT_DEFAULTS,
+            distance_metrics=None, distance_metrics_bbc_k=10, main_metric=None,
+            **DISTANCE_FORMAT_DEFAULTS,
+        ),
+        versus_reference_arguments, ('input_data', 'input_reference'), work_dir=True),
+    length_decontamination=TaskSpec(
+        'length_decontamination',
+        lambda p: 'execute_sweep' if p['threshold_sweep'] else 'execute',
+        dict(
+            input=None, mode=length_types.Mode.Percentage, symbol=length_types.Symbol.Nucleotide,
+            threshold=0.0, threshold_sweep=None),
+        lambda p: dict(
+            dir=_text(p.path('input')),
+            mode=_text(p.enum('mode', length_types.Mode)),
+            type=_text(p.enum('symbol', length_types.Symbol)),
+            **(dict(thresholds=p['threshold_sweep']) if p['threshold_sweep'] else dict(thresh=_text(p['threshold']))),
+        ), ('input',)),
+    branch_decontamination=TaskSpec(
+        'branch_decontamination', 'execute',
+        dict(
+            input=None, mode=branch_types.Mode.Terminal, target=branch_types.Target.Alignment,
+            absolute=0, percentile=0.0, quantile=0.0, factor=0.0, tree=None),
+        lambda p: dict(
+            dir=_text(p.path('input')),
+            mode=_text(p.enum('mode', branch_types.Mode)),
+            target=_text(p.enum('target', branch_types.Target)),
+            perc=_text(p['percentile']),
+            absolute=_text(p['absolute']),
+            quantile=_text(p['quantile']),
+            factor=_text(p['factor']),
+            referencetree=_text(p.path('tree')),
+        ), ('input',)),
+    scafospy=TaskSpec(
+        'scafospy', 'execute',
+        dict(input=None, output=None, mode=scafospy_types.Mode.Ambiguity, symbol=scafospy_types.Symbol.Nucleotide),
+        lambda p: dict(
+            dir=_text(p.path('input')),
+            out=_text(p.path('output')),
+            mode=_text(p.enum('mode', scafospy_types.Mode)),
+            type=_text(p.enum('symbol', scafospy_types.Symbol)),
+        ), ('input', 'output')),
+    gene_subset_selector=TaskSpec(
+        'gene_subset_selector', 'execute',
+        dict(input=None, output=None, criterion=gene_types.Criterion.Support, files=0),
+        lambda p: dict(
+            dir=_text(p.path('input')),
+            out=_text(p.path('output')),
+            crit=_text(p.enum('criterion', gene_types.Criterion)),
+            files=_text(p['files']),
+        ), ('input', 'output')),
+    remove_rename=TaskSpec(
+        'remove_rename', 'execute', dict(input=None),
+        lambda p: dict(dir=_text(p.path('input'))), ('input',)),
+    decontamination=TaskSpec(
+        'decontamination', 'execute', dict(input=None),
+        lambda p: dict(dir=_text(p.path('input'))), ('input',)),
+)
+
+
+def load_jobs(path: Path, output: Path | None = None) -> tuple[list[Job], int | None]:
+    """Parse a job file, returning its jobs and requested number of workers"""
+    path = Path(path).resolve()
+    text = path.read_text(encoding='utf-8')
+    if path.suffix.lower() in ['.yaml', '.yml']:
+        try:
+            import yaml
+        except ImportError:
+            raise BatchError('Reading YAML job files requires PyYAML, or use JSON instead.')
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+
+    if isinstance(data, list):
+        data = dict(jobs=data)
+    if not isinstance(data, dict) or not isinstance(data.get('jobs'), list):
+        raise BatchError(f'Expected a list of jobs in {path.name}')
+
+    base = path.parent
+    output = Path(output or base / data.get('output', 'batch_results')).resolve()
+
+    jobs = []
+    for index, entry in enumerate(data['jobs'], 1):
+        entry = dict(entry)
+        task = entry.pop('task', None)
+        if task not in TASKS:
+            raise BatchError(f'Job {index}: unknown task {task!r}, expected one of: {", ".join(TASKS)}')
+        name = str(entry.pop('name', f'{index:03}_{task}'))
+        if any(job.name == name for job in jobs):
+            raise BatchError(f'Job {index}: duplicate name {name!r}')
+        job = Job(name, task, entry, base, output / name)
+        properties = Properties(job, TASKS[task].defaults)
+        missing = [key for key in TASKS[task].required if properties[key] is None]
+        if missing:
+            raise BatchError(f'Job {name}: missing {", ".join(missing)}')
+        jobs.append(job)
+    return jobs, data.get('workers')
+
+
+def _print_progress(name: str, report):
+    if report.maximum > report.minimum:
+        percent = 100 * (report.value - report.minimum) / (report.maximum - report.minimum)
+        eta = f', ETA {report.eta:.0f}s' if report.eta is not None else ''
+        print(f'[{name}] {report.phase or report.text}: {percent:.0f}%{eta}', file=sys.stderr, flush=True)
+    elif report.phase or report.text:
+        print(f'[{name}] {report.phase or report.text}', file=sys.stderr, flush=True)
+
+
+def run_job(job: Job) -> JobResult:
+    """Executed in a pool process, never raises"""
+    import itaxotools
+    from .progress import ProgressTracker
+
+    spec = TASKS[job.task]
+    itaxotools.progress_handler = ProgressTracker(partial(_print_progress, job.name), interval=1.0)
+    work_dir = None
+    start = perf_counter()
+    try:
+        module = importlib.import_module(f'.tasks.{spec.module}', __package__)
+        properties = Properties(job, spec.defaults)
+        function = spec.function if isinstance(spec.function, str) else spec.function(properties)
+        arguments = spec.arguments(properties)
+        if spec.work_dir:
+            from .transfer import staging_directory
+            timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+            work_dir = staging_directory(job.output, timestamp)
+            arguments = dict(work_dir=work_dir, output_directory=job.output, **arguments)
+        results = getattr(module, function)(**arguments)
+    except Exception as exception:
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            with suppress(OSError):
+                job.output.rmdir()
+        print(f'[{job.name}] Failed:\n{traceback.format_exc()}', file=sys.stderr, flush=True)
+        return JobResult(job.name, job.task, False, perf_counter() - start, error=str(exception) or type(exception).__name__)
+    output = str(results.output_directory) if spec.work_dir else None
+    return JobResult(job.name, job.task, True, perf_counter() - start, output)
+
+
+def run_jobs(jobs: list[Job], workers: int | None = None, callback: Callable[[JobResult], None] = None) -> list[JobResult]:
+    """Run jobs on a process pool, returning results in the order of jobs"""
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    results: dict[str, JobResult] = {}
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as exception:
+                result = JobResult(job.name, job.task, False, 0.0, error=f'Worker process failed: {exception}')
+            results[job.name] = result
+            if callback:
+                callback(result)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return [results[job.name] for job in jobs if job.name in results]
+
+
+def save_summary(path: Path, results: list[JobResult]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f'.{path.name}.partial')
+    with open(partial, 'w', encoding='utf-8') as file:
+        json.dump([result._asdict() for result in results], file, indent=2, ensure_ascii=False)
+    os.replace(partial, path)
+
+
+def _report(result: JobResult):
+    status = 'done' if result.ok else f'FAILED: {result.error}'
+    print(f'[{result.name}] {result.task} {status} ({result.seconds:.1f}s)', flush=True)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='decontaminator-batch',
+        description='Run Decontaminator tasks from a JSON or YAML job file, without the GUI.')
+    parser.add_argument('jobs', type=Path, nargs='?', help='job file')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='parallel jobs, defaults to the number of CPUs')
+    parser.add_argument('-o', '--output', type=Path, default=None, help='output directory, overrides the job file')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='validate the job file and exit')
+    parser.add_argument('--list-tasks', action='store_true', help='list tasks and their properties, then exit')
+    args = parser.parse_args(argv)
+
+    if args.list_tasks:
+        for name, spec in TASKS.items():
+            print(f'{name}: {", ".join(spec.defaults)}')
+        return 0
+    if args.jobs is None:
+        parser.error('a job file is required')
+
+    try:
+        jobs, workers = load_jobs(args.jobs, args.output)
+        for job in jobs:
+            spec = TASKS[job.task]
+            spec.arguments(Properties(job, spec.defaults))
+    except (BatchError, OSError, ValueError) as exception:
+        print(f'{parser.prog}: {exception}', file=sys.stderr)
+        return 2
+
+    if args.dry_run:
+        for job in jobs:
+            print(f'[{job.name}] {job.task} -> {job.output}')
+        return 0
+
+    results = run_jobs(jobs, args.workers or workers, _report)
+    if jobs:
+        save_summary(jobs[0].output.parent / SUMMARY_NAME, results)
+    failed = sum(not result.ok for result in results)
+    print(f'{len(results) - failed} of {len(jobs)} jobs completed successfully.', flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,385 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""A single duplex connection between a worker and its process, carrying framed messages in batches"""
+
+from __future__ import annotations
+
+import io
+import math
+import os
+import pickle
+import struct
+import threading
+from enum import IntEnum
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path, PurePosixPath
+from time import perf_counter
+from typing import Any, BinaryIO, Callable
+
+HEADER = struct.Struct('<BQ')
+SHARED_THRESHOLD = 1 << 20
+CHUNK_SIZE = 1 << 20
+
+
+class Kind(IntEnum):
+    Command = 1
+    Result = 2
+    Progress = 3
+    Stdout = 4
+    Stderr = 5
+    Chunk = 6
+
+
+TEXT_KINDS = {Kind.Stdout, Kind.Stderr}
+
+
+def _is_plain_array(obj: Any) -> bool:
+    """True for NumPy arrays of plain data, without importing NumPy"""
+    cls = type(obj)
+    return (
+        cls.__name__ == 'ndarray' and cls.__module__ == 'numpy' and
+        not obj.dtype.hasobject and obj.dtype.fields is None)
+
+
+class SharingPickler(pickle.Pickler):
+    """
+    Large bytes and NumPy arrays are copied into new shared memory blocks,
+    only their handles are pickled. The blocks are left for the receiver
+    to unlink, see `SharingUnpickler`.
+    """
+
+    def __init__(self, file, threshold: int = SHARED_THRESHOLD):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.threshold = threshold
+        self.blocks: list[SharedMemory] = []
+
+    def persistent_id(self, obj: Any):
+        if type(obj) in (bytes, bytearray):
+            if len(obj) < self.threshold:
+                return None
+            block = self.share(memoryview(obj))
+            return ('bytes', block.name, len(obj), type(obj) is bytearray)
+        if _is_plain_array(obj):
+            if obj.nbytes < self.threshold:
+                return None
+            contiguous = obj if obj.flags.c_contiguous else obj.copy(order='C')
+            block = self.share(memoryview(contiguous).cast('B'))
+            return ('ndarray', block.name, obj.dtype.str, obj.shape)
+        return None
+
+    def share(self, data: memoryview) -> SharedMemory:
+        block = SharedMemory(create=True, size=len(data))
+        self.blocks.append(block)
+        block.buf[:len(data)] = data
+        return block
+
+    def release(self, unlink: bool = False):
+        """Close the blocks on this side, also unlinking them if they were never sent"""
+        for block in self.blocks:
+            block.close()
+            if unlink:
+                block.unlink()
+        self.blocks = []
+
+
+class SharingUnpickler(pickle.Unpickler):
+    """Shared memory blocks are copied out, then unlinked as soon as they are loaded"""
+
+    def persistent_load(self, pid):
+        kind, name, *layout = pid
+        block = SharedMemory(name)
+        try:
+            if kind == 'bytes':
+                size, mutable = layout
+                with block.buf[:size] as data:
+                    return bytearray(data) if mutable else bytes(data)
+            if kind == 'ndarray':
+                import numpy as np
+                dtype, shape = layout
+                view = np.frombuffer(block.buf, dtype=dtype, count=math.prod(shape))
+                try:
+                    return view.reshape(shape).copy()
+                finally:
+                    del view
+            raise pickle.UnpicklingError(f'Unknown shared object: {kind}')
+        finally:
+            block.close()
+            block.unlink()
+
+
+def encode(kind: Kind, message: Any) -> bytes:
+    if kind in TEXT_KINDS:
+        return message.encode('utf-8', 'replace')
+    return pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+
+
+def encode_shared(kind: Kind, message: Any, threshold: int) -> tuple[bytes, SharingPickler]:
+    """Same as encode, but large payloads are placed in shared memory"""
+    if kind in TEXT_KINDS:
+        return encode(kind, message), None
+    buffer = io.BytesIO()
+    pickler = SharingPickler(buffer, threshold)
+    try:
+        pickler.dump(message)
+    except BaseException:
+        pickler.release(unlink=True)
+        raise
+    return buffer.getvalue(), pickler
+
+
+def decode(kind: Kind, payload: memoryview) -> Any:
+    if kind in TEXT_KINDS:
+        return str(payload, 'utf-8')
+    return SharingUnpickler(io.BytesIO(payload)).load()
+
+
+def frames(batch: bytes) -> list[tuple[Kind, Any]]:
+    """Split a batch into its messages"""
+    view = memoryview(batch)
+    messages = []
+    offset = 0
+    while offset < len(view):
+        kind, length = HEADER.unpack_from(view, offset)
+        offset += HEADER.size
+        messages.append((Kind(kind), decode(kind, view[offset:offset + length])))
+        offset += length
+    return messages
+
+
+class SendFileError(Exception):
+    """A file could not be read for sending, unlike failures of the connection, which raise OSError"""
+
+
+def safe_key(key: str) -> PurePosixPath:
+    """Relative path of a streamed file, refusing any that would escape its directory"""
+    path = PurePosixPath(key)
+    if path.is_absolute() or not path.parts or '..' in path.parts:
+        raise ValueError(f'Refusing to write streamed file: {key!r}')
+    return path
+
+
+class FileSink:
+    """
+    Writes files streamed through a channel as their chunks arrive, see
+    `Channel.send_file`. Files are resolved from their keys when their first
+    chunk arrives, written beside their target and moved in place once complete.
+    Files that cannot be written are skipped, their errors kept in failures
+    by key for whoever expects them.
+    """
+
+    def __init__(self, resolve: Callable[[str], Path], failures: dict[str, Exception] | None = None):
+        self.resolve = resolve
+        self.failures = failures if failures is not None else dict()
+        self.open: dict[str, tuple[Path, Path, BinaryIO]] = dict()
+
+    def write(self, key: str, data: bytes | None):
+        if key in self.failures:
+            return
+        try:
+            self._write(key, data)
+        except (OSError, ValueError) as exception:
+            self.failures[key] = exception
+            if key in self.open:
+                _, partial, file = self.open.pop(key)
+                file.close()
+                partial.unlink(missing_ok=True)
+
+    def _write(self, key: str, data: bytes | None):
+        if key not in self.open:
+            target = self.resolve(key)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            partial = target.with_name(f'.{target.name}.partial')
+            self.open[key] = (target, partial, open(partial, 'wb'))
+        target, partial, file = self.open[key]
+        if data is not None:
+            file.write(data)
+            return
+        del self.open[key]
+        file.close()
+        os.replace(partial, target)
+
+    def abort(self):
+        """Remove files left incomplete, such as when the connection is lost"""
+        for target, partial, file in self.open.values():
+            file.close()
+            partial.unlink(missing_ok=True)
+        self.open.clear()
+
+
+class Channel:
+    """
+    Messages are length prefixed frames tagged by kind. Posted messages are
+    buffered and sent together, once the buffer is full or the oldest one
+    has waited for longer than the delay, while sent messages go out at
+    once along with anything buffered. Consecutive text of the same kind
+    is merged into a single frame. Call start() for a thread that flushes
+    messages left waiting, for processes that may not post again soon.
+
+    Sent messages place bytes and arrays larger than the threshold in
+    shared memory, so that only handles go through the connection. Each
+    block lives from encoding until the message is decoded on the other
+    end, or until the resource tracker reclaims it if that never happens.
+
+    Files are sent in chunks, each in a frame of its own, and written by
+    the sink of the receiving channel as they arrive, so that neither end
+    holds more than a chunk of them in memory.
+    """
+
+    def __init__(
+        self, connection: Connection, delay: float = 0.02,
+        limit: int = 1 << 16, threshold: int = SHARED_THRESHOLD,
+        sink: FileSink | None = None,
+    ):
+        self.connection = connection
+        self.sink = sink
+        self.delay = delay
+        self.limit = limit
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.pending: list[tuple[Kind, bytes]] = []
+        self.size = 0
+        self.since = 0.0
+        self.flusher = None
+        self.closed = False
+
+    def fileno(self) -> int:
+        return self.connection.fileno()
+
+    def post(self, kind: Kind, message: Any):
+        payload = encode(kind, message)
+        with self.lock:
+            if not self.pending:
+                self.since = perf_counter()
+            if kind in TEXT_KINDS and self.pending and self.pending[-1][0] == kind:
+                self.pending[-1] = (kind, self.pending[-1][1] + payload)
+            else:
+                self.pending.append((kind, payload))
+            self.size += HEADER.size + len(payload)
+            if self.size >= self.limit or perf_counter() - self.since >= self.delay:
+                self._flush()
+
+    def send(self, kind: Kind, message: Any):
+        payload, pickler = encode_shared(kind, message, self.threshold)
+        sent = False
+        try:
+            with self.lock:
+                self.pending.append((kind, payload))
+                self._flush()
+            sent = True
+        finally:
+            if pickler is not None:
+                pickler.release(unlink=not sent)
+
+    def send_file(self, key: str, path: Path, chunk_size: int = CHUNK_SIZE):
+        """Stream a file to the sink of the other end, which writes it under key"""
+        try:
+            file = open(path, 'rb')
+        except OSError as exception:
+            raise SendFileError(f'Cannot send {path}: {exception}') from exception
+        with file:
+            while True:
+                try:
+                    data = file.read(chunk_size)
+                except OSError as exception:
+                    raise SendFileError(f'Cannot send {path}: {exception}') from exception
+                if not data:
+                    break
+                self.send(Kind.Chunk, (key, data))
+        self.send(Kind.Chunk, (key, None))
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        batch = io.BytesIO()
+        for kind, payload in self.pending:
+            batch.write(HEADER.pack(kind, len(payload)))
+            batch.write(payload)
+        self.pending = []
+        self.size = 0
+        self.connection.send_bytes(batch.getbuffer())
+
+    def receive(self) -> list[tuple[Kind, Any]]:
+        """
+        Block for the next batch, raises EOFError once the other end is closed.
+        Chunks of files are written by the sink instead of being returned.
+        """
+        messages = frames(self.connection.recv_bytes())
+        if not any(kind == Kind.Chunk for kind, _ in messages):
+            return messages
+        if self.sink is None:
+            raise ValueError('Received a file without a sink to write it')
+        for kind, message in messages:
+            if kind == Kind.Chunk:
+                self.sink.write(*message)
+        return [(kind, message) for kind, message in messages if kind != Kind.Chunk]
+
+    def poll(self, timeout: float = 0.0) -> bool:
+        return self.connection.poll(timeout)
+
+    def start(self):
+        self.flusher = threading.Thread(target=self._run_flusher, name='Channel flusher', daemon=True)
+        self.flusher.start()
+
+    def _run_flusher(self):
+        event = threading.Event()
+        while not event.wait(self.delay):
+            with self.lock:
+                if self.closed:
+                    return
+                if self.pending and perf_counter() - self.since >= self.delay:
+                    self._flush()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            try:
+                self._flush()
+            except OSError:
+                pass
+            self.connection.close()
+        if self.sink is not None:
+            self.sink.abort()
+
+
+class ChannelWriterIO(io.TextIOBase):
+    """File-like object that posts text to a channel"""
+
+    def __init__(self, channel: Channel, kind: Kind):
+        super().__init__()
+        self.channel = channel
+        self.kind = kind
+
+    def readable(self):
+        return False
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.channel.post(self.kind, text)
+        return len(text)
+
+    def flush(self):
+        """Left to the channel, so that frequent flushing does not defeat batching"""
+        pass
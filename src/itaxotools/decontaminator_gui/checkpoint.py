@@ -0,0 +1,132 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Checkpoints of completed work blocks, kept in the work directory of a run"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from enum import Enum
+from pathlib import Path
+
+CHECKPOINT_DIRECTORY = '.checkpoint'
+STATE_NAME = 'checkpoint.json'
+BLOCKS_DIRECTORY = 'blocks'
+VERSION = 1
+
+IGNORED_PARAMETERS = {'work_dir', 'output_directory', 'checkpoint_key'}
+
+
+def block_directory(work_dir: Path, start: int, attempt: int) -> Path:
+    """Where an attempt to calculate the block starting at the given row writes, see `distributed`"""
+    return Path(work_dir) / CHECKPOINT_DIRECTORY / BLOCKS_DIRECTORY / f'rows_{start:09d}.{attempt}'
+
+
+def _encode(value):
+    if isinstance(value, Path):
+        try:
+            stat = value.stat()
+        except OSError:
+            return str(value)
+        return [str(value), stat.st_size, stat.st_mtime_ns]
+    if isinstance(value, Enum):
+        return f'{type(value).__name__}.{value.name}'
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    return repr(value)
+
+
+def parameter_hash(task: str, parameters: dict) -> str:
+    """
+    Identifies the results of a task for the given parameters, so that runs
+    only resume from compatible checkpoints. Input files are identified by
+    their path, size and modification time.
+    """
+    parameters = {k: v for k, v in parameters.items() if k not in IGNORED_PARAMETERS}
+    text = json.dumps([VERSION, task, parameters], sort_keys=True, default=_encode)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def load_state(work_dir: Path) -> dict | None:
+    try:
+        with open(Path(work_dir) / CHECKPOINT_DIRECTORY / STATE_NAME, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def is_resumable(work_dir: Path, key: str | None = None) -> bool:
+    """True if at least one block was completed, by a run with the same key if given"""
+    state = load_state(work_dir)
+    if state is None or not state.get('blocks'):
+        return False
+    return key is None or state.get('key') == key
+
+
+class Checkpoint:
+    """
+    Completed blocks are committed in order. Block data is written by the
+    caller to `block_path()` before calling `commit()`, which atomically
+    updates the state file, so that a block either counts or is redone.
+    """
+
+    def __init__(self, work_dir: Path, key: str):
+        self.directory = Path(work_dir) / CHECKPOINT_DIRECTORY
+        self.key = key
+        self.blocks: list[dict] = []
+
+    @classmethod
+    def open(cls, work_dir: Path, key: str) -> Checkpoint:
+        """Continue from a compatible checkpoint, or start over"""
+        checkpoint = cls(work_dir, key)
+        state = load_state(work_dir)
+        if state is not None and state.get('version') == VERSION and state.get('key') == key:
+            checkpoint.blocks = state['blocks']
+        else:
+            checkpoint.remove()
+        checkpoint.directory.mkdir(parents=True, exist_ok=True)
+        return checkpoint
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def total(self, field: str) -> int:
+        return sum(block[field] for block in self.blocks)
+
+    def block_path(self, index: int, suffix: str) -> Path:
+        return self.directory / f'block_{index:06d}{suffix}'
+
+    def commit(self, **fields: int):
+        self.blocks.append(fields)
+        self.save()
+
+    def save(self):
+        """Keep this checkpoint when opened again, even before any block is committed"""
+        path = self.directory / STATE_NAME
+        partial = path.with_name(f'.{path.name}.partial')
+        with open(partial, 'w', encoding='utf-8') as file:
+            json.dump(dict(version=VERSION, key=self.key, blocks=self.blocks), file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(partial, path)
+
+    def remove(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,359 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Blocks of work scheduled across worker processes, on this host or remote ones"""
+
+from __future__ import annotations
+
+import itertools
+import multiprocessing as mp
+import os
+import sys
+import traceback
+from collections import deque
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+from typing import Any, Callable, NamedTuple, TextIO
+
+from .channel import Channel, Kind, SendFileError
+from .remote import ENV_AUTHKEY, RemoteExecutor, parse_address
+from .threading_loop import Command, LocalExecutor, ReportDone, ReportExit, ReportFail
+
+ENV_ENDPOINTS = 'DECONTAMINATOR_ENDPOINTS'
+
+
+def parse_endpoints(text: str, authkey: bytes | None = None) -> list[LocalExecutor | RemoteExecutor]:
+    """
+    Endpoints are separated by commas, each either 'local' for a process on
+    this host or the address of a host running `remote.serve()`. A suffix
+    such as '*4' repeats an endpoint, e.g. 'local*2,server:6150*8'. Remote
+    hosts are authenticated with the key from the environment by default.
+    """
+    if authkey is None:
+        authkey = os.environ.get(ENV_AUTHKEY, '').encode()
+    endpoints = []
+    for item in text.split(','):
+        item, _, count = item.strip().partition('*')
+        if not item:
+            continue
+        for _ in range(int(count or 1)):
+            if item == 'local':
+                endpoints.append(LocalExecutor())
+            else:
+                endpoints.append(RemoteExecutor(parse_address(item), authkey))
+    if not endpoints:
+        raise ValueError(f'No endpoints given: {text!r}')
+    return endpoints
+
+
+class Block(NamedTuple):
+    index: int
+    start: int
+    stop: int
+
+
+class Attempt(NamedTuple):
+    block: Block
+    directory: Path
+    started: float
+
+
+class Endpoint:
+    """A process started by an executor, calculating one block at a time"""
+
+    def __init__(self, name: str, executor: LocalExecutor | RemoteExecutor, limits=None):
+        self.name = name
+        self.executor = executor
+        self.limits = limits
+        self.channel: Channel | None = None
+        self.process = None
+        self.attempt: Attempt | None = None
+        self.command: Command | None = None
+        self.requests = itertools.count(1)
+        self.failures = 0
+        self.retired = False
+
+    @property
+    def idle(self) -> bool:
+        return self.attempt is None and not self.retired
+
+    def connect(self):
+        connection, self.process = self.executor.start(self.name, 1, self.limits)
+        self.channel = Channel(connection, threshold=self.executor.threshold, sink=self.executor.sink())
+
+    def disconnect(self) -> int | None:
+        """Stop the process if still running, returns its exit code"""
+        if self.process is None:
+            return None
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(1)
+        exitcode = self.process.exitcode
+        self.channel.close()
+        self.channel = None
+        self.process = None
+        self.attempt = None
+        return exitcode
+
+    def send(self, command: Command):
+        if self.channel is None:
+            self.connect()
+        command = self.executor.prepare(command._replace(request=next(self.requests)))
+        self.command = command
+        self.executor.send(self.channel, command)
+
+    def waitables(self) -> list:
+        if self.process is None:
+            return []
+        if self.process.sentinel is self.channel.connection:
+            return [self.channel.connection]
+        return [self.channel.connection, self.process.sentinel]
+
+
+class BlockScheduler:
+    """
+    Calculate blocks of rows by calling the same task for each, on one
+    process per endpoint. Idle endpoints take the next block from a single
+    queue, so blocks are never moved between endpoints once started. Once
+    the queue is empty, idle endpoints duplicate stragglers instead: blocks
+    that have been running for much longer than finished blocks took per
+    row at the median, plus a grace period, keeping whichever copy finishes
+    first. Failed blocks are retried elsewhere, and endpoints that keep
+    failing are retired.
+    """
+
+    max_attempts = 3
+    max_failures = 2
+    straggler_factor = 2.0
+    straggler_grace = 1.0
+
+    def __init__(self, executors: list, name: str = 'Blocks', limits=None, output: TextIO = None):
+        self.endpoints = [
+            Endpoint(f'{name} #{index}', executor, limits)
+            for index, executor in enumerate(executors, 1)]
+        self.output = output or sys.stderr
+
+    def run(
+        self,
+        task: Callable,
+        blocks: list[tuple[int, int]],
+        directory: Callable[[int, int], Path],
+        ready: Callable[[list[Path]], None],
+        progress: Callable[[int, int], None] = None,
+        **kwargs,
+    ):
+        """
+        Call task(output_directory=..., start=..., stop=..., **kwargs) for
+        each range of rows, where the output directory is given by
+        directory(start, attempt) and is created first. The directories of finished blocks are passed to
+        ready() in order, as soon as all blocks before them are finished.
+        Raises RuntimeError once a block failed too many times.
+        """
+        self.task = task
+        self.kwargs = kwargs
+        self.directory = directory
+        self.blocks = [Block(index, start, stop) for index, (start, stop) in enumerate(blocks)]
+        self.queue = deque(self.blocks)
+        self.tries: dict[int, int] = dict()
+        self.finished: dict[int, Path] = dict()
+        self.seconds_per_row: list[float] = []
+        self.announced = 0
+        self.rows = 0
+        self.total = sum(block.stop - block.start for block in self.blocks)
+
+        try:
+            while len(self.finished) < len(self.blocks):
+                self.dispatch()
+                self.announce(ready)
+                if progress:
+                    progress(self.rows, self.total)
+                waitables = [item for endpoint in self.endpoints for item in endpoint.waitables()]
+                for item in mp.connection.wait(waitables, self.next_straggler()):
+                    self.handle(item)
+            self.announce(ready)
+            if progress:
+                progress(self.rows, self.total)
+        finally:
+            # Copies of blocks that finished elsewhere may still be running
+            for endpoint in self.endpoints:
+                if endpoint.attempt is not None:
+                    endpoint.disconnect()
+
+    def close(self):
+        """Stop all processes of endpoints"""
+        for endpoint in self.endpoints:
+            endpoint.disconnect()
+
+    def dispatch(self):
+        """Internal. Hand blocks to idle endpoints, retrying until at least one is busy"""
+        while True:
+            for endpoint in self.endpoints:
+                if not endpoint.idle:
+                    continue
+                block = self.queue.popleft() if self.queue else self.duplicate_straggler(endpoint)
+                if block is None:
+                    break
+                self.launch(endpoint, block)
+            if any(endpoint.attempt is not None for endpoint in self.endpoints):
+                return
+            if all(endpoint.retired for endpoint in self.endpoints):
+                raise RuntimeError('No endpoints are left to calculate blocks, see above for errors.')
+
+    def overdue(self, attempt: Attempt, now: float) -> float:
+        """Internal. Seconds the attempt has been running past the time it should have taken"""
+        rows = attempt.block.stop - attempt.block.start
+        expected = self.straggler_factor * median(self.seconds_per_row) * rows + self.straggler_grace
+        return now - attempt.started - expected
+
+    def stragglers(self, now: float) -> list[Attempt]:
+        """Internal. Overdue attempts of blocks that no other endpoint is calculating too"""
+        if not self.seconds_per_row:
+            return []
+        attempts = [other.attempt for other in self.endpoints if other.attempt is not None]
+        copies = dict()
+        for attempt in attempts:
+            copies[attempt.block.index] = copies.get(attempt.block.index, 0) + 1
+        return [
+            attempt for attempt in attempts
+            if copies[attempt.block.index] == 1 and self.overdue(attempt, now) >= 0]
+
+    def next_straggler(self) -> float | None:
+        """Internal. Seconds until an idle endpoint may duplicate a straggler, None if never"""
+        if self.queue or not self.seconds_per_row:
+            return None
+        if not any(endpoint.idle for endpoint in self.endpoints):
+            return None
+        now = perf_counter()
+        waits = [
+            -self.overdue(endpoint.attempt, now)
+            for endpoint in self.endpoints if endpoint.attempt is not None]
+        return max(0.0, min(waits)) if waits else None
+
+    def duplicate_straggler(self, endpoint: Endpoint) -> Block | None:
+        """Internal. The longest running of the overdue blocks, to be calculated again by endpoint"""
+        now = perf_counter()
+        stragglers = self.stragglers(now)
+        if not stragglers:
+            return None
+        attempt = min(stragglers, key=lambda attempt: attempt.started)
+        block = attempt.block
+        expected = median(self.seconds_per_row) * (block.stop - block.start)
+        self.output.write(
+            f'Block of rows {block.start}-{block.stop} has been running for {now - attempt.started:.1f}s, '
+            f'while such blocks take {expected:.1f}s at the median, duplicating it on {endpoint.name}\n')
+        return block
+
+    def launch(self, endpoint: Endpoint, block: Block):
+        """Internal. Each attempt writes to its own directory, so that copies never collide"""
+        attempt = self.tries.get(block.index, 0) + 1
+        self.tries[block.index] = attempt
+        directory = self.directory(block.start, attempt)
+        directory.mkdir(parents=True, exist_ok=True)
+        kwargs = dict(self.kwargs, output_directory=directory, start=block.start, stop=block.stop)
+        command = Command(block.index, self.task, (), kwargs)
+        try:
+            endpoint.send(command)
+        except (OSError, SendFileError) as exception:
+            endpoint.disconnect()
+            self.failed(endpoint, Attempt(block, directory, perf_counter()), f'could not send the block: {exception}')
+            return
+        endpoint.attempt = Attempt(block, directory, perf_counter())
+
+    def handle(self, item):
+        """Internal. Receive from the endpoint the ready connection or sentinel belongs to"""
+        for endpoint in self.endpoints:
+            if item in endpoint.waitables():
+                break
+        else:
+            return
+        try:
+            if item is endpoint.channel.connection:
+                self.receive(endpoint, endpoint.channel.receive())
+                return
+            # The process exited, but may have sent its result first
+            while endpoint.channel.poll():
+                self.receive(endpoint, endpoint.channel.receive())
+        except (EOFError, OSError):
+            pass
+        attempt = endpoint.attempt
+        exitcode = endpoint.disconnect()
+        if attempt is not None:
+            self.failed(endpoint, attempt, f'process exited with code {exitcode}')
+
+    def receive(self, endpoint: Endpoint, messages: list[tuple[Kind, Any]]):
+        for kind, message in messages:
+            if kind in (Kind.Stdout, Kind.Stderr):
+                self.output.write(message)
+            elif kind == Kind.Result:
+                self.deliver(endpoint, message[1])
+
+    def deliver(self, endpoint: Endpoint, report):
+        """Internal. Handle the report of the block calculated by the endpoint"""
+        attempt = endpoint.attempt
+        if attempt is None:
+            return
+        try:
+            report = endpoint.executor.finish(endpoint.command, report)
+        except Exception as exception:
+            report = ReportFail(report.id, exception, traceback.format_exc())
+        endpoint.attempt = None
+        if isinstance(report, ReportDone):
+            self.done(endpoint, attempt)
+        elif isinstance(report, ReportFail):
+            self.output.write(report.traceback)
+            self.failed(endpoint, attempt, str(report.exception) or type(report.exception).__name__)
+        elif isinstance(report, ReportExit):
+            self.failed(endpoint, attempt, f'process exited with code {report.exit_code}')
+
+    def done(self, endpoint: Endpoint, attempt: Attempt):
+        endpoint.failures = 0
+        block = attempt.block
+        if block.index in self.finished:
+            return
+        self.finished[block.index] = attempt.directory
+        self.rows += block.stop - block.start
+        self.seconds_per_row.append((perf_counter() - attempt.started) / max(1, block.stop - block.start))
+        for other in self.endpoints:
+            if other.attempt is not None and other.attempt.block.index == block.index:
+                other.disconnect()
+
+    def failed(self, endpoint: Endpoint, attempt: Attempt, reason: str):
+        block = attempt.block
+        self.output.write(f'Block of rows {block.start}-{block.stop} failed on {endpoint.name}: {reason}\n')
+        endpoint.failures += 1
+        if endpoint.failures >= self.max_failures:
+            endpoint.retired = True
+            self.output.write(f'Retired {endpoint.name} after {endpoint.failures} failures in a row\n')
+        running = any(
+            other.attempt is not None and other.attempt.block.index == block.index
+            for other in self.endpoints)
+        if block.index in self.finished or running:
+            return
+        if self.tries[block.index] >= self.max_attempts:
+            raise RuntimeError(f'Block of rows {block.start}-{block.stop} failed {self.tries[block.index]} times: {reason}')
+        self.queue.appendleft(block)
+
+    def announce(self, ready: Callable[[list[Path]], None]):
+        """Internal. Pass on the directories of blocks finished since last time, once all before them are"""
+        directories = []
+        while self.announced in self.finished:
+            directories.append(self.finished[self.announced])
+            self.announced += 1
+        if directories:
+            ready(directories)
@@ -16,7 +16,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # -----------------------------------------------------------------------------
 
-from typing import Callable, NamedTuple
+from typing import Callable
 import io
 import sys
 
@@ -107,41 +107,3 @@ class WriterIO(io.TextIOBase):
     def writelines(self, lines):
         for line in lines:
             self.writeline(line)
-
-
-class PipeWrite(NamedTuple):
-    tag: int
-    text: str
-
-
-class PipeWriterIO(io.TextIOBase):
-    """File-like object that writes to a pipe connection"""
-
-    def __init__(self, connection, tag=None):
-        super().__init__()
-        self.connection = connection
-        self.tag = tag
-
-    def close(self):
-        self.flush()
-        self.connection.close()
-        self.closed = True
-
-    def fileno(self):
-        return self.connection.fileno()
-
-    def readable(self):
-        return False
-
-    def writable(self):
-        return True
-
-    def write(self, text):
-        self.connection.send(PipeWrite(self.tag, text))
-
-    def writelines(self, lines):
-        for line in lines:
-            self.connection.send(line+'\n')
-
-    def flush(self):
-        pass
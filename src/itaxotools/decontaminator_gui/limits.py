@@ -0,0 +1,137 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Priority, CPU, thread and memory limits of worker processes"""
+
+from __future__ import annotations
+
+import os
+import sys
+from dataclasses import dataclass
+
+from .scratch import environment_value, parse_size
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ENV_NICE = 'DECONTAMINATOR_WORKER_NICE'
+ENV_CPUS = 'DECONTAMINATOR_WORKER_CPUS'
+ENV_THREADS = 'DECONTAMINATOR_WORKER_THREADS'
+ENV_MEMORY = 'DECONTAMINATOR_WORKER_MEMORY'
+
+DEFAULT_NICE = 10
+
+THREAD_VARIABLES = [
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+]
+
+
+class MemoryLimitError(MemoryError):
+    """Replaces memory errors raised by commands, with advice"""
+
+    @classmethod
+    def within(cls, memory: int | None) -> MemoryLimitError:
+        limit = f' within the worker limit of {memory / 1e9:.1f} GB' if memory else ''
+        return cls(f'Ran out of memory{limit}: reduce input or enable streaming.')
+
+
+def parse_cpus(text: str) -> frozenset[int]:
+    """Parse CPU lists such as '0-3,6' to a set of CPU numbers"""
+    cpus = set()
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+    return frozenset(cpus)
+
+
+@dataclass(frozen=True)
+class WorkerLimits:
+    """
+    Applied by each worker process when it starts, any of these left as
+    None keeps what was inherited from the GUI. The nice level is absolute
+    and can only be raised by unprivileged users, threads limits BLAS and
+    OpenMP pools, and memory caps the address space in bytes.
+    """
+
+    nice: int | None = DEFAULT_NICE
+    cpus: frozenset[int] | None = None
+    threads: int | None = None
+    memory: int | None = None
+
+    @classmethod
+    def from_environment(cls) -> WorkerLimits:
+        return cls(
+            nice=environment_value(ENV_NICE, int, DEFAULT_NICE),
+            cpus=environment_value(ENV_CPUS, parse_cpus),
+            threads=environment_value(ENV_THREADS, int),
+            memory=environment_value(ENV_MEMORY, parse_size),
+        )
+
+    def apply(self):
+        """Called by the worker process itself, failures are only reported"""
+        for name, method in [
+            ('nice level', self.apply_nice),
+            ('CPU affinity', self.apply_cpus),
+            ('thread count', self.apply_threads),
+            ('memory limit', self.apply_memory),
+        ]:
+            try:
+                method()
+            except (OSError, ValueError) as exception:
+                print(f'Could not set worker {name}: {exception}', file=sys.stderr)
+
+    def apply_nice(self):
+        if self.nice is None or not hasattr(os, 'nice'):
+            return
+        current = os.nice(0)
+        if self.nice > current:
+            os.nice(self.nice - current)
+
+    def apply_cpus(self):
+        if self.cpus is None or not hasattr(os, 'sched_setaffinity'):
+            return
+        os.sched_setaffinity(0, self.cpus)
+
+    def apply_threads(self):
+        if self.threads is None:
+            return
+        # Pools that are not started yet, including those of child processes
+        for variable in THREAD_VARIABLES:
+            os.environ[variable] = str(self.threads)
+        # Pools inherited from the GUI process, if they can be reached
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            return
+        threadpool_limits(self.threads)
+
+    def apply_memory(self):
+        if self.memory is None or resource is None or not hasattr(resource, 'RLIMIT_AS'):
+            return
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        soft = self.memory if hard == resource.RLIM_INFINITY else min(self.memory, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
@@ -0,0 +1,218 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Log files written on a background thread, rotated and compressed by size"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import os
+import queue
+import shutil
+import sys
+import threading
+from pathlib import Path
+from time import monotonic
+
+MAX_BYTES = 16 << 20
+BACKUPS = 3
+
+
+class LogFile(io.TextIOBase):
+    """
+    Stream to add to a `StreamGroup`. Writing only queues the text, and
+    never blocks: if the queue is full the text is dropped, and a note of
+    how many writes were lost is logged with the next one that fits.
+    """
+
+    def __init__(self, writer: LogWriter, path: Path):
+        super().__init__()
+        self.writer = writer
+        self.path = Path(path)
+        self.dropped = 0
+        # Only used by the writer thread
+        self.sink = None
+        self.size = 0
+        self.dirty = False
+        self.failed = False
+
+    def readable(self):
+        return False
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        try:
+            self.writer.queue.put_nowait((self, text, self.dropped))
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped = 0
+        return len(text)
+
+    def flush(self):
+        """Ask for buffered text to be written out soon, without waiting"""
+        try:
+            self.writer.queue.put_nowait((self, '', self.dropped))
+        except queue.Full:
+            pass
+        else:
+            self.dropped = 0
+
+    def close(self):
+        """The file is closed once all text written before is"""
+        if self.closed:
+            return
+        super().close()
+        try:
+            self.writer.queue.put((self, None, self.dropped), timeout=self.writer.timeout)
+        except queue.Full:
+            pass
+
+
+class LogWriter:
+    """
+    Owns a thread that writes the text queued by its log files, so that
+    slow disks never hold back the thread producing it. Files are opened
+    on first write with a large buffer, flushed at least every interval,
+    and once they grow beyond `max_bytes` they are compressed to `.1.gz`,
+    shifting older copies up to `backups`.
+    """
+
+    def __init__(
+        self, name: str = 'Log writer', capacity: int = 4096, interval: float = 1.0,
+        max_bytes: int = MAX_BYTES, backups: int = BACKUPS, buffer_size: int = 1 << 16,
+    ):
+        self.queue = queue.Queue(capacity)
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.buffer_size = buffer_size
+        self.timeout = 5.0
+        self.files: set[LogFile] = set()
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def open(self, path: Path) -> LogFile:
+        return LogFile(self, path)
+
+    def close(self):
+        """Write out everything queued so far, then stop"""
+        try:
+            self.queue.put(None, timeout=self.timeout)
+        except queue.Full:
+            return
+        self.thread.join(self.timeout)
+
+    def run(self):
+        last_flush = monotonic()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                file, text, dropped = item
+                if dropped:
+                    self.write(file, f'\n[{dropped} log messages dropped]\n')
+                if text is None:
+                    self.release(file)
+                elif text:
+                    self.write(file, text)
+                else:
+                    self.flush_file(file)
+            if monotonic() - last_flush >= self.interval:
+                self.flush()
+                last_flush = monotonic()
+        for file in list(self.files):
+            self.release(file)
+
+    def write(self, file: LogFile, text: str):
+        if file.failed:
+            return
+        try:
+            if file.sink is None:
+                file.sink = open(file.path, 'ab', buffering=self.buffer_size)
+                file.size = file.sink.tell()
+                self.files.add(file)
+            data = text.encode('utf-8', 'replace')
+            file.sink.write(data)
+            file.size += len(data)
+            file.dirty = True
+            if file.size >= self.max_bytes:
+                self.rotate(file)
+        except OSError as exception:
+            self.fail(file, exception)
+
+    def flush(self):
+        for file in list(self.files):
+            self.flush_file(file)
+
+    def flush_file(self, file: LogFile):
+        if file.sink is None or not file.dirty:
+            return
+        try:
+            file.sink.flush()
+            file.dirty = False
+        except OSError as exception:
+            self.fail(file, exception)
+
+    def rotate(self, file: LogFile):
+        file.sink.close()
+        file.sink = None
+        self.files.discard(file)
+        path = file.path
+
+        def backup(index: int) -> Path:
+            return path.with_name(f'{path.name}.{index}.gz')
+
+        backup(self.backups).unlink(missing_ok=True)
+        for index in range(self.backups - 1, 0, -1):
+            if backup(index).exists():
+                os.replace(backup(index), backup(index + 1))
+        if self.backups > 0:
+            with open(path, 'rb') as source, gzip.open(backup(1), 'wb') as destination:
+                shutil.copyfileobj(source, destination)
+        path.unlink()
+
+    def release(self, file: LogFile):
+        self.files.discard(file)
+        if file.sink is None:
+            return
+        try:
+            file.sink.close()
+        except OSError as exception:
+            self.fail(file, exception)
+        file.sink = None
+
+    def fail(self, file: LogFile, exception: OSError):
+        """Stop writing to a file that cannot be written, once"""
+        file.failed = True
+        self.files.discard(file)
+        if file.sink is not None:
+            try:
+                file.sink.close()
+            except OSError:
+                pass
+            file.sink = None
+        if sys.__stderr__ is not None:
+            print(f'Could not write log file {file.path}: {exception}', file=sys.__stderr__)
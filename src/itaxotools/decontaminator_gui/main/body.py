@@ -83,12 +83,14 @@ class Body(QtWidgets.QStackedWidget):
 
         self.binder.bind(task.properties.ready, self.actions.start.setEnabled)
         self.binder.bind(task.properties.editable, self.actions.start.setVisible)
+        self.binder.bind(task.properties.resumable, self.actions.resume.setVisible)
         self.binder.bind(task.properties.busy, self.actions.stop.setVisible)
         self.binder.bind(task.properties.busy, self.actions.home.setEnabled, lambda busy: not busy)
         self.binder.bind(task.properties.done, self.actions.save.setEnabled)
         self.binder.bind(task.properties.done, self.actions.clear.setVisible)
 
         self.binder.bind(self.actions.start.triggered, view.start)
+        self.binder.bind(self.actions.resume.triggered, view.resume)
         self.binder.bind(self.actions.stop.triggered, view.stop)
         self.binder.bind(self.actions.save.triggered, view.save)
         self.binder.bind(self.actions.clear.triggered, view.clear)
@@ -100,6 +102,7 @@ class Body(QtWidgets.QStackedWidget):
         self.setCurrentWidget(self.dashboard)
         self.binder.unbind_all()
         self.actions.stop.setVisible(False)
+        self.actions.resume.setVisible(False)
         self.actions.clear.setVisible(False)
         self.actions.start.setVisible(True)
         self.actions.start.setEnabled(False)
@@ -16,7 +16,13 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # -----------------------------------------------------------------------------
 
-from PySide6 import QtWidgets
+from PySide6 import QtCore, QtGui, QtWidgets
+
+from pathlib import Path
+
+from .. import app
+from ..scratch import parse_size
+from ..utility import human_readable_size
 
 
 class Footer(QtWidgets.QLabel):
@@ -38,3 +44,55 @@ class Footer(QtWidgets.QLabel):
                 border: 1px solid palette(Mid);
                 }
             """)
+        self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.showMenu)
+        self.setToolTip('Right click to configure scratch space or monitor workers')
+
+        action = QtGui.QAction('Show resource &monitor', self)
+        action.setShortcut('Ctrl+M')
+        action.setStatusTip('Show CPU, memory and I/O usage of task workers')
+        action.setCheckable(True)
+        self.monitorAction = action
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.updateUsage)
+        self.timer.start(1000)
+        self.updateUsage()
+
+    def updateUsage(self):
+        manager = app.scratch.manager
+        usage = human_readable_size(manager.usage())
+        if manager.quota is not None:
+            usage += f' of {human_readable_size(manager.quota)}'
+        self.setText(f'Scratch: {usage} in {manager.root}')
+
+    def showMenu(self, position):
+        menu = QtWidgets.QMenu(self)
+        menu.addAction('Change scratch directory...', self.changeRoot)
+        menu.addAction('Set scratch quota...', self.changeQuota)
+        menu.addSeparator()
+        menu.addAction(self.monitorAction)
+        menu.exec(self.mapToGlobal(position))
+
+    def changeRoot(self):
+        manager = app.scratch.manager
+        filename = QtWidgets.QFileDialog.getExistingDirectory(
+            self.window(), f'{app.title} - Scratch directory', str(manager.root))
+        if filename:
+            manager.set_root(Path(filename))
+            self.updateUsage()
+
+    def changeQuota(self):
+        manager = app.scratch.manager
+        current = human_readable_size(manager.quota).replace(' ', '') if manager.quota else ''
+        text, ok = QtWidgets.QInputDialog.getText(
+            self.window(), f'{app.title} - Scratch quota',
+            'Maximum space for task results (e.g. 500M, 20G), empty for no limit:',
+            text=current)
+        if not ok:
+            return
+        try:
+            manager.set_quota(parse_size(text) if text.strip() else None)
+        except ValueError:
+            QtWidgets.QMessageBox.warning(self.window(), app.title, f'Invalid size: {text}')
+        self.updateUsage()
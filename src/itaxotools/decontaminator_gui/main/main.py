@@ -31,6 +31,7 @@ from ..utility import PropertyObject, Property
 from .body import Body
 from .footer import Footer
 from .header import Header
+from .monitor import ResourceMonitor
 from .sidebar import SideBar
 
 
@@ -82,6 +83,13 @@ class Main(ToolDialog):
         action.setStatusTip('Run MolD')
         self.actions.start = action
 
+        action = QtGui.QAction('Res&ume', self)
+        action.setIcon(app.resources.icons.run)
+        action.setShortcut('Ctrl+Shift+R')
+        action.setStatusTip('Resume the interrupted run from its last checkpoint')
+        action.setVisible(False)
+        self.actions.resume = action
+
         action = QtGui.QAction('S&top', self)
         action.setIcon(app.resources.icons.stop)
         action.setShortcut(QtGui.QKeySequence.Cancel)
@@ -100,9 +108,13 @@ class Main(ToolDialog):
         self.widgets.header = Header(self)
         self.widgets.sidebar = SideBar(self)
         self.widgets.body = Body(self)
+        self.widgets.monitor = ResourceMonitor(self)
         self.widgets.footer = Footer(self)
 
         self.widgets.sidebar.setVisible(False)
+        self.widgets.monitor.setVisible(False)
+        self.widgets.footer.monitorAction.toggled.connect(self.widgets.monitor.setVisible)
+        self.addAction(self.widgets.footer.monitorAction)
 
         for action in self.actions:
             self.widgets.header.toolBar.addAction(action)
@@ -112,7 +124,8 @@ class Main(ToolDialog):
         layout.addWidget(self.widgets.header, 0, 0, 1, 2)
         layout.addWidget(self.widgets.sidebar, 1, 0, 1, 1)
         layout.addWidget(self.widgets.body, 1, 1, 1, 1)
-        layout.addWidget(self.widgets.footer, 2, 0, 1, 2)
+        layout.addWidget(self.widgets.monitor, 2, 0, 1, 2)
+        layout.addWidget(self.widgets.footer, 3, 0, 1, 2)
         layout.setSpacing(0)
         layout.setColumnStretch(1, 1)
         layout.setContentsMargins(0, 0, 0, 0)
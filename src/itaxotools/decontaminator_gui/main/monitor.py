@@ -0,0 +1,183 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+from PySide6 import QtCore, QtGui, QtWidgets
+
+from itaxotools.common.utility import override
+
+from .. import app
+from ..model.common import TaskModel
+from ..monitor import ProcessMonitor, is_supported
+from ..utility import human_readable_size
+
+
+class Sparkline(QtWidgets.QWidget):
+    """Filled line of recent values, scaled to the largest one or a floor"""
+
+    def __init__(self, floor: float = 1.0, parent=None):
+        super().__init__(parent)
+        self.floor = floor
+        self.values: list[float] = []
+        self.setFixedSize(90, 20)
+
+    def setValues(self, values: list[float]):
+        self.values = values
+        self.update()
+
+    @override
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        palette = self.palette()
+        rect = self.rect().adjusted(0, 1, -1, -1)
+        painter.fillRect(rect, palette.color(QtGui.QPalette.Base))
+        if len(self.values) < 2:
+            return
+        top = max(max(self.values), self.floor)
+        step = rect.width() / (len(self.values) - 1)
+        points = [
+            QtCore.QPointF(rect.left() + index * step, rect.bottom() - rect.height() * value / top)
+            for index, value in enumerate(self.values)
+        ]
+        area = QtGui.QPolygonF([QtCore.QPointF(rect.left(), rect.bottom()), *points, QtCore.QPointF(rect.right(), rect.bottom())])
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        color = palette.color(QtGui.QPalette.Highlight)
+        painter.setPen(QtCore.Qt.NoPen)
+        fill = QtGui.QColor(color)
+        fill.setAlpha(60)
+        painter.setBrush(fill)
+        painter.drawPolygon(area)
+        painter.setPen(QtGui.QPen(color, 1.5))
+        painter.drawPolyline(QtGui.QPolygonF(points))
+
+
+class WorkerRow:
+    """Widgets showing the samples of one worker process"""
+
+    def __init__(self, name: str, pid: int):
+        self.monitor = ProcessMonitor(pid)
+        self.name = QtWidgets.QLabel(name)
+        self.cpu = Sparkline(100.0)
+        self.cpu_text = QtWidgets.QLabel()
+        self.rss = Sparkline(1 << 20)
+        self.rss_text = QtWidgets.QLabel()
+        self.io = Sparkline(1 << 20)
+        self.io_text = QtWidgets.QLabel()
+        self.files = QtWidgets.QLabel()
+        for label in [self.cpu_text, self.rss_text, self.io_text, self.files]:
+            label.setAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+
+    def widgets(self) -> list[QtWidgets.QWidget]:
+        return [self.name, self.cpu, self.cpu_text, self.rss, self.rss_text, self.io, self.io_text, self.files]
+
+    def update(self):
+        sample = self.monitor.sample()
+        if sample is None:
+            return
+        samples = self.monitor.samples
+        self.cpu.setValues([s.cpu for s in samples])
+        self.cpu_text.setText(f'{sample.cpu:.0f}%')
+        self.rss.setValues([s.rss for s in samples])
+        self.rss_text.setText(human_readable_size(sample.rss))
+        self.io.setValues([s.read_rate + s.write_rate for s in samples])
+        self.io_text.setText(f'R {human_readable_size(sample.read_rate)}/s  W {human_readable_size(sample.write_rate)}/s')
+        self.files.setText(str(sample.open_files))
+
+    def delete(self):
+        for widget in self.widgets():
+            widget.deleteLater()
+
+
+class ResourceMonitor(QtWidgets.QFrame):
+    """
+    Live CPU, memory, I/O and open files of the worker process of each
+    task, with a short history. Samples are only taken while visible.
+    """
+
+    headers = ['Task', 'CPU', '', 'Memory', '', 'I/O', '', 'Files']
+
+    def __init__(self, parent=None, interval: int = 1000):
+        super().__init__(parent)
+        self.setStyleSheet("""
+            ResourceMonitor {
+                background: palette(Window);
+                border-top: 1px solid palette(Dark);
+                }
+            """)
+        self.rows: dict[tuple[str, int], WorkerRow] = dict()
+
+        layout = QtWidgets.QGridLayout()
+        for column, text in enumerate(self.headers):
+            label = QtWidgets.QLabel(text)
+            label.setStyleSheet('color: palette(Shadow);')
+            layout.addWidget(label, 0, column)
+        layout.setColumnStretch(0, 1)
+        layout.setHorizontalSpacing(8)
+        layout.setVerticalSpacing(2)
+        layout.setContentsMargins(10, 4, 10, 4)
+        self.setLayout(layout)
+
+        self.empty = QtWidgets.QLabel(
+            'No running workers' if is_supported() else
+            'Resource monitoring requires psutil on this platform')
+        self.empty.setStyleSheet('color: palette(Mid);')
+        layout.addWidget(self.empty, 1, 0, 1, len(self.headers))
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.sample)
+
+    @override
+    def showEvent(self, event):
+        self.sample()
+        self.timer.start()
+        super().showEvent(event)
+
+    @override
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def workers(self) -> list[tuple[str, int]]:
+        workers = []
+        for item in app.model.items.tasks.children:
+            task = item.object
+            if not isinstance(task, TaskModel):
+                continue
+            process = task.worker.process
+            if process is not None and process.pid is not None:
+                workers.append((task.name, process.pid))
+        return workers
+
+    def sample(self):
+        workers = self.workers()
+        if list(self.rows) != workers:
+            self.arrange(workers)
+        for row in self.rows.values():
+            row.update()
+
+    def arrange(self, workers: list[tuple[str, int]]):
+        """Keep the history of workers still running, their process included"""
+        rows = {key: self.rows.pop(key, None) or WorkerRow(*key) for key in workers}
+        for row in self.rows.values():
+            row.delete()
+        self.rows = rows
+        layout = self.layout()
+        for index, row in enumerate(rows.values(), 1):
+            for column, widget in enumerate(row.widgets()):
+                layout.addWidget(widget, index, column)
+        self.empty.setVisible(not rows)
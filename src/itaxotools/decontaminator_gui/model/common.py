@@ -20,14 +20,21 @@ from PySide6 import QtCore
 
 import itertools
 from collections import defaultdict
+from datetime import datetime
 from typing import Any, Callable, List
-from tempfile import TemporaryDirectory
 from pathlib import Path
 
 from itaxotools.common.utility import override
 
+from .. import app
+from ..checkpoint import is_resumable, parameter_hash
 from ..io import WriterIO
-from ..threading import ReportProgress, ReportDone, ReportFail, ReportExit, ReportStop, Worker
+from ..performance import load_report
+from ..scratch import ScratchSpaceError
+from ..threading import ReportProgress, ReportDone, ReportFail, ReportExit, ReportStop, TransferWorker, Worker
+from ..tracing import Tracer, close_open
+from ..transfer import TransferResult, staging_directory
+from ..utility import human_readable_size
 from ..types import Notification, Type
 from ..utility import Property, PropertyObject, PropertyRef
 
@@ -71,22 +78,30 @@ class TaskModel(Object):
     busy = Property(bool, False)
     done = Property(bool, False)
     editable = Property(bool, True)
+    output_directory = Property(Path, None)
+    performance = Property(dict, None)
+    profile = Property(bool, False)
+    resumable = Property(bool, False)
 
     counters = defaultdict(lambda: itertools.count(1, 1))
 
     def __init__(self, name=None):
         super().__init__(name or self._get_next_name())
 
-        self.temporary_directory = TemporaryDirectory(prefix=f'{self.task_name}_')
-        self.temporary_path = Path(self.temporary_directory.name)
+        self.temporary_path = app.scratch.manager.create_task_dir(prefix=f'{self.task_name}_')
 
-        self.worker = Worker(name=self.name, eager=True, log_path=self.temporary_path)
-        self.worker.done.connect(self.onDone)
-        self.worker.fail.connect(self.onFail)
-        self.worker.error.connect(self.onError)
-        self.worker.stop.connect(self.onStop)
+        self.worker = Worker(name=self.name, eager=True, log_path=self.temporary_path, limits=app.workers.limits, executor=app.workers.executor)
+        self.worker.done.connect(self.traced(self.onDone))
+        self.worker.fail.connect(self.traced(self.onFail))
+        self.worker.error.connect(self.traced(self.onError))
+        self.worker.stop.connect(self.traced(self.onStop))
         self.worker.progress.connect(self.onProgress)
 
+        self.transfer = None
+        self.work_dir = None
+        self.interrupted = None
+        self.resuming = False
+
         self.textLogIO = WriterIO(self.logLine.emit)
         self.worker.streamOut.add(self.textLogIO)
         self.worker.streamErr.add(self.textLogIO)
@@ -108,19 +123,34 @@ class TaskModel(Object):
     def __repr__(self):
         return f'{self.task_name}({repr(self.name)})'
 
+    def traced(self, handler: Callable) -> Callable:
+        """Wrap a report handler to trace its execution, then export the trace of the command"""
+        def slot(report):
+            trace = report.trace or []
+            close_open(trace)
+            tracer = Tracer()
+            tracer.name_thread('Main thread')
+            with tracer.span(handler.__name__, 'gui', id=report.id):
+                handler(report)
+            self.worker.save_trace(report.id, trace + tracer.events)
+        return slot
+
     def onProgress(self, report: ReportProgress):
         self.progression.emit(report)
 
     def onFail(self, report: ReportFail):
         self.notification.emit(Notification.Fail(str(report.exception), report.traceback))
+        self.discard_work_dir()
         self.busy = False
 
     def onError(self, report: ReportExit):
         self.notification.emit(Notification.Fail(f'Process failed with exit code: {report.exit_code}'))
+        self.discard_work_dir()
         self.busy = False
 
     def onStop(self, report: ReportStop):
         self.notification.emit(Notification.Warn('Cancelled by user.'))
+        self.discard_work_dir()
         self.busy = False
 
     def onDone(self, report: ReportDone):
@@ -129,14 +159,41 @@ class TaskModel(Object):
         self.busy = False
         self.done = True
 
+    def onIODone(self, report: ReportDone):
+        """Overload this to handle results of commands sent through exec_io()"""
+        pass
+
+    def onIOFail(self, report: ReportFail | ReportExit):
+        """Overload this to also reset state after a failed exec_io() command"""
+        if isinstance(report, ReportFail):
+            self.notification.emit(Notification.Fail(str(report.exception), report.traceback))
+        elif isinstance(report, ReportExit):
+            self.notification.emit(Notification.Fail(f'I/O process failed with exit code: {report.exit_code}'))
+
+    def onSaved(self, result: TransferResult):
+        """Overload this to handle saved results"""
+        size = human_readable_size(result.bytes)
+        self.notification.emit(Notification.Info(f'Saved files successfully! ({size}: {result.summary()})'))
+        self.busy = False
+
     def start(self):
         """Slot for starting the task"""
         self.progression.emit(ReportProgress('Preparing for execution...'))
         self.logClear.emit()
         self.busy = True
 
+    def resume(self):
+        """Slot for continuing an interrupted run from its last checkpoint"""
+        self.resuming = True
+        try:
+            self.start()
+        finally:
+            self.resuming = False
+
     def stop(self):
         """Slot for interrupting the task"""
+        if self.transfer is not None and self.transfer.isRunning():
+            self.transfer.cancel()
         if self.worker is None:
             return
         self.worker.reset()
@@ -145,6 +202,70 @@ class TaskModel(Object):
         """Slot for saving results"""
         pass
 
+    def estimate_output_size(self) -> int:
+        """Overload this with a rough upper bound of the bytes a run will write"""
+        return 0
+
+    def create_work_dir(self) -> Path | None:
+        """
+        Call this from start() for a new directory for the task to write into.
+        When an output directory is set, this is staged inside it and the task
+        is expected to publish its files to a new subdirectory once done.
+        Returns None and reports failure if there is not enough room for the
+        expected results.
+        """
+        estimate = self.estimate_output_size()
+        try:
+            if self.output_directory is None:
+                self.work_dir = app.scratch.manager.create_run(self.temporary_path, estimate)
+            else:
+                app.scratch.manager.check_free_space(self.output_directory, estimate)
+                timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+                self.work_dir = staging_directory(self.output_directory, timestamp)
+        except ScratchSpaceError as exception:
+            self.onFail(ReportFail(None, exception, ''))
+            return None
+        return self.work_dir
+
+    def finish_work_dir(self, path: Path):
+        """Call this once results are in, to account for scratch usage and load the performance report"""
+        self.work_dir = None
+        self.update_work_dir(path)
+
+    def update_work_dir(self, path: Path):
+        """Call this after adding to finished results, to account for the new files and reload the report"""
+        app.scratch.manager.finish_run(path)
+        self.performance = load_report(path)
+
+    def discard_work_dir(self):
+        """Remove leftovers of an interrupted run, unless they hold a checkpoint to resume from"""
+        if self.work_dir is None:
+            return
+        if is_resumable(self.work_dir):
+            self.forget_interrupted()
+            self.interrupted = self.work_dir
+            self.resumable = True
+        else:
+            app.scratch.manager.discard_run(self.work_dir)
+        self.work_dir = None
+
+    def forget_interrupted(self):
+        if self.interrupted is not None:
+            app.scratch.manager.discard_run(self.interrupted)
+            self.interrupted = None
+        self.resumable = False
+
+    def save_results(self, source: Path, destination: Path):
+        """Call this from save() to transfer results without blocking"""
+        self.progression.emit(ReportProgress('Saving results...'))
+        self.busy = True
+        self.transfer = TransferWorker('save', source, destination)
+        self.transfer.done.connect(self.onSaved)
+        self.transfer.fail.connect(self.onFail)
+        self.transfer.stop.connect(self.onStop)
+        self.transfer.progress.connect(self.onProgress)
+        self.transfer.start()
+
     def clear(self):
         """Slot for discarding results"""
         self.done = False
@@ -165,8 +286,37 @@ class TaskModel(Object):
         self.editable = not (self.busy or self.done)
 
     def exec(self, id: Any, task: Callable, *args, **kwargs):
-        """Call this from start() to execute tasks"""
-        self.worker.exec(id, task, *args, **kwargs)
+        """Call this from start() to execute tasks, profiled if requested"""
+        if self.profile:
+            self.worker.exec_profiled(id, task, *args, **kwargs)
+        else:
+            self.worker.exec(id, task, *args, **kwargs)
+
+    def exec_io(self, id: Any, task: Callable, *args, **kwargs):
+        """
+        Call this for short commands such as inspecting files, which are then
+        executed on the shared I/O worker, even while the task is running.
+        Reports are handled by onIODone() and onIOFail().
+        """
+        app.workers.io().exec(id, self.onIODone, self.onIOFail, task, *args, **kwargs)
+
+    def exec_checkpointed(self, id: Any, task: Callable, **kwargs):
+        """
+        Call this from start() instead of exec() for tasks that checkpoint
+        their progress given a key. When resuming with the same parameters,
+        the work directory of the interrupted run replaces the new one.
+        """
+        key = parameter_hash(task.__name__, kwargs)
+        if self.resuming and self.interrupted is not None:
+            if is_resumable(self.interrupted, key):
+                app.scratch.manager.discard_run(self.work_dir)
+                app.scratch.manager.pin(self.interrupted)
+                self.work_dir = kwargs['work_dir'] = self.interrupted
+                self.interrupted = None
+            else:
+                self.notification.emit(Notification.Warn('Parameters changed since the run was interrupted, starting over.'))
+        self.forget_interrupted()
+        self.exec(id, task, checkpoint_key=key, **kwargs)
 
 
 class Item:
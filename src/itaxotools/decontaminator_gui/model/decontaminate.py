@@ -16,15 +16,13 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # -----------------------------------------------------------------------------
 
-from datetime import datetime
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from shutil import copytree
 
 from .. import app
 from ..tasks import decontaminate
 from ..model import Item, ItemModel, Object
-from ..types import DecontaminateMode, Notification, InputFile, PairwiseScore, DistanceMetric, AlignmentMode, StatisticsGroup, DecontaminateSubtask
+from ..types import DecontaminateMode, Notification, InputFile, PairwiseScore, DistanceMetric, AlignmentMode, StatisticsGroup, DecontaminateSubtask, PairPolicy, PairCompression
 from ..utility import EnumObject, Property, Instance, Binder, human_readable_seconds
 from .common import TaskModel
 from .sequence import SequenceModel2
@@ -63,6 +61,10 @@ class DecontaminateModel(TaskModel):
 
     alignment_mode = Property(AlignmentMode, AlignmentMode.PairwiseAlignment)
     alignment_write_pairs = Property(bool, True)
+    alignment_pairs_policy = Property(PairPolicy, PairPolicy.TopK)
+    alignment_pairs_cutoff = Property(float, 0.05)
+    alignment_pairs_top_k = Property(int, 10)
+    alignment_pairs_compression = Property(PairCompression, PairCompression.Gzip)
 
     pairwise_scores = Property(PairwiseScores, Instance)
 
@@ -115,6 +117,9 @@ class DecontaminateModel(TaskModel):
             self.properties.distance_metric,
             self.properties.distance_metric_bbc_k,
             self.properties.distance_precision,
+            self.properties.alignment_write_pairs,
+            self.properties.alignment_pairs_policy,
+            self.properties.alignment_pairs_cutoff,
         ]
 
     def isReady(self):
@@ -132,19 +137,23 @@ class DecontaminateModel(TaskModel):
                 return False
         if self.distance_precision is None:
             return False
+        if self.alignment_write_pairs and self.alignment_pairs_policy == PairPolicy.Cutoff:
+            if self.alignment_pairs_cutoff is None:
+                return False
         return True
 
     def start(self):
         super().start()
         self.busy_main = True
-        timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
-        work_dir = self.temporary_path / timestamp
-        work_dir.mkdir()
+        work_dir = self.create_work_dir()
+        if work_dir is None:
+            return
 
-        self.exec(
+        self.exec_checkpointed(
             DecontaminateSubtask.Main,
             decontaminate.decontaminate,
             work_dir=work_dir,
+            output_directory=self.output_directory,
 
             decontaminate_mode=self.decontaminate_mode,
 
@@ -154,6 +163,10 @@ class DecontaminateModel(TaskModel):
 
             alignment_mode=self.alignment_mode,
             alignment_write_pairs=self.alignment_write_pairs,
+            alignment_pairs_policy=self.alignment_pairs_policy,
+            alignment_pairs_cutoff=self.alignment_pairs_cutoff,
+            alignment_pairs_top_k=self.alignment_pairs_top_k,
+            alignment_pairs_compression=self.alignment_pairs_compression,
             alignment_pairwise_scores = self.pairwise_scores.as_dict(),
 
             distance_metric=self.distance_metric,
@@ -170,19 +183,16 @@ class DecontaminateModel(TaskModel):
         )
 
     def add_input_file(self, path):
-        self.busy = True
         self.busy_input = True
-        self.exec(DecontaminateSubtask.AddInputFile, decontaminate.get_file_info, path)
+        self.exec_io(DecontaminateSubtask.AddInputFile, decontaminate.get_file_info, path)
 
     def add_outgroup_file(self, path):
-        self.busy = True
         self.busy_outgroup = True
-        self.exec(DecontaminateSubtask.AddOutgroupFile, decontaminate.get_file_info, path)
+        self.exec_io(DecontaminateSubtask.AddOutgroupFile, decontaminate.get_file_info, path)
 
     def add_ingroup_file(self, path):
-        self.busy = True
         self.busy_ingroup = True
-        self.exec(DecontaminateSubtask.AddIngroupFile, decontaminate.get_file_info, path)
+        self.exec_io(DecontaminateSubtask.AddIngroupFile, decontaminate.get_file_info, path)
 
     def add_file_item_from_info(self, info):
         if info.type == InputFile.Tabfile:
@@ -232,9 +242,13 @@ class DecontaminateModel(TaskModel):
             time_taken = human_readable_seconds(report.result.seconds_taken)
             self.notification.emit(Notification.Info(f'{self.name} completed successfully!\nTime taken: {time_taken}.'))
             self.dummy_results = report.result.output_directory
+            self.finish_work_dir(self.dummy_results)
             self.dummy_time = report.result.seconds_taken
             self.busy_main = False
             self.done = True
+        self.busy = False
+
+    def onIODone(self, report):
         if report.id == DecontaminateSubtask.AddInputFile:
             file_item = self.add_file_item_from_info(report.result)
             self.set_input_file_from_file_item(file_item)
@@ -247,34 +261,39 @@ class DecontaminateModel(TaskModel):
             file_item = self.add_file_item_from_info(report.result)
             self.set_ingroup_file_from_file_item(file_item)
             self.busy_ingroup = False
-        self.busy = False
+
+    def onIOFail(self, report):
+        super().onIOFail(report)
+        if report.id == DecontaminateSubtask.AddInputFile:
+            self.busy_input = False
+        if report.id == DecontaminateSubtask.AddOutgroupFile:
+            self.busy_outgroup = False
+        if report.id == DecontaminateSubtask.AddIngroupFile:
+            self.busy_ingroup = False
 
     def onStop(self, report):
         super().onStop(report)
         self.busy_main = False
-        self.busy_input = False
-        self.busy_outgroup = False
-        self.busy_ingroup = False
 
     def onFail(self, report):
         super().onFail(report)
         self.busy_main = False
-        self.busy_input = False
-        self.busy_outgroup = False
-        self.busy_ingroup = False
 
     def onError(self, report):
         super().onError(report)
         self.busy_main = False
-        self.busy_input = False
-        self.busy_outgroup = False
-        self.busy_ingroup = False
 
     def clear(self):
+        app.scratch.manager.release(self.dummy_results)
         self.dummy_results = None
+        self.performance = None
         self.dummy_time = None
         self.done = False
 
     def save(self, destination: Path):
-        copytree(self.dummy_results, destination, dirs_exist_ok=True)
-        self.notification.emit(Notification.Info('Saved files successfully!'))
+        self.busy_main = True
+        self.save_results(self.dummy_results, destination)
+
+    def onSaved(self, result):
+        super().onSaved(result)
+        self.busy_main = False
@@ -16,15 +16,13 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # -----------------------------------------------------------------------------
 
-from datetime import datetime
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from shutil import copytree
 
 from .. import app
 from ..tasks import dereplicate
 from ..model import Item, ItemModel, Object
-from ..types import Notification, InputFile, PairwiseScore, DistanceMetric, AlignmentMode, StatisticsGroup, DereplicateSubtask
+from ..types import Notification, InputFile, PairwiseScore, DistanceMetric, AlignmentMode, StatisticsGroup, DereplicateSubtask, PairPolicy, PairCompression
 from ..utility import EnumObject, Property, Instance, Binder, human_readable_seconds
 from .common import TaskModel
 from .sequence import SequenceModel2
@@ -59,6 +57,10 @@ class DereplicateModel(TaskModel):
 
     alignment_mode = Property(AlignmentMode, AlignmentMode.PairwiseAlignment)
     alignment_write_pairs = Property(bool, True)
+    alignment_pairs_policy = Property(PairPolicy, PairPolicy.TopK)
+    alignment_pairs_cutoff = Property(float, 0.05)
+    alignment_pairs_top_k = Property(int, 10)
+    alignment_pairs_compression = Property(PairCompression, PairCompression.Gzip)
 
     pairwise_scores = Property(PairwiseScores, Instance)
 
@@ -74,6 +76,7 @@ class DereplicateModel(TaskModel):
 
     similarity_threshold = Property(float | None, 0.03)
     length_threshold = Property(int, 0)
+    similarity_sweep = Property(list, None)
 
     busy_main = Property(bool, False)
     busy_sequence = Property(bool, False)
@@ -108,6 +111,9 @@ class DereplicateModel(TaskModel):
             self.properties.distance_metric,
             self.properties.distance_metric_bbc_k,
             self.properties.distance_precision,
+            self.properties.alignment_write_pairs,
+            self.properties.alignment_pairs_policy,
+            self.properties.alignment_pairs_cutoff,
         ]
 
     def isReady(self):
@@ -125,24 +131,32 @@ class DereplicateModel(TaskModel):
                 return False
         if self.distance_precision is None:
             return False
+        if self.alignment_write_pairs and self.alignment_pairs_policy == PairPolicy.Cutoff:
+            if self.alignment_pairs_cutoff is None:
+                return False
         return True
 
     def start(self):
         super().start()
         self.busy_main = True
-        timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
-        work_dir = self.temporary_path / timestamp
-        work_dir.mkdir()
+        work_dir = self.create_work_dir()
+        if work_dir is None:
+            return
 
         self.exec(
             DereplicateSubtask.Main,
             dereplicate.dereplicate,
             work_dir=work_dir,
+            output_directory=self.output_directory,
 
             input_sequences=self.input_sequences.as_dict(),
 
             alignment_mode=self.alignment_mode,
             alignment_write_pairs=self.alignment_write_pairs,
+            alignment_pairs_policy=self.alignment_pairs_policy,
+            alignment_pairs_cutoff=self.alignment_pairs_cutoff,
+            alignment_pairs_top_k=self.alignment_pairs_top_k,
+            alignment_pairs_compression=self.alignment_pairs_compression,
             alignment_pairwise_scores = self.pairwise_scores.as_dict(),
 
             distance_metric=self.distance_metric,
@@ -155,12 +169,12 @@ class DereplicateModel(TaskModel):
 
             similarity_threshold=self.similarity_threshold,
             length_threshold=self.length_threshold,
+            similarity_sweep=self.similarity_sweep,
         )
 
     def add_sequence_file(self, path):
-        self.busy = True
         self.busy_sequence = True
-        self.exec(DereplicateSubtask.AddSequenceFile, dereplicate.get_file_info, path)
+        self.exec_io(DereplicateSubtask.AddSequenceFile, dereplicate.get_file_info, path)
 
     def add_file_item_from_info(self, info):
         if info.type == InputFile.Tabfile:
@@ -204,35 +218,45 @@ class DereplicateModel(TaskModel):
             time_taken = human_readable_seconds(report.result.seconds_taken)
             self.notification.emit(Notification.Info(f'{self.name} completed successfully!\nTime taken: {time_taken}.'))
             self.dummy_results = report.result.output_directory
+            self.finish_work_dir(self.dummy_results)
             self.dummy_time = report.result.seconds_taken
             self.busy_main = False
             self.done = True
+        self.busy = False
+
+    def onIODone(self, report):
         if report.id == DereplicateSubtask.AddSequenceFile:
             file_item = self.add_file_item_from_info(report.result)
             self.set_sequence_file_from_file_item(file_item)
             self.busy_sequence = False
-        self.busy = False
+
+    def onIOFail(self, report):
+        super().onIOFail(report)
+        self.busy_sequence = False
 
     def onStop(self, report):
         super().onStop(report)
         self.busy_main = False
-        self.busy_sequence = False
 
     def onFail(self, report):
         super().onFail(report)
         self.busy_main = False
-        self.busy_sequence = False
 
     def onError(self, report):
         super().onError(report)
         self.busy_main = False
-        self.busy_sequence = False
 
     def clear(self):
+        app.scratch.manager.release(self.dummy_results)
         self.dummy_results = None
+        self.performance = None
         self.dummy_time = None
         self.done = False
 
     def save(self, destination: Path):
-        copytree(self.dummy_results, destination, dirs_exist_ok=True)
-        self.notification.emit(Notification.Info('Saved files successfully!'))
+        self.busy_main = True
+        self.save_results(self.dummy_results, destination)
+
+    def onSaved(self, result):
+        super().onSaved(result)
+        self.busy_main = False
@@ -42,6 +42,7 @@ class LengthDecontaminationModel(TaskModel):
     mode = Property(Mode, Mode.Percentage)
     symbol = Property(Symbol, Symbol.Nucleotide)
     threshold = Property(float, 0.0)
+    threshold_sweep = Property(list, None)
 
     def __init__(self, name=None):
         super().__init__(name)
@@ -59,6 +60,16 @@ class LengthDecontaminationModel(TaskModel):
 
     def start(self):
         super().start()
+        if self.threshold_sweep:
+            self.exec(
+                Subtask.Main,
+                length_decontamination.execute_sweep,
+                thresholds=self.threshold_sweep,
+                dir=str(self.input),
+                mode=str(self.mode),
+                type=str(self.symbol),
+            )
+            return
         self.exec(
             Subtask.Main,
             length_decontamination.execute,
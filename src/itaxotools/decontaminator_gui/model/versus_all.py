@@ -16,16 +16,14 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # -----------------------------------------------------------------------------
 
-from datetime import datetime
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from shutil import copytree
 
 from .. import app
 from ..tasks import versus_all
 from ..model import Item, ItemModel, Object
-from ..types import Notification, InputFile, PairwiseScore, DistanceMetric, AlignmentMode, StatisticsGroup, VersusAllSubtask
-from ..utility import EnumObject, Property, Instance, human_readable_seconds
+from ..types import Notification, InputFile, PairwiseScore, DistanceMetric, AlignmentMode, StatisticsGroup, PlotFormat, VersusAllSubtask, PairPolicy, PairCompression
+from ..utility import EnumObject, Property, Instance, human_readable_seconds, human_readable_size
 from .common import TaskModel
 from .sequence import SequenceModel2
 from .input_file import InputFileModel
@@ -64,6 +62,16 @@ class StatisticsGroups(EnumObject):
     enum = StatisticsGroup
 
 
+class PlotFormats(EnumObject):
+    enum = PlotFormat
+
+    def as_list(self):
+        return [
+            field.key for field in self.enum
+            if self.properties[field.key].value
+        ]
+
+
 class VersusAllModel(TaskModel):
     task_name = 'Versus All'
 
@@ -76,6 +84,11 @@ class VersusAllModel(TaskModel):
 
     alignment_mode = Property(AlignmentMode, AlignmentMode.PairwiseAlignment)
     alignment_write_pairs = Property(bool, True)
+    alignment_pairs_policy = Property(PairPolicy, PairPolicy.TopK)
+    alignment_pairs_cutoff = Property(float, 0.05)
+    alignment_pairs_top_k = Property(int, 10)
+    alignment_pairs_metric = Property(DistanceMetric, DistanceMetric.Uncorrected)
+    alignment_pairs_compression = Property(PairCompression, PairCompression.Gzip)
 
     distance_linear = Property(bool, True)
     distance_matricial = Property(bool, True)
@@ -90,6 +103,9 @@ class VersusAllModel(TaskModel):
 
     plot_histograms = Property(bool, True)
     plot_binwidth = Property(float, 0.05)
+    plot_formats = Property(PlotFormats, Instance)
+    plot_deferred = Property(bool, False)
+    plots_pending = Property(bool, False)
 
     busy_main = Property(bool, False)
     busy_sequence = Property(bool, False)
@@ -112,11 +128,35 @@ class VersusAllModel(TaskModel):
             self.properties.perform_genera,
             self.properties.alignment_mode,
             *(property for property in self.pairwise_scores.properties),
-            self.distance_metrics.properties.bbc,
-            self.distance_metrics.properties.bbc_k,
+            *(property for property in self.distance_metrics.properties),
             self.properties.distance_precision,
+            self.properties.alignment_write_pairs,
+            self.properties.alignment_pairs_policy,
+            self.properties.alignment_pairs_cutoff,
+            self.properties.alignment_pairs_metric,
         ]
 
+    def estimate_output_size(self):
+        """
+        Dominated by the quadratic outputs, assuming barcode sized records.
+        Checkpoint blocks keep every value as float64 along with their share
+        of the pairs, until the run is done.
+        """
+        record = 700
+        n = self.input_sequences.file_item.object.size // record + 1
+        metrics = len(self.distance_metrics.as_list())
+        cell = (self.distance_precision or 0) + 4
+        size = n * n * metrics * 8
+        if self.distance_linear:
+            size += n * n * (40 + metrics * cell)
+        if self.distance_matricial:
+            size += metrics * n * n * cell
+        if self.alignment_write_pairs:
+            pairs = n * self.alignment_pairs_top_k if self.alignment_pairs_policy == PairPolicy.TopK else n * n
+            ratio = 1 if self.alignment_pairs_compression == PairCompression.Uncompressed else 4
+            size += 2 * pairs * 4 * record // ratio
+        return size
+
     def isReady(self):
         if self.input_sequences is None:
             return False
@@ -142,19 +182,26 @@ class VersusAllModel(TaskModel):
                 return False
         if self.distance_precision is None:
             return False
+        if self.alignment_write_pairs and self.alignment_pairs_policy == PairPolicy.Cutoff:
+            if self.alignment_pairs_cutoff is None:
+                return False
+        if self.alignment_write_pairs and self.alignment_pairs_policy != PairPolicy.All:
+            if self.alignment_pairs_metric not in self.distance_metrics.as_list():
+                return False
         return True
 
     def start(self):
         super().start()
         self.busy_main = True
-        timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
-        work_dir = self.temporary_path / timestamp
-        work_dir.mkdir()
+        work_dir = self.create_work_dir()
+        if work_dir is None:
+            return
 
-        self.exec(
+        self.exec_checkpointed(
             VersusAllSubtask.Main,
             versus_all.versus_all,
             work_dir=work_dir,
+            output_directory=self.output_directory,
 
             perform_species=self.perform_species,
             perform_genera=self.perform_genera,
@@ -165,6 +212,11 @@ class VersusAllModel(TaskModel):
 
             alignment_mode=self.alignment_mode,
             alignment_write_pairs=self.alignment_write_pairs,
+            alignment_pairs_policy=self.alignment_pairs_policy,
+            alignment_pairs_cutoff=self.alignment_pairs_cutoff,
+            alignment_pairs_top_k=self.alignment_pairs_top_k,
+            alignment_pairs_metric=self.alignment_pairs_metric,
+            alignment_pairs_compression=self.alignment_pairs_compression,
             alignment_pairwise_scores = self.pairwise_scores.as_dict(),
 
             distance_metrics=self.distance_metrics.as_list(),
@@ -181,22 +233,30 @@ class VersusAllModel(TaskModel):
 
             plot_histograms=self.plot_histograms,
             plot_binwidth=self.plot_binwidth or self.properties.plot_binwidth.default,
+            plot_formats=[],  # rendered by render_plots() once the results are in
         )
 
-    def add_sequence_file(self, path):
+    def render_plots(self):
         self.busy = True
+        self.busy_main = True
+        self.exec(
+            VersusAllSubtask.RenderPlots,
+            versus_all.render_plots,
+            work_dir=self.dummy_results,
+            plot_formats=self.plot_formats.as_list(),
+        )
+
+    def add_sequence_file(self, path):
         self.busy_sequence = True
-        self.exec(VersusAllSubtask.AddSequenceFile, versus_all.get_file_info, path)
+        self.exec_io(VersusAllSubtask.AddSequenceFile, versus_all.get_file_info, path)
 
     def add_species_file(self, path):
-        self.busy = True
         self.busy_species = True
-        self.exec(VersusAllSubtask.AddSpeciesFile, versus_all.get_file_info, path)
+        self.exec_io(VersusAllSubtask.AddSpeciesFile, versus_all.get_file_info, path)
 
     def add_genera_file(self, path):
-        self.busy = True
         self.busy_genera = True
-        self.exec(VersusAllSubtask.AddGeneraFile, versus_all.get_file_info, path)
+        self.exec_io(VersusAllSubtask.AddGeneraFile, versus_all.get_file_info, path)
 
     def add_file_item_from_info(self, info):
         if info.type == InputFile.Tabfile:
@@ -276,11 +336,29 @@ class VersusAllModel(TaskModel):
             return
         if report.id == VersusAllSubtask.Main:
             time_taken = human_readable_seconds(report.result.seconds_taken)
-            self.notification.emit(Notification.Info(f'{self.name} completed successfully!\nTime taken: {time_taken}.'))
+            message = f'{self.name} completed successfully!\nTime taken: {time_taken}.'
+            if report.result.throughput:
+                written = human_readable_size(report.result.bytes_written)
+                throughput = human_readable_size(report.result.throughput)
+                message += f'\nOutput written: {written} at {throughput}/s.'
+            self.notification.emit(Notification.Info(message))
             self.dummy_results = report.result.output_directory
+            self.finish_work_dir(self.dummy_results)
             self.dummy_time = report.result.seconds_taken
+            self.plots_pending = self.plot_histograms
+            if self.plots_pending and not self.plot_deferred and self.plot_formats.as_list():
+                self.render_plots()
+                return
+            self.busy_main = False
+            self.done = True
+        if report.id == VersusAllSubtask.RenderPlots:
+            self.update_work_dir(self.dummy_results)
+            self.plots_pending = False
             self.busy_main = False
             self.done = True
+        self.busy = False
+
+    def onIODone(self, report):
         if report.id == VersusAllSubtask.AddSequenceFile:
             file_item = self.add_file_item_from_info(report.result)
             self.set_sequence_file_from_file_item(file_item)
@@ -293,34 +371,40 @@ class VersusAllModel(TaskModel):
             file_item = self.add_file_item_from_info(report.result)
             self.set_genera_file_from_file_item(file_item)
             self.busy_genera = False
-        self.busy = False
+
+    def onIOFail(self, report):
+        super().onIOFail(report)
+        if report.id == VersusAllSubtask.AddSequenceFile:
+            self.busy_sequence = False
+        if report.id == VersusAllSubtask.AddSpeciesFile:
+            self.busy_species = False
+        if report.id == VersusAllSubtask.AddGeneraFile:
+            self.busy_genera = False
 
     def onStop(self, report):
         super().onStop(report)
         self.busy_main = False
-        self.busy_sequence = False
-        self.busy_species = False
-        self.busy_genera = False
 
     def onFail(self, report):
         super().onFail(report)
         self.busy_main = False
-        self.busy_sequence = False
-        self.busy_species = False
-        self.busy_genera = False
 
     def onError(self, report):
         super().onError(report)
         self.busy_main = False
-        self.busy_sequence = False
-        self.busy_species = False
-        self.busy_genera = False
 
     def clear(self):
+        app.scratch.manager.release(self.dummy_results)
         self.dummy_results = None
+        self.performance = None
         self.dummy_time = None
+        self.plots_pending = False
         self.done = False
 
     def save(self, destination: Path):
-        copytree(self.dummy_results, destination, dirs_exist_ok=True)
-        self.notification.emit(Notification.Info('Saved files successfully!'))
+        self.busy_main = True
+        self.save_results(self.dummy_results, destination)
+
+    def onSaved(self, result):
+        super().onSaved(result)
+        self.busy_main = False
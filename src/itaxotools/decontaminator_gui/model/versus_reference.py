@@ -16,15 +16,13 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # -----------------------------------------------------------------------------
 
-from datetime import datetime
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from shutil import copytree
 
 from .. import app
 from ..tasks import versus_reference
 from ..model import Item, ItemModel, Object
-from ..types import Notification, InputFile, PairwiseScore, DistanceMetric, AlignmentMode, StatisticsGroup, VersusReferenceSubtask
+from ..types import Notification, InputFile, PairwiseScore, DistanceMetric, AlignmentMode, StatisticsGroup, VersusReferenceSubtask, PairPolicy, PairCompression
 from ..utility import EnumObject, Property, Instance, human_readable_seconds
 from .common import TaskModel
 from .sequence import SequenceModel2
@@ -67,6 +65,10 @@ class VersusReferenceModel(TaskModel):
 
     alignment_mode = Property(AlignmentMode, AlignmentMode.PairwiseAlignment)
     alignment_write_pairs = Property(bool, True)
+    alignment_pairs_policy = Property(PairPolicy, PairPolicy.TopK)
+    alignment_pairs_cutoff = Property(float, 0.05)
+    alignment_pairs_top_k = Property(int, 10)
+    alignment_pairs_compression = Property(PairCompression, PairCompression.Gzip)
 
     distance_linear = Property(bool, True)
     distance_matricial = Property(bool, True)
@@ -99,6 +101,9 @@ class VersusReferenceModel(TaskModel):
             self.distance_metrics.properties.bbc,
             self.distance_metrics.properties.bbc_k,
             self.properties.distance_precision,
+            self.properties.alignment_write_pairs,
+            self.properties.alignment_pairs_policy,
+            self.properties.alignment_pairs_cutoff,
         ]
 
     def isReady(self):
@@ -118,25 +123,33 @@ class VersusReferenceModel(TaskModel):
                 return False
         if self.distance_precision is None:
             return False
+        if self.alignment_write_pairs and self.alignment_pairs_policy == PairPolicy.Cutoff:
+            if self.alignment_pairs_cutoff is None:
+                return False
         return True
 
     def start(self):
         super().start()
         self.busy_main = True
-        timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
-        work_dir = self.temporary_path / timestamp
-        work_dir.mkdir()
+        work_dir = self.create_work_dir()
+        if work_dir is None:
+            return
 
         self.exec(
             VersusReferenceSubtask.Main,
             versus_reference.versus_reference,
             work_dir=work_dir,
+            output_directory=self.output_directory,
 
             input_data=self.input_data.as_dict(),
             input_reference=self.input_reference.as_dict(),
 
             alignment_mode=self.alignment_mode,
             alignment_write_pairs=self.alignment_write_pairs,
+            alignment_pairs_policy=self.alignment_pairs_policy,
+            alignment_pairs_cutoff=self.alignment_pairs_cutoff,
+            alignment_pairs_top_k=self.alignment_pairs_top_k,
+            alignment_pairs_compression=self.alignment_pairs_compression,
             alignment_pairwise_scores = self.pairwise_scores.as_dict(),
 
             distance_metrics=self.distance_metrics.as_list(),
@@ -151,14 +164,12 @@ class VersusReferenceModel(TaskModel):
         )
 
     def add_data_file(self, path):
-        self.busy = True
         self.busy_data = True
-        self.exec(VersusReferenceSubtask.AddDataFile, versus_reference.get_file_info, path)
+        self.exec_io(VersusReferenceSubtask.AddDataFile, versus_reference.get_file_info, path)
 
     def add_reference_file(self, path):
-        self.busy = True
         self.busy_reference = True
-        self.exec(VersusReferenceSubtask.AddReferenceFile, versus_reference.get_file_info, path)
+        self.exec_io(VersusReferenceSubtask.AddReferenceFile, versus_reference.get_file_info, path)
 
     def add_file_item_from_info(self, info):
         if info.type == InputFile.Tabfile:
@@ -204,9 +215,13 @@ class VersusReferenceModel(TaskModel):
             time_taken = human_readable_seconds(report.result.seconds_taken)
             self.notification.emit(Notification.Info(f'{self.name} completed successfully!\nTime taken: {time_taken}.'))
             self.dummy_results = report.result.output_directory
+            self.finish_work_dir(self.dummy_results)
             self.dummy_time = report.result.seconds_taken
             self.busy_main = False
             self.done = True
+        self.busy = False
+
+    def onIODone(self, report):
         if report.id == VersusReferenceSubtask.AddDataFile:
             file_item = self.add_file_item_from_info(report.result)
             self.set_data_file_from_file_item(file_item)
@@ -215,31 +230,37 @@ class VersusReferenceModel(TaskModel):
             file_item = self.add_file_item_from_info(report.result)
             self.set_reference_file_from_file_item(file_item)
             self.busy_reference = False
-        self.busy = False
+
+    def onIOFail(self, report):
+        super().onIOFail(report)
+        if report.id == VersusReferenceSubtask.AddDataFile:
+            self.busy_data = False
+        if report.id == VersusReferenceSubtask.AddReferenceFile:
+            self.busy_reference = False
 
     def onStop(self, report):
         super().onStop(report)
         self.busy_main = False
-        self.busy_data = False
-        self.busy_reference = False
 
     def onFail(self, report):
         super().onFail(report)
         self.busy_main = False
-        self.busy_data = False
-        self.busy_reference = False
 
     def onError(self, report):
         super().onError(report)
         self.busy_main = False
-        self.busy_data = False
-        self.busy_reference = False
 
     def clear(self):
+        app.scratch.manager.release(self.dummy_results)
         self.dummy_results = None
+        self.performance = None
         self.dummy_time = None
         self.done = False
 
     def save(self, destination: Path):
-        copytree(self.dummy_results, destination, dirs_exist_ok=True)
-        self.notification.emit(Notification.Info('Saved files successfully!'))
+        self.busy_main = True
+        self.save_results(self.dummy_results, destination)
+
+    def onSaved(self, result):
+        super().onSaved(result)
+        self.busy_main = False
@@ -0,0 +1,132 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Sampling of CPU, memory, I/O and open files of worker processes"""
+
+from __future__ import annotations
+
+import os
+from collections import deque
+from pathlib import Path
+from time import monotonic
+from typing import NamedTuple
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+HISTORY = 60
+
+
+class Counters(NamedTuple):
+    time: float
+    cpu: float
+    rss: int
+    read: int
+    written: int
+    open_files: int
+
+
+class ResourceSample(NamedTuple):
+    cpu: float  # percent of one core
+    rss: int
+    read_rate: float  # bytes per second, through any file or pipe
+    write_rate: float
+    open_files: int
+
+
+def _read_proc(pid: int) -> Counters:
+    root = Path('/proc') / str(pid)
+    stat = (root / 'stat').read_text()
+    # The command name may contain spaces, the fields after it do not
+    fields = stat[stat.rindex(')') + 2:].split()
+    ticks = os.sysconf('SC_CLK_TCK')
+    cpu = (int(fields[11]) + int(fields[12])) / ticks
+    rss = int((root / 'statm').read_text().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    try:
+        io = dict(line.split(':', 1) for line in (root / 'io').read_text().splitlines())
+        read, written = int(io['rchar']), int(io['wchar'])
+    except (OSError, KeyError, ValueError):
+        read = written = 0
+    try:
+        open_files = len(os.listdir(root / 'fd'))
+    except OSError:
+        open_files = 0
+    return Counters(monotonic(), cpu, rss, read, written, open_files)
+
+
+def _read_psutil(pid: int) -> Counters:
+    process = psutil.Process(pid)
+    with process.oneshot():
+        times = process.cpu_times()
+        rss = process.memory_info().rss
+        try:
+            io = process.io_counters()
+            read = getattr(io, 'read_chars', io.read_bytes)
+            written = getattr(io, 'write_chars', io.write_bytes)
+        except (psutil.AccessDenied, AttributeError):
+            read = written = 0
+        if hasattr(process, 'num_fds'):
+            open_files = process.num_fds()
+        else:
+            open_files = process.num_handles()
+    return Counters(monotonic(), times.user + times.system, rss, read, written, open_files)
+
+
+def read_counters(pid: int) -> Counters | None:
+    """Cumulative counters of a process, None if it is gone or cannot be read"""
+    try:
+        if psutil is not None:
+            return _read_psutil(pid)
+        return _read_proc(pid)
+    except Exception:
+        return None
+
+
+def is_supported() -> bool:
+    return psutil is not None or Path('/proc/self/stat').exists()
+
+
+class ProcessMonitor:
+    """Turns counters of a process into rates, keeping a short history of samples"""
+
+    def __init__(self, pid: int, history: int = HISTORY):
+        self.pid = pid
+        self.last: Counters | None = None
+        self.samples: deque[ResourceSample] = deque(maxlen=history)
+
+    def sample(self) -> ResourceSample | None:
+        counters = read_counters(self.pid)
+        if counters is None:
+            return None
+        last, self.last = self.last, counters
+        if last is None:
+            return None
+        elapsed = counters.time - last.time
+        if elapsed <= 0:
+            return None
+        sample = ResourceSample(
+            cpu=100 * max(0.0, counters.cpu - last.cpu) / elapsed,
+            rss=counters.rss,
+            read_rate=max(0, counters.read - last.read) / elapsed,
+            write_rate=max(0, counters.written - last.written) / elapsed,
+            open_files=counters.open_files,
+        )
+        self.samples.append(sample)
+        return sample
@@ -0,0 +1,195 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Per phase timing and resource usage of task runs, recorded by workers"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from time import perf_counter, process_time
+from typing import NamedTuple
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPORT_NAME = 'performance.json'
+
+
+class Snapshot(NamedTuple):
+    """
+    Wall time is per command, but CPU time and I/O bytes are counted for
+    the whole process, so they include any commands running concurrently.
+    """
+
+    wall: float
+    cpu: float
+    read: int
+    written: int
+
+    @classmethod
+    def now(cls) -> Snapshot:
+        read, written = io_counters()
+        return cls(perf_counter(), cpu_time(), read, written)
+
+
+@dataclass
+class PhaseRecord:
+    phase: str
+    wall: float = 0.0
+    cpu: float = 0.0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    items: int = 0
+
+    @property
+    def items_per_second(self) -> float | None:
+        if not self.items or not self.wall:
+            return None
+        return self.items / self.wall
+
+    def add(self, start: Snapshot, stop: Snapshot):
+        self.wall += stop.wall - start.wall
+        self.cpu += stop.cpu - start.cpu
+        self.bytes_read += stop.read - start.read
+        self.bytes_written += stop.written - start.written
+
+    def as_dict(self) -> dict:
+        return dict(asdict(self), items_per_second=self.items_per_second)
+
+
+def io_counters() -> tuple[int, int]:
+    """Bytes read and written by this process, through any file or pipe"""
+    try:
+        with open('/proc/self/io') as file:
+            fields = dict(line.split(':', 1) for line in file)
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        pass
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_inblock * 512, usage.ru_oublock * 512
+    return 0, 0
+
+
+def cpu_time() -> float:
+    """Includes finished child processes, such as plotting pools"""
+    if resource is None:
+        return process_time()
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return process_time() + children.ru_utime + children.ru_stime
+
+
+def peak_rss() -> int | None:
+    """Highest resident set size of this process in bytes, over its lifetime"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class PerformanceRecorder:
+    """Accumulates a record for each phase path entered during a command"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.records: dict[str, PhaseRecord] = dict()
+        self.entered: dict[str, Snapshot] = dict()
+        self.started = Snapshot.now()
+
+    def enter(self, phase: str):
+        self.entered[phase] = Snapshot.now()
+
+    def exit(self, phase: str):
+        start = self.entered.pop(phase, None)
+        if start is None:
+            return
+        record = self.records.setdefault(phase, PhaseRecord(phase))
+        record.add(start, Snapshot.now())
+
+    def count(self, phase: str, items: int):
+        record = self.records.setdefault(phase, PhaseRecord(phase))
+        record.items = max(record.items, items)
+
+    def report(self) -> dict:
+        total = PhaseRecord('total')
+        total.add(self.started, Snapshot.now())
+        return dict(
+            total=total.as_dict(),
+            phases=[record.as_dict() for record in self.records.values() if record.wall],
+            peak_rss=peak_rss(),
+            process_wide=['cpu', 'bytes_read', 'bytes_written', 'peak_rss'],
+            cpus=os.cpu_count(),
+            python=platform.python_version(),
+            platform=platform.platform(),
+        )
+
+    def save(self, path: Path):
+        write_report(self.report(), path)
+
+
+def write_report(report: dict, path: Path):
+    partial = path.with_name(f'.{path.name}.partial')
+    with open(partial, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    os.replace(partial, path)
+
+
+def save_report(directory: Path):
+    """Write the report of the current worker command, if any, to directory"""
+    from .progress import tracker
+
+    progress = tracker()
+    if progress is None:
+        return
+    progress.performance.save(Path(directory) / REPORT_NAME)
+
+
+def append_report(directory: Path):
+    """Add the phases of the current worker command to the report already in directory"""
+    from .progress import tracker
+
+    progress = tracker()
+    if progress is None:
+        return
+    report = load_report(directory)
+    if report is None:
+        return save_report(directory)
+    extra = progress.performance.report()
+    for key in ['wall', 'cpu', 'bytes_read', 'bytes_written']:
+        report['total'][key] += extra['total'][key]
+    report['phases'] += extra['phases']
+    if extra['peak_rss'] is not None:
+        report['peak_rss'] = max(report['peak_rss'] or 0, extra['peak_rss'])
+    write_report(report, Path(directory) / REPORT_NAME)
+
+
+def load_report(directory: Path) -> dict | None:
+    try:
+        with open(Path(directory) / REPORT_NAME, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
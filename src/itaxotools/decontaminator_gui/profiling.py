@@ -0,0 +1,95 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Profile worker commands, with a sampling profiler when one is installed"""
+
+from __future__ import annotations
+
+import io
+import pstats
+import sys
+from pathlib import Path
+from typing import Any, Callable
+
+SUMMARY_LINES = 40
+
+
+def _write_summary(path: Path, text: str):
+    partial = path.with_name(f'.{path.name}.partial')
+    partial.write_text(text, encoding='utf-8')
+    partial.replace(path)
+
+
+def _cprofile_summary(profile) -> str:
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.strip_dirs()
+    for title, key in [('Flat profile', 'tottime'), ('Cumulative profile', 'cumulative')]:
+        stream.write(f'{title}, sorted by {key}\n\n')
+        stats.sort_stats(key).print_stats(SUMMARY_LINES)
+    return stream.getvalue()
+
+
+def _run_sampling(prefix: Path, function: Callable, args, kwargs) -> Any:
+    from pyinstrument import Profiler
+
+    profiler = Profiler()
+    profiler.start()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        profiler.stop()
+        session = profiler.last_session
+        session.save(Path(f'{prefix}.pyisession'))
+        _write_summary(Path(f'{prefix}.profile.txt'), profiler.output_text(unicode=True, color=False, show_all=False))
+        print(f'Saved sampling profile: {prefix}.pyisession', file=sys.stderr)
+
+
+def _run_deterministic(prefix: Path, function: Callable, args, kwargs) -> Any:
+    import cProfile
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        profile.disable()
+        profile.dump_stats(Path(f'{prefix}.prof'))
+        _write_summary(Path(f'{prefix}.profile.txt'), _cprofile_summary(profile))
+        print(f'Saved profile: {prefix}.prof', file=sys.stderr)
+
+
+def sampling_available() -> bool:
+    try:
+        import pyinstrument  # noqa
+    except ImportError:
+        return False
+    return True
+
+
+def run_profiled(prefix: str, function: Callable, *args, **kwargs) -> Any:
+    """
+    Call function under a profiler and save the profile next to prefix,
+    along with a text summary, even if the function raises.
+    Uses pyinstrument if available, otherwise cProfile.
+    """
+    prefix = Path(prefix)
+    prefix.parent.mkdir(parents=True, exist_ok=True)
+    if sampling_available():
+        return _run_sampling(prefix, function, args, kwargs)
+    return _run_deterministic(prefix, function, args, kwargs)
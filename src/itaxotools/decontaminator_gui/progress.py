@@ -0,0 +1,162 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Nested progress phases with rate and ETA, throttled before reaching the GUI"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable
+
+from .performance import PerformanceRecorder
+from .threading_loop import ReportProgress
+from .tracing import span
+
+SEPARATOR = ' › '
+
+
+class ProgressTracker:
+    """
+    Installed as the progress handler of worker processes. Reports are
+    labelled with the current stack of phases, annotated with a rate and
+    ETA over a moving window, and dropped if they arrive faster than the
+    interval, unless they change phase or complete it. Phases are also
+    timed by the performance recorder and traced.
+    """
+
+    def __init__(self, send: Callable[[ReportProgress], None], interval: float = 0.05, window: float = 5.0):
+        self.send = send
+        self.interval = interval
+        self.window = window
+        self.performance = PerformanceRecorder()
+        self.reset()
+
+    def reset(self):
+        self.stack: list[str] = []
+        self.plan: list[str] = []
+        self.samples: deque[tuple[float, int]] = deque()
+        self.last_sent = 0.0
+        self.last_key = None
+        self.performance.reset()
+
+    def set_plan(self, names: list[str | None]):
+        """Declare the top level phases so that reports can show step counts, skipping empty names"""
+        self.plan = [name for name in names if name]
+
+    @property
+    def path(self) -> str:
+        return SEPARATOR.join(self.stack)
+
+    @property
+    def step(self) -> int:
+        if self.stack and self.stack[0] in self.plan:
+            return self.plan.index(self.stack[0]) + 1
+        return 0
+
+    @contextmanager
+    def phase(self, name: str):
+        self.stack.append(name)
+        path = self.path
+        self.performance.enter(path)
+        self()
+        try:
+            with span(name, 'phase', path=path):
+                yield
+        finally:
+            self.performance.exit(path)
+            self.stack.pop()
+
+    def __call__(self, text: str = '', value: int = 0, minimum: int = 0, maximum: int = 0):
+        now = perf_counter()
+        key = (self.path, minimum, maximum)
+        changed = key != self.last_key
+        if changed:
+            self.samples.clear()
+            self.last_key = key
+
+        bounded = maximum > minimum
+        finished = bounded and value >= maximum
+        if not changed and not finished and now - self.last_sent < self.interval:
+            return
+        self.last_sent = now
+
+        if bounded:
+            self.performance.count(self.path, value - minimum)
+            self.samples.append((now, value))
+            while len(self.samples) > 2 and now - self.samples[0][0] > self.window:
+                self.samples.popleft()
+
+        rate = eta = None
+        if len(self.samples) >= 2:
+            (t0, v0), (t1, v1) = self.samples[0], self.samples[-1]
+            if t1 > t0 and v1 > v0:
+                rate = (v1 - v0) / (t1 - t0)
+                eta = (maximum - value) / rate
+
+        self.send(ReportProgress(
+            text, value, minimum, maximum,
+            self.path, self.step, len(self.plan), rate, eta))
+
+
+class ProgressRouter:
+    """
+    Installed as the progress handler of worker processes instead, when
+    commands may run at the same time. Reports are passed to the tracker
+    of the command running on the calling thread, if any.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    @property
+    def current(self) -> ProgressTracker | None:
+        return getattr(self.local, 'tracker', None)
+
+    def install(self, tracker: ProgressTracker | None):
+        self.local.tracker = tracker
+
+    def __call__(self, *args, **kwargs):
+        if tracker := self.current:
+            tracker(*args, **kwargs)
+
+
+def tracker() -> ProgressTracker | None:
+    import itaxotools
+    handler = getattr(itaxotools, 'progress_handler', None)
+    if isinstance(handler, ProgressRouter):
+        return handler.current
+    return handler if isinstance(handler, ProgressTracker) else None
+
+
+def plan(*names: str | None):
+    if progress := tracker():
+        progress.set_plan(names)
+
+
+@contextmanager
+def phase(name: str):
+    """Label progress reported within this block, a no-op outside workers"""
+    progress = tracker()
+    if progress is None:
+        yield
+        return
+    with progress.phase(name):
+        yield
@@ -0,0 +1,441 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Workers on other hosts, reached over TCP, with their files streamed through the channel"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import math
+import multiprocessing as mp
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import uuid
+from dataclasses import fields, is_dataclass
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path, PurePath
+from typing import Any, Callable, NamedTuple
+
+from .channel import Channel, FileSink, Kind, safe_key
+from .scratch import environment_value
+from .threading_loop import Command, ReportDone, current_channel, loop
+
+ENV_REMOTE = 'DECONTAMINATOR_REMOTE'
+ENV_AUTHKEY = 'DECONTAMINATOR_AUTHKEY'
+DEFAULT_PORT = 6150
+
+# Directories given as these arguments only receive results, so they are not uploaded
+OUTPUT_ARGUMENTS = {'output_directory'}
+
+
+def parse_address(text: str) -> tuple[str, int]:
+    """Parse addresses such as 'server:6150', the port being optional"""
+    host, colon, port = text.rpartition(':')
+    if not colon:
+        return text, DEFAULT_PORT
+    return host, int(port)
+
+
+def translate(obj: Any, mapping: Callable[[Path], Path]) -> Any:
+    """Copy of obj with every path replaced through mapping, looking into containers and dataclasses"""
+    if isinstance(obj, PurePath):
+        return mapping(Path(obj))
+    if isinstance(obj, dict):
+        items = [(key, translate(value, mapping)) for key, value in obj.items()]
+        try:
+            return type(obj)(items)
+        except TypeError:
+            return dict(items)
+    if isinstance(obj, tuple) and hasattr(obj, '_fields'):
+        return type(obj)(*(translate(value, mapping) for value in obj))
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return type(obj)(translate(value, mapping) for value in obj)
+    if is_dataclass(obj) and not isinstance(obj, type):
+        obj = copy.copy(obj)
+        for field in fields(obj):
+            object.__setattr__(obj, field.name, translate(getattr(obj, field.name), mapping))
+        return obj
+    return obj
+
+
+def relocate(path: Path, mapping: dict[Path, Path]) -> Path:
+    """Move path from under the deepest base it is found in to the matching target"""
+    for base in sorted(mapping, key=lambda base: len(base.parts), reverse=True):
+        if path == base or base in path.parents:
+            return mapping[base] / path.relative_to(base)
+    return path
+
+
+def list_tree(path: Path) -> list[str]:
+    """Relative paths of all files in a directory"""
+    names = []
+    for root, _, files in os.walk(path):
+        for name in files:
+            names.append((Path(root) / name).relative_to(path).as_posix())
+    return names
+
+
+def stat_tree(path: Path) -> dict[str, tuple[int, int]]:
+    """Size and modification time of all files in a directory, by relative path"""
+    stats = dict()
+    for name in list_tree(path):
+        stat = (path / name).stat()
+        stats[name] = (stat.st_size, stat.st_mtime_ns)
+    return stats
+
+
+class StagedDirectory(NamedTuple):
+    path: Path
+    names: list[str]
+    output: bool
+
+
+class StagedCall(NamedTuple):
+    function: Callable
+    args: tuple
+    kwargs: dict
+    transfer: str
+    files: list[Path]
+    directories: list[StagedDirectory]
+    profile: str | None = None
+
+
+class StagedResult(NamedTuple):
+    result: Any
+    written: list[Path]
+    removed: list[Path]
+
+
+def file_key(transfer: str, index: int, path: Path) -> str:
+    return f'{transfer}/files/{index}/{path.name}'
+
+
+def directory_key(transfer: str, index: int, directory: Path, name: str = '') -> str:
+    key = f'{transfer}/directories/{index}/{directory.name}'
+    return f'{key}/{name}' if name else key
+
+
+def profile_key(transfer: str, name: str) -> str:
+    return f'{transfer}/profile/{name}'
+
+
+def stage_command(command: Command) -> Command:
+    """
+    Replace the command by a call of `run_staged`, listing the files and
+    directories found in its arguments, to be streamed along with it by
+    `upload`. Paths that do not exist are left as they are. Profiled
+    commands are profiled on the remote host, their profiles streamed back.
+    """
+    outputs = [command.kwargs.get(name) for name in OUTPUT_ARGUMENTS]
+    paths: list[Path] = []
+    translate((command.args, command.kwargs), lambda path: paths.append(path) or path)
+
+    files: list[Path] = []
+    directories: dict[Path, StagedDirectory] = dict()
+    for path in paths:
+        if path in files or path in directories:
+            continue
+        if path.is_file():
+            files.append(path)
+        elif path.is_dir():
+            output = any(path == output for output in outputs)
+            directories[path] = StagedDirectory(path, [] if output else list_tree(path), output)
+    if not files and not directories and not command.profile:
+        return command
+
+    call = StagedCall(
+        command.function, command.args, command.kwargs, uuid.uuid4().hex,
+        files, list(directories.values()), command.profile)
+    return command._replace(function=run_staged, args=(call,), kwargs={}, profile=None)
+
+
+def upload(channel: Channel, call: StagedCall):
+    """Stream the inputs of a staged call, to be written by the sink of the session"""
+    for index, path in enumerate(call.files):
+        channel.send_file(file_key(call.transfer, index, path), path)
+    for index, directory in enumerate(call.directories):
+        for name in directory.names:
+            channel.send_file(directory_key(call.transfer, index, directory.path, name), directory.path / name)
+
+
+_root: Path | None = None
+_failures: dict[str, Exception] = dict()
+
+
+def check_failures(failures: dict[str, Exception], transfer: str):
+    """Raise the first error of a file of the transfer that could not be written, forgetting the rest"""
+    keys = [key for key in failures if key.startswith(f'{transfer}/')]
+    errors = [failures.pop(key) for key in keys]
+    if errors:
+        raise OSError(f'Could not write streamed file {keys[0]}: {errors[0]}')
+
+
+def run_staged(call: StagedCall) -> StagedResult:
+    """
+    Executed on the remote host, where inputs were already written to a
+    directory of the transfer, and paths in the arguments are moved there.
+    Once the function returns, paths in its result are moved back, and
+    files that it created or changed in staged directories are streamed
+    back, while files or whole directories that it removed are listed.
+    Profiles are streamed back even if the function fails. The directory
+    of the transfer is removed in any case.
+    """
+    root = _root / call.transfer
+    try:
+        check_failures(_failures, call.transfer)
+        mapping: dict[Path, Path] = dict()
+        for index, path in enumerate(call.files):
+            mapping[path] = root / file_key(call.transfer, index, path).partition('/')[2]
+        for index, directory in enumerate(call.directories):
+            target = root / directory_key(call.transfer, index, directory.path).partition('/')[2]
+            target.mkdir(parents=True, exist_ok=True)
+            mapping[directory.path] = target
+        before = {directory.path: stat_tree(mapping[directory.path]) for directory in call.directories}
+
+        args = translate(call.args, lambda path: relocate(path, mapping))
+        kwargs = translate(call.kwargs, lambda path: relocate(path, mapping))
+        if call.profile:
+            from .profiling import run_profiled
+            prefix = root / 'profile' / Path(call.profile).name
+            result = run_profiled(str(prefix), call.function, *args, **kwargs)
+        else:
+            result = call.function(*args, **kwargs)
+        reverse = {target: path for path, target in mapping.items()}
+        result = translate(result, lambda path: relocate(path, reverse))
+
+        channel = current_channel()
+        written: list[Path] = []
+        removed: list[Path] = []
+        for index, directory in enumerate(call.directories):
+            target = mapping[directory.path]
+            if not target.exists():
+                if not directory.output:
+                    removed.append(directory.path)
+                continue
+            after = stat_tree(target)
+            for name, stat in after.items():
+                if before[directory.path].get(name) != stat:
+                    channel.send_file(directory_key(call.transfer, index, directory.path, name), target / name)
+                    written.append(directory.path / name)
+            for name in before[directory.path]:
+                if name not in after:
+                    removed.append(directory.path / name)
+        return StagedResult(result, written, removed)
+    finally:
+        profiles = root / 'profile'
+        if call.profile and profiles.is_dir():
+            for file in sorted(profiles.iterdir()):
+                current_channel().send_file(profile_key(call.transfer, file.name), file)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def unstage_report(report):
+    """Apply the removals a staged command made to directories, then unwrap its result"""
+    if not isinstance(report, ReportDone) or not isinstance(report.result, StagedResult):
+        return report
+    staged = report.result
+    for path in staged.removed:
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+    return report._replace(result=staged.result)
+
+
+def shutdown(connection: Connection):
+    """Interrupt a connection in both directions, without closing it yet"""
+    try:
+        sock = socket.socket(fileno=connection.fileno())
+    except OSError:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    finally:
+        sock.detach()
+
+
+class RemoteProcess:
+    """
+    Stands in for the worker process during a remote session. The session
+    ends when its connection does, which also makes the sentinel ready.
+    """
+
+    pid = None
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self.exitcode = None
+
+    @property
+    def sentinel(self) -> Connection:
+        return self.connection
+
+    def is_alive(self) -> bool:
+        return self.exitcode is None
+
+    def terminate(self):
+        if self.exitcode is None:
+            self.exitcode = -signal.SIGTERM
+        shutdown(self.connection)
+
+    def join(self, timeout: float | None = None):
+        if self.exitcode is None:
+            # The session ended on its own, such as when the host went away
+            self.exitcode = 1
+
+
+class RemoteExecutor:
+    """
+    Runs the worker loop in a session on a host running `serve()`. The
+    same messages come back as from a local process. Files and directories
+    in the arguments of commands are staged, see `stage_command`, and
+    streamed in chunks both ways, while payloads are never placed in shared
+    memory. Commands are profiled on the remote host, and the limits of
+    workers are those of the remote host.
+    """
+
+    threshold = math.inf
+
+    def __init__(self, address: tuple[str, int], authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self.transfers: dict[str, StagedCall] = dict()
+        self.failures: dict[str, Exception] = dict()
+
+    @classmethod
+    def from_environment(cls) -> RemoteExecutor | None:
+        address = environment_value(ENV_REMOTE, parse_address)
+        if address is None:
+            return None
+        return cls(address, os.environ.get(ENV_AUTHKEY, '').encode())
+
+    def start(self, name: str, concurrency: int, limits) -> tuple[Connection, RemoteProcess]:
+        host, port = self.address
+        try:
+            connection = Client(self.address, authkey=self.authkey)
+        except mp.AuthenticationError as exception:
+            raise ConnectionRefusedError(f'Authentication failed with {host}:{port}') from exception
+        connection.send(dict(name=name, concurrency=concurrency))
+        return connection, RemoteProcess(connection)
+
+    def sink(self) -> FileSink:
+        return FileSink(self.resolve, self.failures)
+
+    def resolve(self, key: str) -> Path:
+        """Where a file streamed back belongs, only ever within what its command staged"""
+        transfer, _, name = key.partition('/')
+        call = self.transfers.get(transfer)
+        parts = safe_key(name).parts if call is not None else ()
+        if len(parts) > 3 and parts[0] == 'directories' and parts[1].isdigit() and int(parts[1]) < len(call.directories):
+            directory = call.directories[int(parts[1])].path
+            if parts[2] == directory.name:
+                return directory.joinpath(*parts[3:])
+        if len(parts) == 2 and parts[0] == 'profile' and call.profile:
+            return Path(call.profile).parent / parts[1]
+        raise ValueError(f'Unexpected streamed file: {key!r}')
+
+    def prepare(self, command: Command) -> Command:
+        return stage_command(command)
+
+    def send(self, channel: Channel, command: Command):
+        if command.function is run_staged:
+            call = command.args[0]
+            self.transfers[call.transfer] = call
+            upload(channel, call)
+        channel.send(Kind.Command, command)
+
+    def finish(self, command: Command, report):
+        if command.function is not run_staged:
+            return report
+        transfer = command.args[0].transfer
+        self.transfers.pop(transfer, None)
+        check_failures(self.failures, transfer)
+        return unstage_report(report)
+
+
+def session(connection: Connection, root: Path):
+    """Executed on a new process for each connection to the server"""
+    global _root
+    from .limits import WorkerLimits
+
+    _root = root
+    hello = connection.recv()
+    mp.current_process().name = hello.get('name', 'Worker')
+    sink = FileSink(lambda key: root / safe_key(key), _failures)
+    loop(connection, hello.get('concurrency', 4), WorkerLimits.from_environment(), threshold=math.inf, sink=sink)
+
+
+def serve(address: tuple[str, int], authkey: bytes, root: Path | None = None):
+    """Accept sessions until interrupted, each on a process of its own"""
+    root = Path(root or tempfile.gettempdir())
+    root.mkdir(parents=True, exist_ok=True)
+    sessions: list[mp.Process] = []
+    with Listener(address, authkey=authkey) as listener:
+        host, port = listener.address
+        print(f'Serving workers on {host}:{port}, staging files in {root}', flush=True)
+        while True:
+            try:
+                connection = listener.accept()
+            except (mp.AuthenticationError, OSError) as exception:
+                print(f'Rejected connection: {exception}', file=sys.stderr, flush=True)
+                continue
+            process = mp.Process(target=session, args=(connection, root), daemon=True)
+            process.start()
+            connection.close()
+            sessions = [alive for alive in sessions if alive.is_alive()] + [process]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='decontaminator-worker',
+        description=(
+            'Run the workers of Decontaminator GUIs on this host. The shared secret '
+            f'is read from {ENV_AUTHKEY}, and GUIs connect by setting {ENV_REMOTE} '
+            'to the address of this host.'))
+    parser.add_argument(
+        'address', nargs='?', default=f'localhost:{DEFAULT_PORT}',
+        help=f'address to listen on, such as 0.0.0.0:{DEFAULT_PORT}')
+    parser.add_argument('--root', type=Path, default=None, help='directory for staged files, defaults to the temporary directory')
+    args = parser.parse_args(argv)
+
+    authkey = os.environ.get(ENV_AUTHKEY)
+    if not authkey:
+        print(f'{parser.prog}: set {ENV_AUTHKEY} to a shared secret first', file=sys.stderr)
+        return 2
+
+    try:
+        serve(parse_address(args.address), authkey.encode(), args.root)
+    except KeyboardInterrupt:
+        pass
+    except OSError as exception:
+        print(f'{parser.prog}: {exception}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    # Sessions must set the staging root of the module that commands refer to, not of __main__
+    from itaxotools.decontaminator_gui import remote
+    sys.exit(remote.main())
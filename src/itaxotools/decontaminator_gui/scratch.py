@@ -0,0 +1,220 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Scratch space for task results, with a quota and eviction of stale runs"""
+
+from __future__ import annotations
+
+import atexit
+import errno
+import os
+import shutil
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from time import monotonic
+from typing import Any, Callable
+
+ENV_ROOT = 'DECONTAMINATOR_SCRATCH'
+ENV_QUOTA = 'DECONTAMINATOR_SCRATCH_QUOTA'
+
+
+class ScratchSpaceError(OSError):
+    pass
+
+
+@dataclass
+class ScratchRun:
+    path: Path
+    task_dir: Path
+    size: int = 0
+    last_used: float = field(default_factory=monotonic)
+    pinned: bool = True
+
+
+def _megabytes(size: int) -> str:
+    return f'{size / 1e6:.0f} MB'
+
+
+def tree_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.lstat(os.path.join(root, file)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def parse_size(text: str) -> int:
+    """Parse sizes such as '512M' or '20G' to bytes"""
+    text = text.strip().upper().removesuffix('B')
+    units = {'K': 10 ** 3, 'M': 10 ** 6, 'G': 10 ** 9, 'T': 10 ** 12}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(float(text))
+
+
+def environment_value(name: str, parse: Callable[[str], Any], default: Any = None) -> Any:
+    """Parse an environment variable if set, warning and falling back to the default if malformed"""
+    text = os.environ.get(name)
+    if not text:
+        return default
+    try:
+        return parse(text)
+    except ValueError as exception:
+        print(f'Ignoring {name}={text!r}: {exception}', file=sys.stderr)
+        return default
+
+
+class ScratchManager:
+    """
+    Owns one directory per task and one subdirectory per run under a common
+    root. Runs are pinned while in progress or while they hold the results
+    displayed by their task, saved or not. Once superseded or cleared they
+    may be evicted, least recently used first, to respect the quota or to
+    make room for a new run.
+    """
+
+    def __init__(self, root: Path | None = None, quota: int | None = None, reserve: int = 64 << 20):
+        self.root = Path(root or tempfile.gettempdir())
+        self.quota = quota
+        self.reserve = reserve
+        self.task_dirs: list[Path] = []
+        self.runs: dict[Path, ScratchRun] = dict()
+        atexit.register(self.cleanup)
+
+    @classmethod
+    def from_environment(cls) -> ScratchManager:
+        return cls(os.environ.get(ENV_ROOT), environment_value(ENV_QUOTA, parse_size))
+
+    def set_root(self, root: Path):
+        """Only affects tasks created afterwards"""
+        self.root = Path(root)
+
+    def set_quota(self, quota: int | None):
+        self.quota = quota
+        if quota is not None:
+            self.evict(self.usage() - quota)
+
+    def create_task_dir(self, prefix: str) -> Path:
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = Path(tempfile.mkdtemp(prefix=prefix, dir=self.root))
+        self.task_dirs.append(path)
+        return path
+
+    def remove_task_dir(self, path: Path):
+        for run in [run for run in self.runs.values() if run.task_dir == path]:
+            del self.runs[run.path]
+        shutil.rmtree(path, ignore_errors=True)
+        if path in self.task_dirs:
+            self.task_dirs.remove(path)
+
+    def create_run(self, task_dir: Path, estimate: int = 0) -> Path:
+        """Directory for a new run, after making sure there is room for it"""
+        self.preflight(estimate, task_dir)
+        for run in self.runs.values():
+            if run.task_dir == task_dir:
+                run.pinned = False
+        timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        path = task_dir / timestamp
+        index = 1
+        while path.exists():
+            index += 1
+            path = task_dir / f'{timestamp}_{index}'
+        path.mkdir(parents=True)
+        self.runs[path] = ScratchRun(path, task_dir)
+        return path
+
+    def finish_run(self, path: Path):
+        """Account for the size of a run once its results are written"""
+        run = self.runs.get(path)
+        if run is None:
+            return
+        run.size = tree_size(path)
+        run.last_used = monotonic()
+        if self.quota is not None:
+            self.evict(self.usage() - self.quota)
+
+    def discard_run(self, path: Path):
+        self.runs.pop(path, None)
+        shutil.rmtree(path, ignore_errors=True)
+
+    def touch(self, path: Path):
+        if run := self.runs.get(path):
+            run.last_used = monotonic()
+
+    def pin(self, path: Path):
+        """Protect a run from eviction again, for example when it is resumed"""
+        if run := self.runs.get(path):
+            run.pinned = True
+            run.last_used = monotonic()
+
+    def release(self, path: Path):
+        """Allow eviction of a run, for example once its results are cleared"""
+        if run := self.runs.get(path):
+            run.pinned = False
+
+    def usage(self) -> int:
+        return sum(run.size for run in self.runs.values())
+
+    def evict(self, needed: int) -> int:
+        """Remove unpinned runs, least recently used first, until enough bytes are freed"""
+        freed = 0
+        candidates = sorted(
+            (run for run in self.runs.values() if not run.pinned),
+            key=lambda run: run.last_used)
+        for run in candidates:
+            if freed >= needed:
+                break
+            self.discard_run(run.path)
+            freed += run.size
+        return freed
+
+    def check_free_space(self, path: Path, estimate: int):
+        free = shutil.disk_usage(path).free
+        if free < estimate + self.reserve:
+            raise ScratchSpaceError(
+                errno.ENOSPC,
+                f'Not enough free space in {path}: '
+                f'{_megabytes(free)} available, '
+                f'about {_megabytes(estimate + self.reserve)} required.')
+
+    def preflight(self, estimate: int, path: Path | None = None):
+        """Evict stale runs if needed, then fail early if the run would not fit"""
+        path = path or self.root
+        if self.quota is not None:
+            self.evict(self.usage() + estimate - self.quota)
+            if self.usage() + estimate > self.quota:
+                raise ScratchSpaceError(
+                    errno.EDQUOT,
+                    f'Scratch quota of {_megabytes(self.quota)} exceeded: '
+                    f'{_megabytes(self.usage())} held by results in use, '
+                    f'about {_megabytes(estimate)} required.')
+        free = shutil.disk_usage(path).free
+        needed = estimate + self.reserve
+        if free < needed:
+            self.evict(needed - free)
+        self.check_free_space(path, estimate)
+
+    def cleanup(self):
+        for path in list(self.task_dirs):
+            self.remove_task_dir(path)
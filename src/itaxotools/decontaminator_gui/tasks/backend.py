@@ -0,0 +1,640 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Extensions of the taxi2 backend tasks, imported by workers only"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from abc import ABC, abstractmethod
+from array import array
+from itertools import islice
+from math import isnan
+from pathlib import Path
+from time import perf_counter
+from typing import Iterator
+
+import numpy as np
+
+from itaxotools.common.utility import AttrDict
+from itaxotools.taxi2.distances import Distance, DistanceMetric, Distances
+from itaxotools.taxi2.handlers import FileHandler
+from itaxotools.taxi2.pairs import SequencePair, SequencePairs
+from itaxotools.taxi2.partitions import Partition
+from itaxotools.taxi2.sequences import Sequence, Sequences
+from itaxotools.taxi2.tasks import decontaminate, decontaminate2, dereplicate, versus_all, versus_reference
+
+from ..checkpoint import Checkpoint
+from ..progress import phase
+from ..types import PairCompression, PairPolicy
+from . import pairs as pairs_io
+from .formatting import FloatFormatter, TableWriter, WriteStats, render_rows
+from .histograms import HistogramCounts, render_histograms
+from .statistics import GroupLabels, SubsetStatistics
+
+
+class PairWriting:
+    """
+    Aligned pairs are written selectively and compressed, see `pairs.PairSelection`.
+    Selections are judged by the distances calculated further down the pipeline.
+    If a part path is set, pairs go there instead, to be appended to the others.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.params.pairs.policy: PairPolicy = PairPolicy.TopK
+        self.params.pairs.cutoff: float = 0.05
+        self.params.pairs.top_k: int = 10
+        self.params.pairs.compression: PairCompression = PairCompression.Gzip
+        self.pairs_part: Path | None = None
+        self.pairs_written = 0
+        self.selections: list[pairs_io.PairSelection] = []
+
+    def _write_pairs(
+        self, pairs: Iterator[SequencePair], path: Path, metric: DistanceMetric
+    ) -> Iterator[SequencePair]:
+        if not self.params.pairs.write:
+            yield from pairs
+            return
+
+        path = self.pairs_part or path
+        self.create_parents(path)
+        selection = pairs_io.PairSelection(
+            path, self.params.pairs, metric, separated=bool(self.pairs_written))
+        self.selections.append(selection)
+        try:
+            self.pairs_written += yield from selection.pairs(pairs)
+        finally:
+            self.selections.remove(selection)
+
+    def calculate_distances(self, pairs: Iterator[SequencePair]) -> Iterator[Distance]:
+        for distance in super().calculate_distances(pairs):
+            for selection in self.selections:
+                selection.judge(distance)
+            yield distance
+
+
+BLOCK_VALUES = 'block.npy'
+BLOCK_PAIRS = 'block.pairs'
+BLOCK_STATE = 'block.json'
+
+
+class Checkpointing(ABC):
+    """
+    With a checkpoint set, distances between queries and references are
+    calculated in blocks of consecutive queries, each committed once done.
+    A new block is started every interval. Committed blocks are replayed
+    from disk without aligning or calculating, so that later stages see
+    the same distances as in an uninterrupted run. Blocks may also be
+    calculated elsewhere for given rows, then committed in order.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.params.checkpoint = AttrDict()
+        self.params.checkpoint.interval: float = 60.0
+        self.checkpoint: Checkpoint | None = None
+
+    @abstractmethod
+    def product_metrics(self) -> list[DistanceMetric]:
+        """The metrics calculated for each pair, in the order of their values in blocks"""
+
+    def calculate_product(self, xs: Sequences, ys: Sequences) -> Iterator[Distance]:
+        if self.checkpoint is None:
+            pairs = SequencePairs.fromProduct(xs, ys)
+            pairs = self.align_pairs(pairs)
+            pairs = self.write_pairs(pairs)
+            yield from self.calculate_distances(pairs)
+            return
+
+        queries = iter(xs)
+        yield from self.replay_blocks(queries, ys)
+        while True:
+            rows = yield from self.calculate_block(queries, ys)
+            if not rows:
+                break
+        self.join_pairs()
+
+    def replay_blocks(self, queries: Iterator[Sequence], ys: Sequences) -> Iterator[Distance]:
+        metrics = self.product_metrics()
+        self.pairs_written = self.checkpoint.total('pairs')
+        for index, block in enumerate(self.checkpoint.blocks):
+            values = iter(np.load(self.checkpoint.block_path(index, '.npy')).tolist())
+            for x in islice(queries, block['rows']):
+                for y in ys:
+                    for metric in metrics:
+                        d = next(values)
+                        yield Distance(metric, x, y, None if isnan(d) else d)
+
+    def calculate_block(self, queries: Iterator[Sequence], ys: Sequences) -> Iterator[Distance]:
+        index = len(self.checkpoint)
+        deadline = perf_counter() + self.params.checkpoint.interval
+        rows = 0
+
+        def block_queries():
+            nonlocal rows
+            for x in queries:
+                rows += 1
+                yield x
+                if perf_counter() >= deadline:
+                    return
+
+        written = self.pairs_written
+        self.pairs_part = self.checkpoint.block_path(index, '.pairs')
+        values = array('d')
+        try:
+            pairs = SequencePairs.fromProduct(block_queries(), ys)
+            pairs = self.align_pairs(pairs)
+            pairs = self.write_pairs(pairs)
+            for distance in self.calculate_distances(pairs):
+                values.append(np.nan if distance.d is None else distance.d)
+                yield distance
+        finally:
+            self.pairs_part = None
+
+        if rows:
+            self._save_values(values, self.checkpoint.block_path(index, '.npy'))
+            self.checkpoint.commit(rows=rows, pairs=self.pairs_written - written)
+        return rows
+
+    def _save_values(self, values: array, path: Path):
+        partial = path.with_name(f'.{path.name}.partial')
+        with open(partial, 'wb') as file:
+            np.save(file, np.frombuffer(values, dtype=np.float64))
+        os.replace(partial, path)
+
+    def calculate_rows(self, start: int, stop: int, directory: Path) -> dict[str, int]:
+        """
+        Calculate the block of queries within the given rows on its own, so
+        that blocks can be distributed. It is saved to the directory, to be
+        committed with `commit_block()`. Returns its row and pair counts.
+        """
+        sequences = self.normalize_sequences(self.input.sequences)
+        rows = 0
+
+        def block_queries():
+            nonlocal rows
+            for x in islice(sequences, start, stop):
+                rows += 1
+                yield x
+
+        self.pairs_written = 0
+        self.pairs_part = directory / BLOCK_PAIRS
+        values = array('d')
+        try:
+            pairs = SequencePairs.fromProduct(block_queries(), sequences)
+            pairs = self.align_pairs(pairs)
+            pairs = self.write_pairs(pairs)
+            for distance in self.calculate_distances(pairs):
+                values.append(np.nan if distance.d is None else distance.d)
+        finally:
+            self.pairs_part = None
+
+        self._save_values(values, directory / BLOCK_VALUES)
+        fields = dict(rows=rows, pairs=self.pairs_written)
+        with open(directory / BLOCK_STATE, 'w', encoding='utf-8') as file:
+            json.dump(fields, file)
+        return fields
+
+    def commit_block(self, directory: Path):
+        """Commit a block saved by `calculate_rows()` as the next one, then remove its directory"""
+        with open(directory / BLOCK_STATE, encoding='utf-8') as file:
+            fields = json.load(file)
+        index = len(self.checkpoint)
+        os.replace(directory / BLOCK_VALUES, self.checkpoint.block_path(index, '.npy'))
+        if self.params.pairs.write:
+            compression = self.params.pairs.compression
+            source = directory / (BLOCK_PAIRS + compression.suffix)
+            target = self.checkpoint.block_path(index, '.pairs' + compression.suffix)
+            if fields['pairs'] and self.checkpoint.total('pairs'):
+                # The block was written without knowing of earlier pairs, so it is separated here
+                with pairs_io.open_pairs_file(target, compression) as file:
+                    file.write('\n')
+                with open(target, 'ab') as file, open(source, 'rb') as part:
+                    shutil.copyfileobj(part, file, 1 << 20)
+            else:
+                os.replace(source, target)
+        self.checkpoint.commit(**fields)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def join_pairs(self):
+        """Concatenate the pairs of all blocks, compressed streams included"""
+        if not self.params.pairs.write:
+            return
+        suffix = self.params.pairs.compression.suffix
+        path = self.paths.aligned_pairs
+        self.create_parents(path)
+        with open(path.with_name(path.name + suffix), 'wb') as file:
+            for index in range(len(self.checkpoint)):
+                part = self.checkpoint.block_path(index, '.pairs' + suffix)
+                with open(part, 'rb') as source:
+                    shutil.copyfileobj(source, file, 1 << 20)
+
+
+class VersusAll(Checkpointing, PairWriting, versus_all.VersusAll):
+    """
+    Distance tables are formatted in blocks of rows. Subset statistics are
+    written as in taxi2, optionally along with their spread, which is then
+    sketched in the same pass with bounded memory.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.params.stats.spread: bool = False
+        self.params.stats.accuracy: float = 0.01
+        self.params.distances.block_rows: int = 4096
+        self.params.distances.threaded_writes: bool = True
+        self.params.pairs.metric: DistanceMetric | None = None
+        self.params.plot.workers: int | None = None
+        self.write_stats: list[WriteStats] = []
+
+    def write_pairs(self, pairs: Iterator[SequencePair]):
+        """Pairs are selected by the given metric, or else by the first one calculated"""
+        metric = self.params.pairs.metric
+        if metric is None:
+            metric = self.params.distances.metrics[0]
+        return self._write_pairs(pairs, self.paths.aligned_pairs, metric)
+
+    def product_metrics(self) -> list[DistanceMetric]:
+        return self.params.distances.metrics
+
+    def plot_histograms(self, distances: Iterator[versus_all.SubsetDistance]):
+        """Binned counts are always saved, plots are only rendered for the given formats"""
+        if not self.params.plot.histograms:
+            yield from distances
+            return
+
+        counts = HistogramCounts(
+            binwidth=self.params.plot.binwidth,
+            binfactor=100.0 if self.params.format.percentage_multiply else 1.0,
+        )
+        for subset_distance in distances:
+            counts.add(
+                str(subset_distance.distance.metric),
+                subset_distance.distance.d,
+                subset_distance.get_comparison_type(),
+            )
+            yield subset_distance
+        with phase('Saving histograms'):
+            self.create_parents(self.paths.plots)
+            counts.save(self.paths.plots)
+        if self.params.plot.formats:
+            with phase('Rendering plots'):
+                render_histograms(
+                    self.paths.plots, self.params.plot.formats, self.params.plot.workers,
+                    progress=self.progress_handler)
+
+    def _table_writer(self, path: Path) -> TableWriter:
+        return TableWriter(path, threaded=self.params.distances.threaded_writes)
+
+    def write_distances_linear(self, distances: Distances):
+        if not self.params.distances.write_linear:
+            yield from distances
+            return
+
+        self.create_parents(self.paths.distances_linear)
+        missing = self.params.format.missing
+        formatter = FloatFormatter(self.params.format.float, missing)
+        block_rows = self.params.distances.block_rows
+        metrics = len(self.params.distances.metrics)
+
+        def extras_text(extras: dict) -> str:
+            return ''.join(f'\t{v if v is not None else missing}' for v in extras.values())
+
+        def format_block(prefixes: list[str], values: list[float]) -> bytes:
+            cells = formatter.format(np.array(values, dtype=float).reshape(-1, metrics))
+            return render_rows(prefixes, cells)
+
+        with self._table_writer(self.paths.distances_linear) as file:
+            prefixes = []
+            values = []
+            try:
+                for index, distance in enumerate(distances):
+                    if index % metrics == 0:
+                        x, y = distance.x, distance.y
+                        if not index:
+                            file.write_row((
+                                'seqid (query)',
+                                *(f'{key} (query)' for key in x.extras),
+                                'seqid (reference)',
+                                *(f'{key} (reference)' for key in y.extras),
+                                *(str(metric) for metric in self.params.distances.metrics),
+                            ))
+                        if len(prefixes) >= block_rows:
+                            file.submit(format_block, prefixes, values)
+                            prefixes = []
+                            values = []
+                        prefixes.append(f'{x.id}{extras_text(x.extras)}\t{y.id}{extras_text(y.extras)}')
+                    values.append(distance.d)
+                    yield distance
+            finally:
+                if prefixes:
+                    file.submit(format_block, prefixes, values)
+        self.write_stats.append(file.stats)
+
+    def _write_distances_matrix(
+        self, distances: Distances, metric: DistanceMetric, path: Path
+    ):
+        formatter = FloatFormatter(self.params.format.float, self.params.format.missing)
+        block_rows = self.params.distances.block_rows
+
+        def format_block(idxs: list[str], values: list[list[float]]) -> bytes:
+            cells = formatter.format(np.array(values, dtype=float))
+            return render_rows(idxs, cells)
+
+        with self._table_writer(path) as file:
+            idxs = []
+            idys = []
+            values = []
+            wrote_headers = False
+            try:
+                for distance in distances:
+                    if distance.metric.type == metric.type:
+                        if not idxs or idxs[-1] != distance.x.id:
+                            if idxs and not wrote_headers:
+                                file.write_row(('', *idys))
+                                wrote_headers = True
+                            if len(idxs) >= block_rows:
+                                file.submit(format_block, idxs, values)
+                                idxs = []
+                                values = []
+                            idxs.append(distance.x.id)
+                            values.append([])
+                        if not wrote_headers:
+                            idys.append(distance.y.id)
+                        values[-1].append(distance.d)
+                    yield distance
+            finally:
+                if idxs and not wrote_headers:
+                    file.write_row(('', *idys))
+                if idxs:
+                    file.submit(format_block, idxs, values)
+        self.write_stats.append(file.stats)
+
+    def _aggregate_distances(
+        self, distances: Distances, partition: Partition, path: Path
+    ) -> Iterator[versus_all.SubsetPair]:
+        labels = GroupLabels(partition)
+        accuracy = self.params.stats.accuracy if self.params.stats.spread else None
+        aggregators = dict()
+        for metric in self.params.distances.metrics:
+            aggregators[str(metric)] = SubsetStatistics(metric, labels, accuracy)
+
+        try:
+            for distance in distances:
+                code_x = labels.code(distance.x.id)
+                code_y = labels.code(distance.y.id)
+                aggregators[str(distance.metric)].add(code_x, code_y, distance.d)
+                yield versus_all.SubsetPair(labels.name(code_x), labels.name(code_y))
+
+        except GeneratorExit:
+            pass
+
+        finally:
+            with phase(f'Writing statistics for {path.name}'):
+                self.write_subset_statistics_linear(aggregators, path / 'linear')
+                self.write_subset_statistics_matricial(aggregators, path / 'matricial')
+                if self.params.stats.spread:
+                    self.write_subset_statistics_spread(aggregators, path / 'linear')
+
+    def write_subset_statistics_spread(
+        self, aggregators: dict[str, SubsetStatistics], path: Path
+    ):
+        self.create_parents(path)
+        missing = self.params.format.missing
+        formatter = self.params.format.float
+
+        def to_text(value: float | None) -> str:
+            if value is None:
+                return missing
+            return formatter.format(value)
+
+        with FileHandler.Tabfile(path / 'spread.tsv', 'w') as file:
+            metrics = list(aggregators.keys())
+            fields = ['stdev', 'q1', 'median', 'q3']
+            headers = (f'{metric} {field}' for metric in metrics for field in fields)
+            file.write(('target', 'query', *headers))
+            iterators = (aggregator.spread() for aggregator in aggregators.values())
+            for bunch in zip(*iterators):
+                idx = bunch[0].idx if bunch[0].idx is not None else '?'
+                idy = bunch[0].idy if bunch[0].idy is not None else '?'
+                values = (
+                    to_text(getattr(stats, field))
+                    for stats in bunch for field in fields)
+                file.write((idx, idy, *values))
+
+    def start(self) -> versus_all.Results:
+        ts = perf_counter()
+
+        self.generate_paths()
+        self.check_metrics()
+
+        sequences = self.input.sequences
+        sequences = self.normalize_sequences(sequences)
+
+        sequences_left = sequences
+        sequences_left = self.calculate_statistics_all(sequences_left)
+        sequences_left = self.calculate_statistics_species(sequences_left)
+        sequences_left = self.calculate_statistics_genera(sequences_left)
+
+        distances = self.calculate_product(sequences_left, sequences)
+        distances = self.adjust_distances(distances)
+        distances = self.write_distances_linear(distances)
+        distances = self.write_distances_multimatrix(distances)
+
+        distances = versus_all.multiply(distances, 3)
+        genera_pair = self.aggregate_distances_genera(distances)
+        species_pair = self.aggregate_distances_species(distances)
+        subset_distances = (
+            versus_all.SubsetDistance(d, g, s)
+            for d, g, s in zip(distances, genera_pair, species_pair)
+        )
+
+        subset_distances = self.plot_histograms(subset_distances)
+        subset_distances = self.write_summary(subset_distances)
+
+        subset_distances = self.report_progress(subset_distances)
+
+        for _ in subset_distances:
+            pass
+
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
+
+        return versus_all.Results(self.work_dir, perf_counter() - ts)
+
+
+class VersusReference(PairWriting, versus_reference.VersusReference):
+    def write_pairs(self, pairs: Iterator[SequencePair]):
+        metric = self.params.distances.metric
+        return self._write_pairs(pairs, self.paths.aligned_pairs, metric)
+
+
+class Dereplicate(PairWriting, dereplicate.Dereplicate):
+    def write_pairs(self, pairs: Iterator[SequencePair]):
+        metric = self.params.distances.metric
+        return self._write_pairs(pairs, self.paths.aligned_pairs, metric)
+
+
+class DereplicateSweep(Dereplicate):
+    """
+    Dereplicate at several similarity thresholds. Distances between all pairs
+    are calculated once and kept in a disk backed matrix, along with aligned
+    pairs and distance tables. Dereplication is then replayed for each
+    threshold against the matrix, writing its own summary and sequences.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.params.thresholds.sweep: list[float] = []
+        self.matrix: np.memmap | None = None
+        self.index: dict[str, int] = {}
+        self.replaying = False
+
+    def calculate_distances(self, pairs: Iterator[SequencePair]) -> Iterator[Distance]:
+        metric = self.params.distances.metric
+        if self.replaying:
+            for x, y in pairs:
+                d = self.matrix[self.index[x.id], self.index[y.id]]
+                yield Distance(metric, x, y, None if np.isnan(d) else float(d))
+            return
+        for distance in super().calculate_distances(pairs):
+            d = np.nan if distance.d is None else distance.d
+            self.matrix[self.index[distance.x.id], self.index[distance.y.id]] = d
+            yield distance
+
+    def calculate_all(self, data: Sequences):
+        pairs = SequencePairs.fromProduct(data, data)
+        pairs = self.drop_identical_pairs(pairs)
+        pairs = self.normalize_pairs(pairs)
+        pairs = self.align_pairs(pairs)
+        pairs = self.write_pairs(pairs)
+
+        distances = self.calculate_distances(pairs)
+        distances = self.report_progress(distances, data)
+        distances = self.adjust_distances(distances)
+        distances = self.write_distances_linear(distances)
+        distances = self.write_distances_matrix(distances)
+
+        for _ in distances:
+            pass
+
+    def write_sweep_summary(self, rows: list[tuple[float, int, int, Path]]):
+        with FileHandler.Tabfile(self.work_dir / 'sweep.tsv', 'w', columns=['similarity_threshold', 'kept', 'excluded', 'directory']) as file:
+            for threshold, kept, excluded, directory in rows:
+                file.write((f'{threshold:g}', str(kept), str(excluded), directory.name))
+
+    def start(self) -> dereplicate.Results:
+        ts = perf_counter()
+        root = self.work_dir
+
+        self.check_params()
+        self.generate_paths()
+        data = Sequences(self.drop_short_sequences, self.input)
+        ids = [sequence.id for sequence in data]
+        self.index = {id: index for index, id in enumerate(ids)}
+        size = len(ids)
+        if len(self.index) != size:
+            raise Exception('Sequence identifiers must be unique to sweep over thresholds.')
+
+        matrix_path = root / '.distances.npy'
+        self.matrix = np.lib.format.open_memmap(matrix_path, mode='w+', dtype=np.float64, shape=(size, size))
+        self.matrix.fill(np.nan)
+
+        params = self.params
+        saved = (params.pairs.align, params.pairs.write, params.distances.write_linear, params.distances.write_matricial)
+        rows = []
+        try:
+            with phase('Calculating distances'):
+                self.calculate_all(data)
+
+            self.replaying = True
+            params.pairs.align = params.pairs.write = False
+            params.distances.write_linear = params.distances.write_matricial = False
+            for threshold in params.thresholds.sweep:
+                with phase(f'Similarity threshold {threshold:g}'):
+                    params.thresholds.similarity = threshold
+                    self.work_dir = root / f'similarity_{threshold:g}'
+                    self.work_dir.mkdir(exist_ok=True)
+                    super().start()
+                    rows.append((threshold, size - len(self.excluded), len(self.excluded), self.work_dir))
+        finally:
+            self.replaying = False
+            params.pairs.align, params.pairs.write, params.distances.write_linear, params.distances.write_matricial = saved
+            self.work_dir = root
+            del self.matrix
+            self.matrix = None
+            matrix_path.unlink(missing_ok=True)
+
+        self.write_sweep_summary(rows)
+        return dereplicate.Results(root, perf_counter() - ts)
+
+
+class Decontaminate(Checkpointing, PairWriting, decontaminate.Decontaminate):
+    def write_pairs(self, pairs: Iterator[SequencePair]):
+        metric = self.params.distances.metric
+        return self._write_pairs(pairs, self.paths.aligned_pairs, metric)
+
+    def product_metrics(self) -> list[DistanceMetric]:
+        return [self.params.distances.metric]
+
+    def start(self) -> decontaminate.Results:
+        ts = perf_counter()
+
+        self.check_params()
+        self.generate_paths()
+
+        data = self.input
+        outgroup = self.outgroup
+
+        data_normalized = self.normalize_sequences(data)
+        outgroup_normalized = self.normalize_sequences(outgroup)
+
+        out_distances = self.calculate_product(data_normalized, outgroup_normalized)
+        out_distances = self.adjust_distances(out_distances)
+        out_distances = self.write_outgroup_distances_linear(out_distances)
+        out_distances = self.write_outgroup_distances_matrix(out_distances)
+
+        out_groups = self.group_distances_left(out_distances)
+        out_minimums = self.get_minimum_distances(out_groups)
+
+        verdicts, lines = self.find_contaminants(data, out_minimums)
+        verdicts = self.write_file_decontaminated(verdicts)
+        verdicts = self.write_file_contaminants(verdicts)
+        verdicts = self.report_progress(verdicts)
+        lines = self.write_summary(lines)
+
+        for _ in zip(verdicts, lines):
+            pass
+
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
+
+        return decontaminate.Results(self.work_dir, perf_counter() - ts)
+
+
+class Decontaminate2(PairWriting, decontaminate2.Decontaminate2):
+    def write_outgroup_pairs(self, pairs: Iterator[SequencePair]):
+        metric = self.params.distances.metric
+        return self._write_pairs(pairs, self.paths.outgroup_aligned_pairs, metric)
+
+    def write_ingroup_pairs(self, pairs: Iterator[SequencePair]):
+        metric = self.params.distances.metric
+        return self._write_pairs(pairs, self.paths.ingroup_aligned_pairs, metric)
@@ -22,7 +22,9 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
-from ..types import ComparisonMode, ColumnFilter, AlignmentMode, DistanceMetric, FileFormat, DecontaminateMode
+from ..performance import save_report
+from ..progress import phase, plan
+from ..types import ComparisonMode, ColumnFilter, AlignmentMode, DistanceMetric, FileFormat, DecontaminateMode, PairPolicy, PairCompression
 
 
 @dataclass
@@ -42,8 +44,7 @@ def progress_handler(caption, index, total):
 def initialize():
     import itaxotools
     itaxotools.progress_handler('Initializing...')
-    from itaxotools.taxi2.tasks.decontaminate import Decontaminate  # noqa
-    from itaxotools.taxi2.tasks.decontaminate2 import Decontaminate2  # noqa
+    from .backend import Decontaminate, Decontaminate2  # noqa
 
 
 def get_file_info(path: Path):
@@ -77,7 +78,6 @@ def get_file_info(path: Path):
 
 def sequences_from_model(input: SequenceModel2) -> Sequences:
     from itaxotools.taxi2.sequences import Sequences, SequenceHandler
-    from ..model import SequenceModel2
 
     if input.type == FileFormat.Tabfile:
         return Sequences.fromPath(
@@ -98,6 +98,7 @@ def sequences_from_model(input: SequenceModel2) -> Sequences:
 def decontaminate(
 
     work_dir: Path,
+    output_directory: Path | None,
 
     decontaminate_mode: DecontaminateMode,
 
@@ -107,6 +108,10 @@ def decontaminate(
 
     alignment_mode: AlignmentMode,
     alignment_write_pairs: bool,
+    alignment_pairs_policy: PairPolicy,
+    alignment_pairs_cutoff: float,
+    alignment_pairs_top_k: int,
+    alignment_pairs_compression: PairCompression,
     alignment_pairwise_scores: dict,
 
     distance_metric: DistanceMetric,
@@ -121,12 +126,14 @@ def decontaminate(
     outgroup_weight: int,
     ingroup_weight: int,
 
+    checkpoint_key: str | None = None,
+
     **kwargs
 
 ) -> tuple[Path, float]:
 
-    from itaxotools.taxi2.tasks.decontaminate import Decontaminate
-    from itaxotools.taxi2.tasks.decontaminate2 import Decontaminate2
+    from .backend import Decontaminate, Decontaminate2
+    from ..checkpoint import Checkpoint
     from itaxotools.taxi2.distances import DistanceMetric as BackendDistanceMetric
     from itaxotools.taxi2.sequences import Sequences, SequenceHandler
     from itaxotools.taxi2.partitions import Partition, PartitionHandler
@@ -135,6 +142,8 @@ def decontaminate(
     if decontaminate_mode == DecontaminateMode.DECONT:
         task = Decontaminate()
         task.params.thresholds.similarity = similarity_threshold
+        if checkpoint_key is not None:
+            task.checkpoint = Checkpoint.open(work_dir, checkpoint_key)
     elif decontaminate_mode == DecontaminateMode.DECONT2:
         task = Decontaminate2()
         task.ingroup = sequences_from_model(ingroup_sequences)
@@ -151,6 +160,10 @@ def decontaminate(
     task.params.pairs.align = bool(alignment_mode == AlignmentMode.PairwiseAlignment)
     task.params.pairs.scores = Scores(**alignment_pairwise_scores)
     task.params.pairs.write = alignment_write_pairs
+    task.params.pairs.policy = alignment_pairs_policy
+    task.params.pairs.cutoff = alignment_pairs_cutoff
+    task.params.pairs.top_k = alignment_pairs_top_k
+    task.params.pairs.compression = alignment_pairs_compression
 
     metrics_tr = {
         DistanceMetric.Uncorrected: (BackendDistanceMetric.Uncorrected, []),
@@ -171,6 +184,16 @@ def decontaminate(
     task.params.format.missing = distance_missing
     task.params.format.percentage_multiply = distance_percentile
 
-    results = task.start()
+    plan('Decontaminating', 'Publishing results' if output_directory else None)
+    with phase('Decontaminating'):
+        results = task.start()
+
+    if output_directory is not None:
+        from ..transfer import publish
+        with phase('Publishing results'):
+            published = publish(work_dir, output_directory)
+        results = results._replace(output_directory=published.destination)
+
+    save_report(results.output_directory)
 
     return results
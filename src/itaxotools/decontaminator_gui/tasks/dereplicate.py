@@ -22,7 +22,9 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
-from ..types import ComparisonMode, ColumnFilter, AlignmentMode, DistanceMetric, FileFormat
+from ..performance import save_report
+from ..progress import phase, plan
+from ..types import ComparisonMode, ColumnFilter, AlignmentMode, DistanceMetric, FileFormat, PairPolicy, PairCompression
 
 
 @dataclass
@@ -42,7 +44,7 @@ def progress_handler(caption, index, total):
 def initialize():
     import itaxotools
     itaxotools.progress_handler('Initializing...')
-    from itaxotools.taxi2.tasks.dereplicate import Dereplicate  # noqa
+    from .backend import Dereplicate  # noqa
 
 
 def get_file_info(path: Path):
@@ -76,7 +78,6 @@ def get_file_info(path: Path):
 
 def sequences_from_model(input: SequenceModel2):
     from itaxotools.taxi2.sequences import Sequences, SequenceHandler
-    from ..model import SequenceModel2
 
     if input.type == FileFormat.Tabfile:
         return Sequences.fromPath(
@@ -97,11 +98,16 @@ def sequences_from_model(input: SequenceModel2):
 def dereplicate(
 
     work_dir: Path,
+    output_directory: Path | None,
 
     input_sequences: AttrDict,
 
     alignment_mode: AlignmentMode,
     alignment_write_pairs: bool,
+    alignment_pairs_policy: PairPolicy,
+    alignment_pairs_cutoff: float,
+    alignment_pairs_top_k: int,
+    alignment_pairs_compression: PairCompression,
     alignment_pairwise_scores: dict,
 
     distance_metric: DistanceMetric,
@@ -114,18 +120,23 @@ def dereplicate(
 
     similarity_threshold: float,
     length_threshold: int,
+    similarity_sweep: list[float] | None = None,
 
     **kwargs
 
 ) -> tuple[Path, float]:
 
-    from itaxotools.taxi2.tasks.dereplicate import Dereplicate
+    from .backend import Dereplicate, DereplicateSweep
     from itaxotools.taxi2.distances import DistanceMetric as BackendDistanceMetric
     from itaxotools.taxi2.sequences import Sequences, SequenceHandler
     from itaxotools.taxi2.partitions import Partition, PartitionHandler
     from itaxotools.taxi2.align import Scores
 
-    task = Dereplicate()
+    if similarity_sweep:
+        task = DereplicateSweep()
+        task.params.thresholds.sweep = similarity_sweep
+    else:
+        task = Dereplicate()
     task.work_dir = work_dir
     task.progress_handler = progress_handler
 
@@ -138,6 +149,10 @@ def dereplicate(
     task.params.pairs.align = bool(alignment_mode == AlignmentMode.PairwiseAlignment)
     task.params.pairs.scores = Scores(**alignment_pairwise_scores)
     task.params.pairs.write = alignment_write_pairs
+    task.params.pairs.policy = alignment_pairs_policy
+    task.params.pairs.cutoff = alignment_pairs_cutoff
+    task.params.pairs.top_k = alignment_pairs_top_k
+    task.params.pairs.compression = alignment_pairs_compression
 
     metrics_tr = {
         DistanceMetric.Uncorrected: (BackendDistanceMetric.Uncorrected, []),
@@ -158,6 +173,16 @@ def dereplicate(
     task.params.format.missing = distance_missing
     task.params.format.percentage_multiply = distance_percentile
 
-    results = task.start()
+    plan('Dereplicating', 'Publishing results' if output_directory else None)
+    with phase('Dereplicating'):
+        results = task.start()
+
+    if output_directory is not None:
+        from ..transfer import publish
+        with phase('Publishing results'):
+            published = publish(work_dir, output_directory)
+        results = results._replace(output_directory=published.destination)
+
+    save_report(results.output_directory)
 
     return results
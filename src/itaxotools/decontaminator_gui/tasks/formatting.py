@@ -0,0 +1,240 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Block formatting and buffered writing of output tables, executed by workers"""
+
+from __future__ import annotations
+
+import os
+import re
+from pathlib import Path
+from queue import Queue
+from threading import Thread
+from time import perf_counter
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+# Cells are rendered into fixed-width byte arrays padded with NUL,
+# which is then stripped from the whole block at once.
+PAD = 0
+TAB = ord('\t')
+NEWLINE = np.frombuffer(os.linesep.encode(), dtype=np.uint8)
+
+
+class WriteStats(NamedTuple):
+    path: Path
+    bytes_written: int
+    seconds_writing: float
+
+
+def _pad(text: str, width: int) -> np.ndarray:
+    cell = np.zeros(width, dtype=np.uint8)
+    data = text.encode('utf-8')
+    cell[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+    return cell
+
+
+class FloatFormatter:
+    """
+    Format blocks of floats to padded byte cells, with missing values masked.
+    Templates of the form '{:.Nf}' are rendered digit by digit on whole arrays,
+    anything else falls back to the template itself.
+    """
+
+    pattern = re.compile(r'^\{:\.(\d+)f\}$')
+
+    def __init__(self, template: str, missing: str):
+        match = self.pattern.match(template)
+        self.precision = int(match.group(1)) if match else None
+        if self.precision is not None and self.precision > 15:
+            self.precision = None
+        self.template = template
+        self.missing = missing
+
+    def format(self, values: np.ndarray) -> np.ndarray:
+        """Returns an array of shape values.shape + (width,)"""
+        if self.precision is None or np.any(np.abs(values[np.isfinite(values)]) >= 1e15):
+            return self._format_template(values)
+        return self._format_fixed(values)
+
+    def _format_template(self, values: np.ndarray) -> np.ndarray:
+        text = [
+            self.missing if np.isnan(value) else self.template.format(value)
+            for value in values.flat]
+        cells = np.array([cell.encode('utf-8') for cell in text] or [b''], dtype=bytes)
+        width = cells.dtype.itemsize
+        return cells[:values.size].view(np.uint8).reshape(values.shape + (width,))
+
+    def _format_fixed(self, values: np.ndarray) -> np.ndarray:
+        precision = self.precision
+        missing = np.isnan(values)
+        infinite = np.isinf(values)
+        negative = np.signbit(values) & ~missing
+
+        scale = 10 ** precision
+        finite = np.where(missing | infinite, 0.0, np.abs(values))
+        whole, fraction = self._round(finite, scale)
+        digits = len(str(int(whole.max()))) if whole.size else 1
+        point = precision + 1 if precision else 0
+        width = max(1 + digits + point, len(self.missing.encode('utf-8')), 4)
+        cells = np.zeros(values.shape + (width,), dtype=np.uint8)
+
+        for index in range(width - 1, width - 1 - precision, -1):
+            fraction, digit = np.divmod(fraction, 10)
+            cells[..., index] = digit + ord('0')
+        if precision:
+            cells[..., width - point] = ord('.')
+
+        last = width - 1 - point
+        length = np.ones(values.shape, dtype=np.int64)
+        for offset in range(digits):
+            whole, digit = np.divmod(whole, 10)
+            shown = (digit > 0) | (whole > 0) if offset else True
+            cells[..., last - offset] = np.where(shown, digit + ord('0'), PAD)
+            if offset:
+                length += shown
+
+        sign = np.expand_dims(last - length, -1)
+        signs = np.where(negative, ord('-'), PAD)[..., None].astype(np.uint8)
+        np.put_along_axis(cells, sign, signs, axis=-1)
+
+        cells[infinite & ~negative] = _pad('inf', width)
+        cells[infinite & negative] = _pad('-inf', width)
+        cells[missing] = _pad(self.missing, width)
+        return cells
+
+    def _round(self, finite: np.ndarray, scale: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Whole and fractional digits of each value as integers. Scaling is
+        inexact in binary, so values that land near a tie, or that are too
+        large for exact integers, are rounded by str.format instead.
+        """
+        scaled = finite * scale
+        rounded = np.rint(scaled)
+        tie = np.abs(np.abs(scaled - rounded) - 0.5) < 1e-9 * np.maximum(scaled, 1.0)
+        exact = tie | (scaled >= 2 ** 52)
+        rounded = np.where(exact, 0.0, rounded).astype(np.int64)
+        whole, fraction = np.divmod(rounded, scale)
+        for index in zip(*np.nonzero(exact)):
+            text = f'{finite[index]:.{self.precision}f}'
+            head, _, tail = text.partition('.')
+            whole[index] = int(head)
+            fraction[index] = int(tail or 0)
+        return whole, fraction
+
+
+def render_rows(prefixes: list[str], cells: np.ndarray) -> bytes:
+    """
+    Join a column of row prefixes with a (rows, columns, width) block of
+    cells into tab separated lines.
+    """
+    rows, columns, width = cells.shape
+    if not rows:
+        return b''
+    head = np.array([prefix.encode('utf-8') for prefix in prefixes], dtype=bytes)
+    head = head.view(np.uint8).reshape(rows, -1)
+    body = np.empty((rows, columns, width + 1), dtype=np.uint8)
+    body[..., 0] = TAB
+    body[..., 1:] = cells
+    tail = np.broadcast_to(NEWLINE, (rows, len(NEWLINE)))
+    block = np.concatenate([head, body.reshape(rows, -1), tail], axis=1)
+    return block[block != PAD].tobytes()
+
+
+class TableWriter:
+    """
+    Write blocks of text to a file through a large buffer. When threaded,
+    blocks are formatted and written by a background thread, so that
+    formatting overlaps with the calculation of the next block.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        threaded: bool = True,
+        buffer_size: int = 1 << 20,
+        queue_size: int = 8,
+    ):
+        self.path = path
+        self.threaded = threaded
+        self.buffer_size = buffer_size
+        self.queue_size = queue_size
+        self.bytes_written = 0
+        self.seconds_writing = 0.0
+        self.file = None
+        self.queue = None
+        self.thread = None
+        self.exception = None
+
+    def __enter__(self):
+        self.file = open(self.path, 'wb', buffering=self.buffer_size)
+        if self.threaded:
+            self.queue = Queue(self.queue_size)
+            self.thread = Thread(target=self._drain, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def stats(self) -> WriteStats:
+        return WriteStats(self.path, self.bytes_written, self.seconds_writing)
+
+    def write_row(self, row: tuple[str, ...]):
+        self.submit(lambda: ('\t'.join(row) + os.linesep).encode('utf-8'))
+
+    def submit(self, block: Callable[..., bytes], *args):
+        """Schedule a callable that returns a block of bytes to be written"""
+        if self.exception is not None:
+            raise self.exception
+        if self.threaded:
+            self.queue.put((block, args))
+        else:
+            self._write(block, args)
+
+    def close(self):
+        if self.file is None:
+            return
+        if self.threaded:
+            self.queue.put(None)
+            self.thread.join()
+        ts = perf_counter()
+        self.file.close()
+        self.seconds_writing += perf_counter() - ts
+        self.file = None
+        if self.exception is not None:
+            raise self.exception
+
+    def _write(self, block: Callable[..., bytes], args: tuple):
+        ts = perf_counter()
+        self.bytes_written += self.file.write(block(*args))
+        self.seconds_writing += perf_counter() - ts
+
+    def _drain(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.exception is not None:
+                continue
+            try:
+                self._write(*item)
+            except Exception as exception:
+                self.exception = exception
@@ -0,0 +1,248 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Binned distance histograms and their rendering, executed by workers"""
+
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from itaxotools.taxi2.handlers import FileHandler
+from itaxotools.taxi2.plot import ComparisonType
+
+from ..transfer import STAGING_PREFIX
+
+COUNTS_SUFFIX = '_counts.tsv'
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def bin_edges(binwidth: float, binrange: tuple[float, float]) -> np.ndarray:
+    """Same edges as seaborn.histplot for the given binwidth and binrange"""
+    start, stop = binrange
+    edges = np.arange(start, stop + binwidth, binwidth)
+    if edges.max() < stop or len(edges) < 2:
+        edges = np.append(edges, edges.max() + binwidth)
+    return edges
+
+
+class HistogramCounts:
+    """
+    Streaming histogram of distances per metric and comparison type.
+    Values are buffered and binned in batches, so that memory does not
+    grow with the number of distances.
+    """
+
+    def __init__(self, binwidth: float, binfactor: float = 1.0, buffer_size: int = 1 << 16):
+        self.edges = bin_edges(binwidth * binfactor, (0.0, binfactor))
+        self.buffer_size = buffer_size
+        self.counts: dict[str, dict[ComparisonType, np.ndarray]] = dict()
+        self.buffers: dict[tuple[str, ComparisonType], list[float]] = dict()
+
+    def add(self, metric: str, value: float | None, type: ComparisonType):
+        if value is None:
+            return
+        key = (metric, type)
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = self.buffers[key] = []
+        buffer.append(value)
+        if len(buffer) >= self.buffer_size:
+            self._flush(key)
+
+    def _flush(self, key: tuple[str, ComparisonType]):
+        metric, type = key
+        values = np.array(self.buffers[key], dtype=float)
+        self.buffers[key] = []
+        counts = np.histogram(values, self.edges)[0]
+        types = self.counts.setdefault(metric, dict())
+        if type in types:
+            types[type] += counts
+        else:
+            types[type] = counts
+
+    def save(self, path: Path):
+        """Write one table of counts per metric, with one column per comparison type"""
+        for key in list(self.buffers):
+            self._flush(key)
+        for metric, types in self.counts.items():
+            types = {type: counts for type, counts in sorted(types.items()) if counts.sum()}
+            (path / metric).mkdir(exist_ok=True)
+            with FileHandler.Tabfile(path / metric / f'{metric}{COUNTS_SUFFIX}', 'w') as file:
+                file.write(('bin start', 'bin end', *(type.label for type in types)))
+                for index in range(len(self.edges) - 1):
+                    file.write((
+                        repr(float(self.edges[index])),
+                        repr(float(self.edges[index + 1])),
+                        *(str(counts[index]) for counts in types.values()),
+                    ))
+
+
+class Histogram(NamedTuple):
+    metric: str
+    edges: np.ndarray
+    counts: dict[str, np.ndarray]
+
+    @classmethod
+    def from_path(cls, path: Path) -> Histogram:
+        metric = path.name.removesuffix(COUNTS_SUFFIX)
+        with FileHandler.Tabfile(path, 'r', has_headers=True) as file:
+            labels = file.headers[2:]
+            rows = list(file)
+        edges = [float(row[0]) for row in rows] + [float(rows[-1][1])] if rows else []
+        counts = {
+            label: np.array([int(row[2 + index]) for row in rows])
+            for index, label in enumerate(labels)}
+        return cls(metric, np.array(edges), counts)
+
+    def translated(self, translation: dict[ComparisonType, ComparisonType]) -> Histogram:
+        counts = dict()
+        for label, values in self.counts.items():
+            type = ComparisonType(label)
+            label = translation.get(type, type).label
+            counts[label] = counts[label] + values if label in counts else values
+        return Histogram(self.metric, self.edges, counts)
+
+
+class RenderJob(NamedTuple):
+    histogram: Histogram
+    kind: str
+    path: Path
+    formats: list[str]
+
+
+def _histogram_jobs(path: Path, formats: list[str]) -> list[RenderJob]:
+    jobs = []
+    for counts_path in sorted(path.glob(f'*/*{COUNTS_SUFFIX}')):
+        histogram = Histogram.from_path(counts_path)
+        metric = histogram.metric
+        variants = [(histogram, counts_path.parent, '')]
+
+        types = set(histogram.counts)
+        has_species_info = bool(types & {ComparisonType.IntraSpecies.label, ComparisonType.InterSpecies.label})
+        has_genus_info = bool(types & {ComparisonType.IntraGenus.label, ComparisonType.InterGenus.label})
+        if has_species_info and has_genus_info:
+            species = histogram.translated({
+                ComparisonType.InterGenus: ComparisonType.InterSpecies,
+                ComparisonType.IntraGenus: ComparisonType.Unknown,
+            })
+            genus = histogram.translated({
+                ComparisonType.InterSpecies: ComparisonType.IntraGenus,
+                ComparisonType.IntraSpecies: ComparisonType.IntraGenus,
+            })
+            variants.append((species, counts_path.parent / 'species_only', '_species_only'))
+            variants.append((genus, counts_path.parent / 'genus_only', '_genus_only'))
+
+        for variant, directory, suffix in variants:
+            directory.mkdir(exist_ok=True)
+            for kind, name in [('layered', 'layered'), ('stack', 'stacked'), ('dodge', 'dodge')]:
+                jobs.append(RenderJob(variant, kind, directory / f'{metric}_{name}_hist{suffix}', formats))
+    return jobs
+
+
+def _render(job: RenderJob):
+    import matplotlib
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+
+    matplotlib.use('agg')
+    matplotlib.rcParams['pdf.fonttype'] = 42
+    matplotlib.rcParams['ps.fonttype'] = 42
+    matplotlib.rc('font', **{'family': 'sans-serif'})
+
+    histogram, kind, path, formats = job
+    edges = histogram.edges
+    bins = edges.tolist()
+    centers = (edges[:-1] + edges[1:]) / 2
+    df = pd.DataFrame(
+        [
+            (label, center, count)
+            for label, counts in histogram.counts.items()
+            for center, count in zip(centers, counts)
+        ],
+        columns=['type', 'value', 'count'],
+    )
+    types = sorted(ComparisonType(label) for label in histogram.counts)
+    colors = sns.color_palette()
+    palette = [colors[type.index] for type in types]
+    order = [type.label for type in types]
+
+    if kind == 'layered':
+        g = sns.FacetGrid(df, row='type', hue='type', palette=palette, hue_order=order, height=1.5, aspect=4)
+        g.map_dataframe(sns.histplot, x='value', weights='count', bins=bins)
+        g.set_xlabels(f'{histogram.metric} distance')
+        g.set_ylabels('Count')
+        figure = g.fig
+    else:
+        figure, ax = plt.subplots()
+        sns.histplot(
+            df, x='value', weights='count', hue='type', multiple=kind, bins=bins,
+            palette=palette, hue_order=order, ax=ax)
+        sns.despine()
+        ax.set_xlabel(f'{histogram.metric} distance')
+        ax.set_ylabel('Count')
+
+    for format in formats:
+        target = path.with_suffix(f'.{format}')
+        partial = target.with_name(f'{STAGING_PREFIX}{target.name}')
+        figure.savefig(partial, format=format, transparent=True)
+        os.replace(partial, target)
+    plt.close(figure)
+
+
+def render_histograms(
+    path: Path,
+    formats: list[str],
+    workers: int | None = None,
+    progress: Callable[[str, int, int], None] | None = None,
+):
+    """
+    Render all saved histogram counts under path. Plots are drawn by a pool
+    of processes when the current process is allowed to have children,
+    which is not the case for daemonic workers.
+    """
+    jobs = _histogram_jobs(path, formats)
+    total = len(jobs)
+    if progress:
+        progress('Rendering plots...', 0, total)
+
+    if workers is None:
+        workers = available_cpus()
+    if workers > 1 and total > 1 and not mp.current_process().daemon:
+        with ProcessPoolExecutor(min(workers, total)) as executor:
+            for index, _ in enumerate(executor.map(_render, jobs), 1):
+                if progress:
+                    progress('Rendering plots...', index, total)
+        return
+
+    for index, job in enumerate(jobs, 1):
+        _render(job)
+        if progress:
+            progress('Rendering plots...', index, total)
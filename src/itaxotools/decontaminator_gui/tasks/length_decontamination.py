@@ -43,3 +43,23 @@ def execute(**kwargs):
     print()
     print(' End '.center(60, '-'))
     return 42
+
+
+def execute_sweep(thresholds: list[float], dir: str, **kwargs):
+    """
+    Run once per threshold, each on its own copy of the input directory,
+    named after the threshold, since files are decontaminated in place.
+    """
+    import shutil
+    from pathlib import Path
+    from ..progress import phase, plan
+
+    source = Path(dir)
+    plan(*(f'Threshold {threshold:g}' for threshold in thresholds))
+    for threshold in thresholds:
+        with phase(f'Threshold {threshold:g}'):
+            target = source.with_name(f'{source.name}_threshold_{threshold:g}')
+            shutil.rmtree(target, ignore_errors=True)
+            shutil.copytree(source, target)
+            execute(dir=str(target), thresh=str(threshold), **kwargs)
+    return 42
@@ -0,0 +1,157 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Selective and compressed writing of aligned pairs, executed by workers"""
+
+from __future__ import annotations
+
+import gzip
+import io
+from collections import deque
+from heapq import heappush, heappushpop
+from pathlib import Path
+from typing import Generator, Iterator, TextIO
+
+from itaxotools.common.utility import AttrDict
+from itaxotools.taxi2.distances import Distance, DistanceMetric
+from itaxotools.taxi2.pairs import SequencePair, SequencePairHandler
+
+from ..types import PairCompression, PairPolicy
+
+
+def open_pairs_file(path: Path, compression: PairCompression) -> TextIO:
+    """Open a text stream, compressed on the fly when requested"""
+    if compression == PairCompression.Gzip:
+        return gzip.open(path, 'wt', compresslevel=6, encoding='utf-8')
+    if compression == PairCompression.Zstd:
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError('Module "zstandard" is required for zstd compression') from e
+        raw = open(path, 'wb')
+        writer = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(writer, encoding='utf-8')
+    return open(path, 'w', buffering=1 << 20, encoding='utf-8')
+
+
+def format_pair(pair: SequencePair) -> str:
+    x, y = pair
+    alignment = SequencePairHandler.Formatted._format(x.seq, y.seq)
+    return f'{x.id} / {y.id}\n{x.seq}\n{alignment}\n{y.seq}\n'
+
+
+class PairsFile:
+    """
+    Aligned pairs in the formatted layout, separated by empty lines.
+    Files meant to be appended to others start with a separator.
+    """
+
+    def __init__(self, path: Path, compression: PairCompression, separated: bool = False):
+        self.path = path.with_name(path.name + compression.suffix)
+        self.compression = compression
+        self.separated = separated
+        self.file = None
+        self.count = 0
+
+    def __enter__(self):
+        self.file = open_pairs_file(self.path, self.compression)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+
+    def write(self, pair: SequencePair):
+        if self.count or self.separated:
+            self.file.write('\n')
+        self.file.write(format_pair(pair))
+        self.count += 1
+
+
+class PairSelection:
+    """
+    Pass through all pairs while writing those selected by the policy.
+    Cutoff and top-k policies judge each pair by its distance for the given
+    metric, which is calculated downstream and handed back with `judge()`,
+    so that nothing is calculated twice. Until then the pair is pending.
+    Top-k assumes pairs are grouped by query sequence, as in products.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        params: AttrDict,
+        metric: DistanceMetric,
+        separated: bool = False,
+    ):
+        if params.policy == PairPolicy.Cutoff and params.cutoff is None:
+            raise ValueError('A distance cutoff is required to select pairs')
+        if params.policy not in list(PairPolicy):
+            raise ValueError(f'Unknown pair policy: {params.policy}')
+        self.path = path
+        self.params = params
+        self.metric = metric
+        self.separated = separated
+        self.file: PairsFile | None = None
+        self.pending: deque[tuple[int, SequencePair]] = deque()
+        self.closest: list[tuple[float, int, SequencePair]] = []
+
+    def pairs(self, pairs: Iterator[SequencePair]) -> Generator[SequencePair, None, int]:
+        """Returns the number of pairs written"""
+        policy = self.params.policy
+        query = None
+        with PairsFile(self.path, self.params.compression, self.separated) as self.file:
+            try:
+                for index, pair in enumerate(pairs):
+                    if policy == PairPolicy.All:
+                        self.file.write(pair)
+                    elif pair.x.id != pair.y.id:
+                        if policy == PairPolicy.TopK and pair.x.id != query:
+                            self.flush()
+                            query = pair.x.id
+                        self.pending.append((index, pair))
+                    yield pair
+            finally:
+                self.flush()
+                self.pending.clear()
+                count = self.file.count
+                self.file = None
+        return count
+
+    def judge(self, distance: Distance):
+        if not self.pending or distance.metric is not self.metric:
+            return
+        index, pair = self.pending[0]
+        if distance.x is not pair.x or distance.y is not pair.y:
+            return
+        self.pending.popleft()
+        if distance.d is None:
+            return
+        if self.params.policy == PairPolicy.Cutoff:
+            if distance.d <= self.params.cutoff:
+                self.file.write(pair)
+        else:
+            item = (-distance.d, -index, pair)
+            if len(self.closest) < self.params.top_k:
+                heappush(self.closest, item)
+            else:
+                heappushpop(self.closest, item)
+
+    def flush(self):
+        for _, _, pair in sorted(self.closest, key=lambda item: (-item[0], -item[1])):
+            self.file.write(pair)
+        self.closest.clear()
@@ -0,0 +1,254 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Streaming accumulators for distance statistics, executed by workers"""
+
+from __future__ import annotations
+
+from math import ceil, inf, isnan, log, sqrt
+from typing import Iterator, NamedTuple
+
+from itaxotools.taxi2.distances import DistanceMetric
+from itaxotools.taxi2.partitions import Partition
+from itaxotools.taxi2.tasks.versus_all import DistanceStatistics
+
+
+class Welford:
+    """
+    Running count, sum, variance and range of a stream of values.
+    The mean is reported as the sum over the count, as in taxi2.
+    """
+
+    __slots__ = ('n', 'sum', 'running', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.n = 0
+        self.sum = 0.0
+        self.running = 0.0
+        self.m2 = 0.0
+        self.min = inf
+        self.max = -inf
+
+    def add(self, value: float | None):
+        if value is None or isnan(value):
+            return
+        self.n += 1
+        self.sum += value
+        delta = value - self.running
+        self.running += delta / self.n
+        self.m2 += delta * (value - self.running)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: Welford):
+        if not other.n:
+            return
+        if not self.n:
+            self.n, self.sum, self.running, self.m2 = other.n, other.sum, other.running, other.m2
+            self.min, self.max = other.min, other.max
+            return
+        n = self.n + other.n
+        delta = other.running - self.running
+        self.running += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float | None:
+        if not self.n:
+            return None
+        return self.sum / self.n
+
+    @property
+    def variance(self) -> float | None:
+        """Sample variance, undefined for less than two values"""
+        if self.n < 2:
+            return None
+        return self.m2 / (self.n - 1)
+
+    @property
+    def stdev(self) -> float | None:
+        variance = self.variance
+        if variance is None:
+            return None
+        return sqrt(variance)
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with bounded relative error.
+    Values are counted in logarithmic buckets (as in DDSketch),
+    so memory depends on the value range and not on the count.
+    """
+
+    __slots__ = ('accuracy', 'gamma', 'log_gamma', 'zeros', 'bins', 'n')
+
+    epsilon = 1e-9
+
+    def __init__(self, accuracy: float = 0.01):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = log(self.gamma)
+        self.zeros = 0
+        self.bins: dict[int, int] = dict()
+        self.n = 0
+
+    def add(self, value: float | None):
+        if value is None or isnan(value):
+            return
+        self.n += 1
+        if value <= self.epsilon:
+            self.zeros += 1
+            return
+        key = ceil(log(value) / self.log_gamma)
+        self.bins[key] = self.bins.get(key, 0) + 1
+
+    def merge(self, other: QuantileSketch):
+        if other.accuracy != self.accuracy:
+            raise ValueError('Cannot merge sketches of different accuracy')
+        self.n += other.n
+        self.zeros += other.zeros
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+
+    def quantile(self, q: float) -> float | None:
+        if not self.n:
+            return None
+        rank = q * (self.n - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+
+class SpreadStatistics(NamedTuple):
+    metric: DistanceMetric
+    idx: str
+    idy: str
+    stdev: float
+    q1: float
+    median: float
+    q3: float
+    count: int
+
+
+class DistanceAccumulator:
+    """Accumulate all statistics for one pair of subsets, quantiles only given an accuracy"""
+
+    __slots__ = ('moments', 'sketch')
+
+    def __init__(self, accuracy: float | None = None):
+        self.moments = Welford()
+        self.sketch = QuantileSketch(accuracy) if accuracy else None
+
+    def add(self, value: float | None):
+        self.moments.add(value)
+        if self.sketch is not None:
+            self.sketch.add(value)
+
+    def merge(self, other: DistanceAccumulator):
+        self.moments.merge(other.moments)
+        if self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+
+
+class GroupLabels:
+    """Integer codes for the subsets of a partition, -1 for unknown"""
+
+    def __init__(self, partition: Partition):
+        self.names: list[str] = list(dict.fromkeys(partition.values()))
+        codes = {name: code for code, name in enumerate(self.names)}
+        self.codes: dict[str, int] = {
+            individual: codes[subset]
+            for individual, subset in partition.items()
+        }
+
+    def __len__(self):
+        return len(self.names)
+
+    def code(self, individual: str) -> int:
+        return self.codes.get(individual, -1)
+
+    def name(self, code: int) -> str | None:
+        if code < 0:
+            return None
+        return self.names[code]
+
+
+class SubsetStatistics:
+    """
+    Streaming distance statistics between pairs of subsets for a single
+    metric, in the order the pairs were first encountered, as in taxi2.
+    Memory is proportional to the number of subset pairs encountered.
+    Quartiles and standard deviation are only available given an accuracy.
+    """
+
+    def __init__(self, metric: DistanceMetric, labels: GroupLabels, accuracy: float | None = None):
+        self.metric = metric
+        self.labels = labels
+        self.accuracy = accuracy
+        self.cells: dict[tuple[int, int], DistanceAccumulator] = dict()
+
+    def add(self, code_x: int, code_y: int, value: float | None):
+        key = (code_x, code_y)
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = DistanceAccumulator(self.accuracy)
+            self.cells[key] = cell
+        cell.add(value)
+
+    def merge(self, other: SubsetStatistics):
+        for key, cell in other.cells.items():
+            if key not in self.cells:
+                self.cells[key] = DistanceAccumulator(self.accuracy)
+            self.cells[key].merge(cell)
+
+    def __iter__(self) -> Iterator[DistanceStatistics]:
+        for (code_x, code_y), cell in self.cells.items():
+            idx, idy = self.labels.name(code_x), self.labels.name(code_y)
+            moments = cell.moments
+            if not moments.n:
+                yield DistanceStatistics(self.metric, idx, idy, None, None, None, 0)
+                continue
+            yield DistanceStatistics(
+                self.metric, idx, idy, moments.min, moments.max, moments.mean, moments.n)
+
+    def spread(self) -> Iterator[SpreadStatistics]:
+        if self.accuracy is None:
+            raise ValueError('Spread statistics require an accuracy')
+        for (code_x, code_y), cell in self.cells.items():
+            sketch = cell.sketch
+            yield SpreadStatistics(
+                self.metric,
+                self.labels.name(code_x),
+                self.labels.name(code_y),
+                cell.moments.stdev,
+                sketch.quantile(0.25),
+                sketch.quantile(0.50),
+                sketch.quantile(0.75),
+                cell.moments.n,
+            )
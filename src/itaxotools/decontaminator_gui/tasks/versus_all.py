@@ -18,18 +18,31 @@
 
 from __future__ import annotations
 
+import shutil
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, NamedTuple, Tuple
 
 from itaxotools.common.utility import AttrDict
 
-from ..types import ComparisonMode, ColumnFilter, AlignmentMode, DistanceMetric, FileFormat
+from ..performance import append_report, save_report
+from ..progress import phase, plan
+from ..types import ComparisonMode, ColumnFilter, AlignmentMode, DistanceMetric, FileFormat, PairPolicy, PairCompression
 
 
 @dataclass
 class VersusAllResults:
-    pass
+    output_directory: Path
+    seconds_taken: float
+    bytes_written: int = 0
+    seconds_writing: float = 0.0
+
+    @property
+    def throughput(self) -> float | None:
+        """Output tables written per second, in bytes"""
+        if not self.seconds_writing:
+            return None
+        return self.bytes_written / self.seconds_writing
 
 
 def progress_handler(caption, index, total):
@@ -44,7 +57,7 @@ def progress_handler(caption, index, total):
 def initialize():
     import itaxotools
     itaxotools.progress_handler('Initializing...')
-    from itaxotools.taxi2.tasks.versus_all import VersusAll  # noqa
+    from .backend import VersusAll  # noqa
 
 
 def get_file_info(path: Path):
@@ -86,7 +99,6 @@ def get_file_info(path: Path):
 
 def sequences_from_model(input: SequenceModel2):
     from itaxotools.taxi2.sequences import Sequences, SequenceHandler
-    from ..model import SequenceModel2
 
     if input.type == FileFormat.Tabfile:
         return Sequences.fromPath(
@@ -107,7 +119,6 @@ def sequences_from_model(input: SequenceModel2):
 
 def partition_from_model(input: PartitionModel):
     from itaxotools.taxi2.partitions import Partition, PartitionHandler
-    from ..model import PartitionModel
 
     if input.type == FileFormat.Tabfile:
         filter = {
@@ -141,19 +152,180 @@ def partition_from_model(input: PartitionModel):
     raise Exception(f'Cannot create partition from input: {input}')
 
 
-def versus_all(
+class PartitionSource(NamedTuple):
+    """Identifies the raw subset column of a file, before any filtering"""
+    type: FileFormat
+    path: Path
+    individual_column: int = None
+    subset_column: int = None
+    spartition: str = None
+
+    @classmethod
+    def from_model(cls, input: PartitionModel):
+        if input.type == FileFormat.Tabfile:
+            return cls(input.type, input.path, input.individual_column, input.subset_column)
+        elif input.type == FileFormat.Fasta:
+            return cls(input.type, input.path)
+        elif input.type == FileFormat.Spart:
+            return cls(input.type, input.path, spartition=input.spartition)
+        raise Exception(f'Cannot create partition from input: {input}')
+
+
+def _read_tabfile_together(input: SequenceModel2, sources: list[PartitionSource]):
+    from itaxotools.taxi2.encoding import sanitize
+    from itaxotools.taxi2.handlers import FileHandler
+    from itaxotools.taxi2.partitions import Partition
+    from itaxotools.taxi2.sequences import Sequence
+
+    sequences = []
+    partitions = {source: Partition() for source in sources}
+    with FileHandler.Tabular.Tabfile(
+        input.path,
+        has_headers=True,
+        columns=(input.index_column, input.sequence_column),
+        get_all_columns=True,
+    ) as rows:
+        headers = [sanitize(header) for header in rows.headers[2:]]
+        order = rows.column_order
+        positions = {
+            source: (order.index(source.individual_column), order.index(source.subset_column))
+            for source in sources
+        }
+        for row in rows:
+            extras = {k: v for (k, v) in zip(headers, row[2:])}
+            sequences.append(Sequence(row[0], row[1], extras))
+            for source, (individual, subset) in positions.items():
+                partitions[source][row[individual]] = row[subset]
+    return sequences, partitions
+
+
+def _read_fasta_together(input: SequenceModel2, sources: list[PartitionSource], separator='|'):
+    from Bio.SeqIO.FastaIO import SimpleFastaParser
+    from itaxotools.taxi2.partitions import Partition
+    from itaxotools.taxi2.sequences import Sequence
+
+    sequences = []
+    partition = Partition()
+    with open(input.path, 'r') as handle:
+        for title, sequence in SimpleFastaParser(handle):
+            try:
+                id, organism = title.split(separator, 1)
+            except ValueError:
+                id = title
+                organism = None
+            else:
+                partition[id] = organism
+            sequences.append(Sequence(id, sequence, extras={'organism': organism}))
+    return sequences, {source: partition for source in sources}
+
+
+def _read_partitions_together(sources: list[PartitionSource]):
+    from itaxotools.spart_parser import Spart
+    from itaxotools.taxi2.handlers import FileHandler
+    from itaxotools.taxi2.partitions import Partition, PartitionHandler
 
-    work_dir: Path,
+    first = sources[0]
+    partitions = {source: Partition() for source in sources}
+
+    if first.type == FileFormat.Tabfile:
+        with FileHandler.Tabular.Tabfile(first.path, has_headers=True) as rows:
+            for row in rows:
+                for source in sources:
+                    partitions[source][row[source.individual_column]] = row[source.subset_column]
+    elif first.type == FileFormat.Fasta:
+        partition = Partition.fromPath(first.path, PartitionHandler.Fasta)
+        partitions = {source: partition for source in sources}
+    elif first.type == FileFormat.Spart:
+        spart = Spart.fromPath(first.path)
+        for source in sources:
+            spartition = source.spartition or spart.getSpartitions()[0]
+            for subset in spart.getSpartitionSubsets(spartition):
+                for individual in spart.getSubsetIndividuals(spartition, subset):
+                    partitions[source][individual] = subset
+    return partitions
+
+
+def _filter_partition(partition: Partition, input: PartitionModel) -> Partition:
+    from itaxotools.taxi2.partitions import Classification, Partition, PartitionHandler
+
+    if input.type == FileFormat.Spart:
+        return partition
+    filter = {
+        ColumnFilter.All: None,
+        ColumnFilter.First: PartitionHandler.subset_first_word,
+    }[input.subset_filter]
+    if filter is None:
+        return partition
+    filtered = Partition()
+    for individual, subset in partition.items():
+        classification = filter(Classification(individual, subset))
+        if classification is not None:
+            filtered[classification.individual] = classification.subset
+    return filtered
+
+
+def inputs_from_models(
+    input_sequences: SequenceModel2,
+    *input_partitions: PartitionModel | None,
+) -> tuple[Sequences, ...]:
+    """
+    Load the sequences and all partitions, parsing each file only once.
+    Partitions from the same column (e.g. species and genera) are read once
+    and then filtered in memory.
+    """
+    from itertools import groupby
+    from itaxotools.taxi2.sequences import Sequences
+
+    sources = [
+        PartitionSource.from_model(input)
+        for input in input_partitions if input is not None]
+    sources = list(dict.fromkeys(sources))
+
+    def shares_file(source: PartitionSource):
+        return source.type == input_sequences.type and source.path == input_sequences.path
+
+    shared = [source for source in sources if shares_file(source)]
+    if input_sequences.type == FileFormat.Tabfile:
+        sequences, partitions = _read_tabfile_together(input_sequences, shared)
+    elif input_sequences.type == FileFormat.Fasta:
+        sequences, partitions = _read_fasta_together(input_sequences, shared)
+    else:
+        raise Exception(f'Cannot create sequences from input: {input_sequences}')
+
+    others = sorted(
+        (source for source in sources if not shares_file(source)),
+        key=lambda source: (source.type.value, str(source.path)))
+    for _, group in groupby(others, lambda source: (source.type, source.path)):
+        partitions.update(_read_partitions_together(list(group)))
+
+    return (
+        Sequences(sequences),
+        *(
+            _filter_partition(partitions[PartitionSource.from_model(input)], input)
+            if input is not None else None
+            for input in input_partitions
+        )
+    )
 
-    perform_species: bool,
-    perform_genera: bool,
 
-    input_sequences: AttrDict,
-    input_species: AttrDict,
-    input_genera: AttrDict,
+def render_plots(work_dir: Path, plot_formats: list[str]) -> Path:
+    from .histograms import render_histograms
+
+    with phase('Rendering plots'):
+        render_histograms(work_dir / 'plots', plot_formats, progress=progress_handler)
+    append_report(work_dir)
+    return work_dir
+
+
+def configure(
+    task: VersusAll,
 
     alignment_mode: AlignmentMode,
     alignment_write_pairs: bool,
+    alignment_pairs_policy: PairPolicy,
+    alignment_pairs_cutoff: float,
+    alignment_pairs_top_k: int,
+    alignment_pairs_compression: PairCompression,
     alignment_pairwise_scores: dict,
 
     distance_metrics: list[DistanceMetric],
@@ -170,30 +342,25 @@ def versus_all(
 
     plot_histograms: bool,
     plot_binwidth: float,
+    plot_formats: list[str],
 
-    **kwargs
+    statistics_spread: bool = False,
+    alignment_pairs_metric: DistanceMetric | None = None,
 
-) -> tuple[Path, float]:
+    **kwargs
+):
+    """Set the parameters of the backend task, shared by whole runs and their blocks"""
 
-    from itaxotools.taxi2.tasks.versus_all import VersusAll
     from itaxotools.taxi2.distances import DistanceMetric as BackendDistanceMetric
-    from itaxotools.taxi2.sequences import Sequences, SequenceHandler
-    from itaxotools.taxi2.partitions import Partition, PartitionHandler
     from itaxotools.taxi2.align import Scores
 
-    task = VersusAll()
-    task.work_dir = work_dir
-    task.progress_handler = progress_handler
-
-    task.input.sequences = sequences_from_model(input_sequences)
-    if perform_species:
-        task.input.species = partition_from_model(input_species)
-    if perform_genera:
-        task.input.genera = partition_from_model(input_genera)
-
     task.params.pairs.align = bool(alignment_mode == AlignmentMode.PairwiseAlignment)
     task.params.pairs.scores = Scores(**alignment_pairwise_scores)
     task.params.pairs.write = alignment_write_pairs
+    task.params.pairs.policy = alignment_pairs_policy
+    task.params.pairs.cutoff = alignment_pairs_cutoff
+    task.params.pairs.top_k = alignment_pairs_top_k
+    task.params.pairs.compression = alignment_pairs_compression
 
     metrics_filter = {
         AlignmentMode.NoAlignment: [
@@ -215,7 +382,7 @@ def versus_all(
             DistanceMetric.BBC,
         ],
     }[alignment_mode]
-    distance_metrics = (metric for metric in distance_metrics if metric in metrics_filter)
+    distance_metrics = [metric for metric in distance_metrics if metric in metrics_filter]
 
     metrics_tr = {
         DistanceMetric.Uncorrected: (BackendDistanceMetric.Uncorrected, []),
@@ -230,6 +397,13 @@ def versus_all(
         for metric in distance_metrics
     ]
     task.params.distances.metrics = metrics
+
+    # Cutoffs and rankings of the pairs only make sense for a single metric
+    if alignment_write_pairs and alignment_pairs_policy != PairPolicy.All:
+        selection_metric = alignment_pairs_metric or distance_metrics[0]
+        if selection_metric not in distance_metrics:
+            raise ValueError(f'Pairs are selected by {selection_metric.label}, which is not calculated')
+        task.params.pairs.metric = metrics[distance_metrics.index(selection_metric)]
     task.params.distances.write_linear = distance_linear
     task.params.distances.write_matricial = distance_matricial
 
@@ -241,11 +415,152 @@ def versus_all(
     task.params.stats.all = statistics_all
     task.params.stats.species = statistics_species
     task.params.stats.genera = statistics_genus
+    task.params.stats.spread = statistics_spread
 
     task.params.plot.histograms = plot_histograms
     task.params.plot.binwidth = plot_binwidth
-    task.params.plot.formats = ['pdf', 'svg', 'png']
+    task.params.plot.formats = plot_formats
+
+
+def versus_all(
+
+    work_dir: Path,
+    output_directory: Path | None,
+
+    perform_species: bool,
+    perform_genera: bool,
 
-    results = task.start()
+    input_sequences: AttrDict,
+    input_species: AttrDict,
+    input_genera: AttrDict,
+
+    checkpoint_key: str | None = None,
+
+    **kwargs
+
+) -> tuple[Path, float]:
+
+    from .backend import VersusAll
+    from ..checkpoint import Checkpoint
+
+    task = VersusAll()
+    task.work_dir = work_dir
+    task.progress_handler = progress_handler
+    if checkpoint_key is not None:
+        task.checkpoint = Checkpoint.open(work_dir, checkpoint_key)
+
+    plan('Loading input', 'Calculating distances', 'Publishing results' if output_directory else None)
+    with phase('Loading input'):
+        sequences, species, genera = inputs_from_models(
+            input_sequences,
+            input_species if perform_species else None,
+            input_genera if perform_genera else None,
+        )
+    task.input.sequences = sequences
+    task.input.species = species
+    task.input.genera = genera
+
+    configure(task, **kwargs)
+
+    with phase('Calculating distances'):
+        results = task.start()
+
+    if output_directory is not None:
+        from ..transfer import publish
+        with phase('Publishing results'):
+            published = publish(work_dir, output_directory)
+        results = results._replace(output_directory=published.destination)
 
-    return results
+    save_report(results.output_directory)
+
+    return VersusAllResults(
+        output_directory = results.output_directory,
+        seconds_taken = results.seconds_taken,
+        bytes_written = sum(stats.bytes_written for stats in task.write_stats),
+        seconds_writing = sum(stats.seconds_writing for stats in task.write_stats),
+    )
+
+
+def plan_blocks(work_dir: Path, checkpoint_key: str, input_sequences: AttrDict, count: int) -> list[tuple[int, int]]:
+    """
+    Divide the rows not yet committed to the checkpoint into about the
+    given count of blocks, to be calculated by `calculate_block()`.
+    Returns the range of rows of each block.
+    """
+    from ..checkpoint import BLOCKS_DIRECTORY, Checkpoint
+
+    checkpoint = Checkpoint.open(work_dir, checkpoint_key)
+    checkpoint.save()
+    shutil.rmtree(checkpoint.directory / BLOCKS_DIRECTORY, ignore_errors=True)
+    sequences, = inputs_from_models(input_sequences)
+    total = sum(1 for _ in sequences)
+    first = checkpoint.total('rows')
+    size = max(1, -(-(total - first) // count))
+    return [(start, min(start + size, total)) for start in range(first, total, size)]
+
+
+def calculate_block(output_directory: Path, start: int, stop: int, input_sequences: AttrDict, **kwargs) -> dict[str, int]:
+    """Calculate the distances of the given rows into the directory, see `Checkpointing.calculate_rows`"""
+    from .backend import VersusAll
+
+    task = VersusAll()
+    task.work_dir = output_directory
+    configure(task, **kwargs)
+    task.generate_paths()
+    task.check_metrics()
+    task.input.sequences, = inputs_from_models(input_sequences)
+    return task.calculate_rows(start, stop, output_directory)
+
+
+def commit_blocks(
+    work_dir: Path,
+    checkpoint_key: str,
+    directories: list[Path],
+    alignment_write_pairs: bool,
+    alignment_pairs_compression: PairCompression,
+):
+    """Commit blocks calculated by `calculate_block()` to the checkpoint, in the given order"""
+    from .backend import VersusAll
+    from ..checkpoint import Checkpoint
+
+    task = VersusAll()
+    task.params.pairs.write = alignment_write_pairs
+    task.params.pairs.compression = alignment_pairs_compression
+    task.checkpoint = Checkpoint.open(work_dir, checkpoint_key)
+    for directory in directories:
+        task.commit_block(directory)
+
+
+def versus_all_distributed(work_dir: Path, output_directory: Path | None, endpoints: str, blocks_per_endpoint: int = 8, **kwargs):
+    """
+    Same as `versus_all`, except that blocks of rows are first calculated
+    on the given endpoints, see `distributed.parse_endpoints`. Blocks are
+    committed to the checkpoint in order, then replayed into all results.
+    Rows committed by an interrupted run in the same directory are kept.
+    Only called by batch jobs, since local endpoints cannot be started
+    from the daemonic processes of GUI workers.
+    """
+    from ..checkpoint import block_directory, parameter_hash
+    from ..distributed import BlockScheduler, parse_endpoints
+    from ..limits import WorkerLimits
+
+    key = parameter_hash('versus_all', dict(work_dir=work_dir, output_directory=output_directory, **kwargs))
+    executors = parse_endpoints(endpoints)
+    blocks = plan_blocks(work_dir, key, kwargs['input_sequences'], len(executors) * blocks_per_endpoint)
+
+    def commit(directories: list[Path]):
+        commit_blocks(work_dir, key, directories, kwargs['alignment_write_pairs'], kwargs['alignment_pairs_compression'])
+
+    def progress(rows: int, total: int):
+        progress_handler(f'Calculating blocks on {len(executors)} endpoints', rows, total)
+
+    scheduler = BlockScheduler(executors, 'Versus All', WorkerLimits.from_environment())
+    try:
+        scheduler.run(
+            calculate_block, blocks,
+            lambda start, attempt: block_directory(work_dir, start, attempt),
+            commit, progress, **kwargs)
+    finally:
+        scheduler.close()
+
+    return versus_all(work_dir, output_directory, checkpoint_key=key, **kwargs)
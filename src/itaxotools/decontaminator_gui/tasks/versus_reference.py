@@ -24,7 +24,9 @@ from typing import Dict, Tuple
 
 from itaxotools.common.utility import AttrDict
 
-from ..types import ComparisonMode, ColumnFilter, AlignmentMode, DistanceMetric, FileFormat
+from ..performance import save_report
+from ..progress import phase, plan
+from ..types import ComparisonMode, ColumnFilter, AlignmentMode, DistanceMetric, FileFormat, PairPolicy, PairCompression
 
 
 @dataclass
@@ -44,7 +46,7 @@ def progress_handler(caption, index, total):
 def initialize():
     import itaxotools
     itaxotools.progress_handler('Initializing...')
-    from itaxotools.taxi2.tasks.versus_reference import VersusReference  # noqa
+    from .backend import VersusReference  # noqa
 
 
 def get_file_info(path: Path):
@@ -78,7 +80,6 @@ def get_file_info(path: Path):
 
 def sequences_from_model(input: SequenceModel2):
     from itaxotools.taxi2.sequences import Sequences, SequenceHandler
-    from ..model import SequenceModel2
 
     if input.type == FileFormat.Tabfile:
         return Sequences.fromPath(
@@ -99,12 +100,17 @@ def sequences_from_model(input: SequenceModel2):
 def versus_reference(
 
     work_dir: Path,
+    output_directory: Path | None,
 
     input_data: AttrDict,
     input_reference: AttrDict,
 
     alignment_mode: AlignmentMode,
     alignment_write_pairs: bool,
+    alignment_pairs_policy: PairPolicy,
+    alignment_pairs_cutoff: float,
+    alignment_pairs_top_k: int,
+    alignment_pairs_compression: PairCompression,
     alignment_pairwise_scores: dict,
 
     distance_metrics: list[DistanceMetric],
@@ -119,7 +125,7 @@ def versus_reference(
 
 ) -> tuple[Path, float]:
 
-    from itaxotools.taxi2.tasks.versus_reference import VersusReference
+    from .backend import VersusReference
     from itaxotools.taxi2.distances import DistanceMetric as BackendDistanceMetric
     from itaxotools.taxi2.sequences import Sequences, SequenceHandler
     from itaxotools.taxi2.align import Scores
@@ -134,6 +140,10 @@ def versus_reference(
     task.params.pairs.align = bool(alignment_mode == AlignmentMode.PairwiseAlignment)
     task.params.pairs.scores = Scores(**alignment_pairwise_scores)
     task.params.pairs.write = alignment_write_pairs
+    task.params.pairs.policy = alignment_pairs_policy
+    task.params.pairs.cutoff = alignment_pairs_cutoff
+    task.params.pairs.top_k = alignment_pairs_top_k
+    task.params.pairs.compression = alignment_pairs_compression
 
     metrics_filter = {
         AlignmentMode.NoAlignment: [
@@ -180,6 +190,16 @@ def versus_reference(
     task.params.format.missing = distance_missing
     task.params.format.percentage_multiply = distance_percentile
 
-    results = task.start()
+    plan('Comparing against reference', 'Publishing results' if output_directory else None)
+    with phase('Comparing against reference'):
+        results = task.start()
+
+    if output_directory is not None:
+        from ..transfer import publish
+        with phase('Publishing results'):
+            published = publish(work_dir, output_directory)
+        results = results._replace(output_directory=published.destination)
+
+    save_report(results.output_directory)
 
     return results
@@ -19,17 +19,33 @@
 from PySide6 import QtCore
 
 from collections import deque
-from contextlib import contextmanager
-from typing import Callable
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, NamedTuple
+import itertools
 import multiprocessing as mp
+import threading
+import tempfile
+import traceback
 import sys
 import io
 
 from itaxotools.common.utility import override
 
-from .io import StreamGroup, PipeWrite
+from .channel import Channel, Kind, SendFileError
+from .io import StreamGroup
+from .logwriter import LogWriter
+from .tracing import TRACE_SUFFIX, Tracer, close_open, export, now
+from .transfer import TransferCancelled, TransferResult, transfer_tree
 from .threading_loop import (
-    Command, InitDone, ReportProgress, ReportDone, ReportFail, ReportExit, ReportStop, ReportQuit, loop)
+    Command, LocalExecutor, ReportProgress, ReportDone, ReportFail, ReportExit, ReportStop)
+
+
+class Pending(NamedTuple):
+    command: Command
+    log: ExitStack
+    waiting: dict
 
 
 class Worker(QtCore.QThread):
@@ -39,23 +55,43 @@ class Worker(QtCore.QThread):
     error = QtCore.Signal(ReportExit)
     stop = QtCore.Signal(ReportStop)
     progress = QtCore.Signal(ReportProgress)
+    progressPending = QtCore.Signal()
 
-    def __init__(self, name='Worker', eager=True, log_path=None):
-        """Immediately starts thread execution"""
+    def __init__(self, name='Worker', eager=True, log_path=None, concurrency=4, progress_interval=33, limits=None, executor=None):
+        """
+        Immediately starts thread execution. See `WorkerLimits` for limits of
+        the process, and `LocalExecutor` for where it runs.
+        """
         super().__init__()
         self.name = name
         self.eager = eager
         self.log_path = log_path
+        self.concurrency = concurrency
+        self.limits = limits
+        self.executor = executor or LocalExecutor()
+        self.start_error = None
 
-        self.queue = mp.Queue()
-        self.pipe_out = None
-        self.commands = None
-        self.results = None
-        self.reports = None
+        self.queue = deque()
+        self.wakeup, self.waker = mp.Pipe(duplex=False)
+        self.requests = itertools.count(1)
+        self.pending: dict[int, Pending] = dict()
+        self.channel = None
         self.process = None
+        self.connected = False
         self.resetting = False
         self.quitting = False
 
+        self.pending_progress: dict[Any, ReportProgress] = dict()
+        self.progress_lock = threading.Lock()
+        self.progress_timer = QtCore.QTimer(self)
+        self.progress_timer.setSingleShot(True)
+        self.progress_timer.setInterval(progress_interval)
+        self.progress_timer.timeout.connect(self.deliver_progress)
+        self.progressPending.connect(self.schedule_progress)
+
+        self.tracer = Tracer('GUI')
+
+        self.logs = LogWriter(f'{name} log writer')
         self.streamOut = StreamGroup(sys.stdout)
         self.streamErr = StreamGroup(sys.stderr)
 
@@ -70,92 +106,183 @@ class Worker(QtCore.QThread):
         Internal. This is executed on the new thread after start() is called.
         Once a child process is ready, enter an event loop.
         """
+        self.tracer.name_thread(f'{self.name} thread')
         with self.open_log('all.log'):
             if self.eager:
                 self.process_start()
-            while not self.quitting:
-                task = self.queue.get()
-                if task is None:
-                    break
-                if self.process is None:
-                    self.process_start()
-                with self.open_log(f'{str(task.id)}.log'):
-                    self.commands.send(task)
-                    report = self.loop(task)
-                    self.handle_report(report)
-
-    def loop(self, task: Command):
+            self.loop()
+        for request in list(self.pending):
+            self.pending.pop(request).log.close()
+
+    def loop(self):
         """
-        Internal. Thread event loop that handles events
-        for the currently running process.
+        Internal. Thread event loop that sends queued commands and handles
+        messages from the running process. Results may arrive in any order,
+        so they are routed back to their command by request number.
         """
-        sentinel = self.process.sentinel
-        waitList = {
-            sentinel: None,
-            self.results: None,
-            self.reports: self.progress.emit,
-            self.pipe_out: self.handle_output,
-        }
-        report = None
-        while not report:
-            readyList = mp.connection.wait(waitList.keys())
-            if sentinel in readyList:
-                waitList.pop(sentinel, None)
-                waitList.pop(self.results, None)
-                report = self.handle_exit(task, waitList)
-            elif self.results in readyList:
+        while True:
+            waitList = [self.wakeup]
+            if self.process is not None:
+                waitList.append(self.process.sentinel)
+                if self.connected and self.channel.connection is not self.process.sentinel:
+                    waitList.append(self.channel.connection)
+            readyList = mp.connection.wait(waitList)
+            if self.wakeup in readyList:
+                self.wakeup.recv_bytes()
+                if not self.send_commands():
+                    return
+            if self.process is None:
+                continue
+            if self.connected and self.channel.connection in readyList:
                 try:
-                    report = self.results.recv()
-                except EOFError:
-                    waitList.pop(self.results, None)
-                else:
-                    waitList.pop(sentinel, None)
-                    waitList.pop(self.results, None)
-                    self.consume_connections(waitList)
-            else:
-                self.handle_connections(waitList, readyList)
-        return report
+                    self.handle_messages(self.channel.receive())
+                except (EOFError, OSError):
+                    self.connected = False
+            elif self.process.sentinel in readyList:
+                self.handle_exit()
+
+    def send_commands(self) -> bool:
+        """Internal. Send all queued commands, returns False when quitting"""
+        while self.queue:
+            task = self.queue.popleft()
+            if task is None or self.quitting:
+                return False
+            request = next(self.requests)
+            task = task._replace(request=request)
+            if task.queued is not None:
+                self.tracer.complete('Queued', task.queued, now(), 'worker', id=task.id)
+            if self.process is None:
+                with self.tracer.span('Start process', 'worker'):
+                    started = self.process_start()
+                if not started:
+                    self.handle_report(ReportFail(task.id, self.start_error, ''))
+                    continue
+            try:
+                task = self.executor.prepare(task)
+            except Exception as exception:
+                self.handle_report(ReportFail(task.id, exception, traceback.format_exc()))
+                continue
+            log = ExitStack()
+            log.enter_context(self.open_log(f'{str(task.id)}.log'))
+            with self.tracer.span('Send command', 'ipc', id=task.id):
+                try:
+                    self.executor.send(self.channel, task)
+                except SendFileError as exception:
+                    log.close()
+                    self.handle_report(ReportFail(task.id, exception, traceback.format_exc()))
+                    continue
+                except OSError:
+                    pass  # the process is gone, its exit reports the command
+            waiting = self.tracer.begin('Wait for result', 'worker', id=task.id)
+            self.pending[request] = Pending(task, log, waiting)
+        return True
 
-    def handle_output(self, out: PipeWrite):
-        if out.tag == 1:
-            self.streamOut.write(out.text)
-        elif out.tag == 2:
-            self.streamErr.write(out.text)
+    def enqueue(self, task):
+        """Internal. Thread safe, wakes up the event loop"""
+        self.queue.append(task)
+        self.waker.send_bytes(b'')
+
+    def attach_trace(self, report):
+        """Internal. Merge the trace of the child with that of this thread"""
+        if not hasattr(report, 'trace'):
+            return report
+        trace = report.trace or []
+        close_open(trace)
+        self.tracer.begin('Deliver report', 'gui', id=report.id)
+        trace.extend(self.tracer.take())
+        return report._replace(trace=trace)
+
+    def save_trace(self, id, events: list[dict]):
+        """Export a Chrome trace of a command next to its log, see `tracing.export`"""
+        if not self.log_path or not events:
+            return
+        export(self.log_path / f'{str(id)}{TRACE_SUFFIX}', events)
 
-    def handle_exit(self, task, waitList):
+    def handle_messages(self, messages):
+        """Internal. Dispatch a batch of messages, delivering any results"""
+        for kind, message in messages:
+            if kind == Kind.Progress:
+                self.post_progress(message)
+            elif kind == Kind.Stdout:
+                self.streamOut.write(message)
+            elif kind == Kind.Stderr:
+                self.streamErr.write(message)
+            elif kind == Kind.Result:
+                request, report = message
+                self.deliver(request, report)
 
-        self.consume_connections(waitList)
+    def deliver(self, request: int, report):
+        """Internal. Handle the report of a command once it is done"""
+        pending = self.pending.pop(request, None)
+        if pending is None:
+            return
+        with self.progress_lock:
+            self.pending_progress.pop(pending.command.id, None)
+        self.tracer.end(pending.waiting)
+        try:
+            try:
+                report = self.executor.finish(pending.command, report)
+            except Exception as exception:
+                report = ReportFail(report.id, exception, traceback.format_exc(), report.trace)
+            self.handle_report(self.attach_trace(report))
+        finally:
+            pending.log.close()
+
+    def post_progress(self, report: ReportProgress):
+        """
+        Internal. Only the latest progress of each command is kept, and
+        delivered on the GUI thread by a timer, so that commands reporting
+        in tight loops cannot flood its event queue with signals.
+        """
+        with self.progress_lock:
+            idle = not self.pending_progress
+            self.pending_progress[report.id] = report
+        if idle:
+            self.progressPending.emit()
+
+    def schedule_progress(self):
+        """Internal. Runs on the GUI thread"""
+        if not self.progress_timer.isActive():
+            self.progress_timer.start()
+
+    def deliver_progress(self):
+        """Internal. Runs on the GUI thread"""
+        with self.progress_lock:
+            reports = list(self.pending_progress.values())
+            self.pending_progress.clear()
+        for report in reports:
+            self.progress.emit(report)
+
+    def handle_exit(self):
+        """Internal. Every command still running is reported as stopped or failed"""
+
+        self.consume_messages()
+        self.process.join(1)
         exitcode = self.process.exitcode
         resetting = self.resetting
 
-        self.pipe_out.close()
-        self.commands.close()
-        self.results.close()
-        self.reports.close()
+        self.channel.close()
+        self.channel = None
         self.process = None
 
         if self.quitting:
-            return ReportQuit()
+            return
         elif self.eager:
             self.process_start()
 
-        if resetting:
-            return ReportStop(task.id)
-
-        return ReportExit(task.id, exitcode)
-
-    def handle_connections(self, waitList, readyList):
-        for connection in readyList:
-            try:
-                data = connection.recv()
-            except EOFError:
-                waitList.pop(connection)
+        for request, pending in list(self.pending.items()):
+            if resetting:
+                self.deliver(request, ReportStop(pending.command.id))
             else:
-                waitList[connection](data)
+                self.deliver(request, ReportExit(pending.command.id, exitcode))
 
-    def consume_connections(self, waitList):
-        while readyList := mp.connection.wait(waitList.keys(), 0):
-            self.handle_connections(waitList, readyList)
+    def consume_messages(self):
+        """Internal. Handle output left by a process that exited"""
+        try:
+            while self.channel.poll():
+                self.handle_messages(self.channel.receive())
+        except (EOFError, OSError):
+            pass
 
     def handle_report(self, report):
         self.streamOut.flush()
@@ -178,35 +305,54 @@ class Worker(QtCore.QThread):
 
     @contextmanager
     def open_log(self, filename):
+        """Internal. Written by the log writer thread, see `LogWriter`"""
         path = self.log_path
         if not path:
             yield
             return
-        with open(path / filename, 'a') as file:
-            self.streamOut.add(file)
-            self.streamErr.add(file)
+        file = self.logs.open(path / filename)
+        self.streamOut.add(file)
+        self.streamErr.add(file)
+        try:
             yield
+        finally:
             self.streamOut.remove(file)
             self.streamErr.remove(file)
+            file.close()
 
-    def process_start(self):
-        """Internal. Initialize process and pipes"""
+    def process_start(self) -> bool:
+        """Internal. Initialize process and channel, returns False if the executor failed"""
         self.resetting = False
-        self.pipe_out, pipe_out = mp.Pipe(duplex=False)
-        commands, self.commands = mp.Pipe(duplex=False)
-        self.results, results = mp.Pipe(duplex=False)
-        self.reports, reports = mp.Pipe(duplex=False)
-        self.process = mp.Process(
-            target=loop, daemon=True, name=self.name,
-            args=(commands, results, reports, pipe_out))
-        self.process.start()
+        try:
+            connection, self.process = self.executor.start(self.name, self.concurrency, self.limits)
+        except OSError as exception:
+            self.start_error = exception
+            self.streamErr.write(f'Could not start {self.name} process: {exception}\n')
+            self.streamErr.flush()
+            return False
+        self.channel = Channel(connection, threshold=self.executor.threshold, sink=self.executor.sink())
+        self.connected = True
+        return True
 
     def exec(self, id, function, *args, **kwargs):
-        """Execute given function on a child process"""
-        self.queue.put(Command(id, function, args, kwargs))
+        """Execute given function on a child process, after previous commands are done"""
+        self.enqueue(Command(id, function, args, kwargs, queued=now()))
+
+    def exec_concurrent(self, id, function, *args, **kwargs):
+        """
+        Same as exec, but run alongside any other commands, for short
+        independent queries that should not wait for a long computation.
+        The function must be safe to call from a thread of the process.
+        """
+        self.enqueue(Command(id, function, args, kwargs, queued=now(), concurrent=True))
+
+    def exec_profiled(self, id, function, *args, **kwargs):
+        """Same as exec, but also save a profile of the call beside the logs"""
+        path = self.log_path or Path(tempfile.gettempdir())
+        self.enqueue(Command(id, function, args, kwargs, str(path / f'{str(id)}'), queued=now()))
 
     def reset(self):
-        """Interrupt the current task"""
+        """Interrupt all running commands"""
         if self.process is not None and self.process.is_alive():
             self.resetting = True
             self.streamOut.flush()
@@ -218,9 +364,89 @@ class Worker(QtCore.QThread):
         """Also kills the child process"""
         self.reset()
         self.quitting = True
-        self.queue.put(None)
+        self.enqueue(None)
 
         super().quit()
         self.wait()
         self.streamOut.close()
         self.streamErr.close()
+        self.logs.close()
+
+
+class SharedWorker(QtCore.QObject):
+    """
+    A worker with its own process, shared by all tasks for short commands
+    such as inspecting files, so that these are never held back by long
+    computations on the workers of tasks. Commands run concurrently, and
+    reports are delivered to the handlers given with each command, under
+    the id given by the caller.
+    """
+
+    def __init__(self, name='Shared', log_path=None, limits=None):
+        super().__init__()
+        self.worker = Worker(name=name, eager=True, log_path=log_path, limits=limits)
+        self.worker.done.connect(self.dispatch)
+        self.worker.fail.connect(self.dispatch)
+        self.worker.error.connect(self.dispatch)
+        self.worker.stop.connect(self.dispatch)
+        self.tickets = itertools.count(1)
+        self.pending: dict[int, tuple[Any, Callable, Callable]] = dict()
+
+    def exec(self, id, done: Callable, fail: Callable, function, *args, **kwargs):
+        """Execute given function on the shared process, then call done or fail with the report"""
+        ticket = next(self.tickets)
+        self.pending[ticket] = (id, done, fail)
+        self.worker.exec_concurrent(ticket, function, *args, **kwargs)
+
+    def dispatch(self, report):
+        """Internal. Forward the report of a command to its handlers"""
+        if report.id not in self.pending:
+            return
+        id, done, fail = self.pending.pop(report.id)
+        report = report._replace(id=id)
+        if isinstance(report, ReportDone):
+            done(report)
+        else:
+            fail(report)
+
+
+class TransferWorker(QtCore.QThread):
+    """Transfer a directory tree on a separate thread, see `transfer_tree`"""
+    done = QtCore.Signal(TransferResult)
+    fail = QtCore.Signal(ReportFail)
+    stop = QtCore.Signal(ReportStop)
+    progress = QtCore.Signal(ReportProgress)
+
+    def __init__(self, id, source: Path, destination: Path, move=False, interval=0.1):
+        super().__init__()
+        self.id = id
+        self.source = source
+        self.destination = destination
+        self.move = move
+        self.interval = interval
+        self.last_report = 0.0
+
+    @override
+    def run(self):
+        try:
+            result = transfer_tree(
+                self.source, self.destination, self.move,
+                progress=self.report, cancelled=self.isInterruptionRequested)
+        except TransferCancelled:
+            self.stop.emit(ReportStop(self.id))
+        except Exception as exception:
+            self.fail.emit(ReportFail(self.id, exception, traceback.format_exc()))
+        else:
+            self.done.emit(result)
+
+    def report(self, done: int, total: int):
+        now = perf_counter()
+        if done < total and now - self.last_report < self.interval:
+            return
+        self.last_report = now
+        # Progress bars hold 32-bit integers, so report in permille
+        value = 1000 * done // total if total else 1000
+        self.progress.emit(ReportProgress('Saving results...', value, 0, 1000))
+
+    def cancel(self):
+        self.requestInterruption()
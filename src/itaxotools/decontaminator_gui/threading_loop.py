@@ -16,12 +16,18 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # -----------------------------------------------------------------------------
 
+import multiprocessing as mp
+import os
 import sys
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, NamedTuple, Callable, List, Dict
+from functools import partial
+from multiprocessing.connection import Connection
+from typing import Any, NamedTuple, Callable, List, Dict, Optional
 
-from .io import PipeWriterIO
+from .channel import SHARED_THRESHOLD, Channel, ChannelWriterIO, FileSink, Kind
 
 import itaxotools
 
@@ -35,26 +41,34 @@ class Command(NamedTuple):
     function: Callable
     args: List[Any]
     kwargs: Dict[str, Any]
+    profile: Optional[str] = None
+    queued: Optional[int] = None
+    request: int = 0
+    concurrent: bool = False
 
 
 class ReportDone(NamedTuple):
     id: Any
     result: Any
+    trace: Optional[list] = None
 
 
 class ReportFail(NamedTuple):
     id: Any
     exception: Exception
     traceback: str
+    trace: Optional[list] = None
 
 
 class ReportExit(NamedTuple):
     id: Any
     exit_code: int
+    trace: Optional[list] = None
 
 
 class ReportStop(NamedTuple):
     id: Any
+    trace: Optional[list] = None
 
 
 class ReportQuit:
@@ -66,29 +80,135 @@ class ReportProgress(NamedTuple):
     value: int = 0
     minimum: int = 0
     maximum: int = 0
+    phase: str = ''
+    step: int = 0
+    steps: int = 0
+    rate: Optional[float] = None
+    eta: Optional[float] = None
+    id: Any = None
 
 
-def loop(commands, results, progress, pipe_out):
-    """Wait for commands, send back results"""
+_channel: Optional[Channel] = None
 
-    out = PipeWriterIO(pipe_out, 1)
-    err = PipeWriterIO(pipe_out, 2)
 
-    sys.stdout = out
-    sys.stderr = err
+def current_channel() -> Optional[Channel]:
+    """The channel of this worker process, for commands that stream files back"""
+    return _channel
 
-    def progress_handler(*args, **kwargs):
-        report = ReportProgress(*args, **kwargs)
-        progress.send(report)
 
-    itaxotools.progress_handler = progress_handler
+def loop(connection, concurrency: int = 4, limits=None, threshold: float = SHARED_THRESHOLD, sink: Optional[FileSink] = None):
+    """
+    Wait for commands, send back results, all through a single channel.
+    Commands run one at a time in the order they were received, except for
+    concurrent commands, which run on a pool of threads alongside them.
+    Results are tagged with the request number of their command. Files
+    streamed to the worker are written by the sink, see `Channel.send_file`.
+    """
+    global _channel
 
-    while True:
-        id, function, args, kwargs = commands.recv()
+    channel = Channel(connection, threshold=threshold, sink=sink)
+    channel.start()
+    _channel = channel
+
+    sys.stdout = ChannelWriterIO(channel, Kind.Stdout)
+    sys.stderr = ChannelWriterIO(channel, Kind.Stderr)
+
+    from .limits import MemoryLimitError
+
+    if limits is not None:
+        limits.apply()
+    memory = limits.memory if limits is not None else None
+
+    from .progress import ProgressRouter, ProgressTracker
+    from .tracing import Tracer, install
+
+    progress_router = ProgressRouter()
+    itaxotools.progress_handler = progress_router
+
+    tracer = Tracer(f'{mp.current_process().name} process')
+    tracer.name_thread('Worker loop')
+    install(tracer)
+
+    def post_progress(id, report: ReportProgress):
+        channel.post(Kind.Progress, report._replace(id=id))
+
+    def execute(command: Command):
+        tracer.instant('Command started', 'ipc', id=command.id)
+        progress_router.install(ProgressTracker(partial(post_progress, command.id)))
         try:
-            result = function(*args, **kwargs)
-            report = ReportDone(id, result)
+            with tracer.span(getattr(command.function, '__name__', 'Command'), 'task', id=command.id):
+                if command.profile:
+                    from .profiling import run_profiled
+                    result = run_profiled(command.profile, command.function, *command.args, **command.kwargs)
+                else:
+                    result = command.function(*command.args, **command.kwargs)
+            report = ReportDone(command.id, result)
+        except MemoryError:
+            trace = traceback.format_exc()
+            report = ReportFail(command.id, MemoryLimitError.within(memory), trace)
         except Exception as exception:
             trace = traceback.format_exc()
-            report = ReportFail(id, exception, trace)
-        results.send(report)
+            report = ReportFail(command.id, exception, trace)
+        finally:
+            progress_router.install(None)
+        tracer.begin('Send result', 'ipc', id=command.id)
+        trace = tracer.take(threading.get_native_id())
+        try:
+            channel.send(Kind.Result, (command.request, report._replace(trace=trace)))
+        except Exception as exception:
+            # Nobody else would tell the parent, which waits for this request
+            report = ReportFail(command.id, exception, traceback.format_exc())
+            channel.send(Kind.Result, (command.request, report))
+
+    def name_thread():
+        tracer.name_thread(threading.current_thread().name)
+
+    serial = ThreadPoolExecutor(1, 'Command', initializer=name_thread)
+    pool = ThreadPoolExecutor(concurrency, 'Concurrent command', initializer=name_thread)
+
+    while True:
+        try:
+            messages = channel.receive()
+        except (EOFError, OSError):
+            # Nobody is left to receive results, so stop running commands at once
+            os._exit(0)
+        for _, command in messages:
+            executor = pool if command.concurrent else serial
+            executor.submit(execute, command)
+
+
+class LocalExecutor:
+    """
+    Runs the worker loop on a child process of this machine. Executors
+    start the process and may rewrite commands before they are sent,
+    send them along with anything they need, and rewrite their reports
+    once received, see `remote.RemoteExecutor`.
+    """
+
+    threshold = SHARED_THRESHOLD
+
+    def start(self, name: str, concurrency: int, limits) -> tuple[Connection, mp.Process]:
+        if os.name == 'posix':
+            # Shared memory blocks change hands, so all processes must register them with the same tracker
+            from multiprocessing import resource_tracker
+            resource_tracker.ensure_running()
+        connection, child = mp.Pipe(duplex=True)
+        process = mp.Process(
+            target=loop, daemon=True, name=name,
+            args=(child, concurrency, limits))
+        process.start()
+        child.close()
+        return connection, process
+
+    def sink(self) -> Optional[FileSink]:
+        """For files streamed back by the worker, one per channel"""
+        return None
+
+    def prepare(self, command: Command) -> Command:
+        return command
+
+    def send(self, channel: Channel, command: Command):
+        channel.send(Kind.Command, command)
+
+    def finish(self, command: Command, report):
+        return report
@@ -0,0 +1,142 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Spans of task execution across processes, exported in the Chrome trace format"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from time import monotonic_ns
+
+TRACE_SUFFIX = '.trace.json'
+
+
+def now() -> int:
+    """Microseconds on a clock shared by all processes of this machine"""
+    return monotonic_ns() // 1000
+
+
+class Tracer:
+    """
+    Collects trace events of the calling process. Events are plain dicts,
+    so they can be sent to another process and merged with its own events
+    into a single timeline, viewable in chrome://tracing or Perfetto.
+    """
+
+    def __init__(self, process: str = ''):
+        self.pid = os.getpid()
+        self.events: list[dict] = []
+        self.lock = threading.Lock()
+        if process:
+            self.name_process(process)
+
+    def _event(self, phase: str, name: str, category: str, timestamp: int, args: dict) -> dict:
+        event = dict(ph=phase, name=name, cat=category, ts=timestamp, pid=self.pid, tid=threading.get_native_id())
+        if args:
+            event['args'] = {key: str(value) for key, value in args.items()}
+        with self.lock:
+            self.events.append(event)
+        return event
+
+    def name_process(self, name: str):
+        self.events.append(dict(ph='M', name='process_name', pid=self.pid, args=dict(name=name)))
+
+    def name_thread(self, name: str):
+        self.events.append(dict(ph='M', name='thread_name', pid=self.pid, tid=threading.get_native_id(), args=dict(name=name)))
+
+    def begin(self, name: str, category: str = 'task', **args) -> dict:
+        """Open a complete event, to be closed by end(), possibly from another process"""
+        return self._event('X', name, category, now(), args)
+
+    @staticmethod
+    def end(event: dict, timestamp: int | None = None):
+        event['dur'] = max(0, (timestamp or now()) - event['ts'])
+
+    def complete(self, name: str, start: int, stop: int, category: str = 'task', **args):
+        self.end(self._event('X', name, category, start, args), stop)
+
+    def instant(self, name: str, category: str = 'task', **args):
+        event = self._event('i', name, category, now(), args)
+        event['s'] = 't'
+
+    @contextmanager
+    def span(self, name: str, category: str = 'task', **args):
+        event = self.begin(name, category, **args)
+        try:
+            yield event
+        finally:
+            self.end(event)
+
+    def take(self, thread: int | None = None) -> list[dict]:
+        """Return collected events, or only those of a thread, keeping process metadata"""
+        with self.lock:
+            events = self.events
+            if thread is None:
+                self.events = [event for event in events if event['ph'] == 'M']
+                return events
+            self.events = [event for event in events if event['ph'] == 'M' or event.get('tid') != thread]
+            return [event for event in events if event['ph'] == 'M' or event.get('tid') == thread]
+
+
+def close_open(events: list[dict], timestamp: int | None = None):
+    """End spans left open by the sender of events, once they are received"""
+    timestamp = timestamp or now()
+    for event in events:
+        if event['ph'] == 'X' and 'dur' not in event:
+            Tracer.end(event, timestamp)
+
+
+def export(path: Path, events: list[dict]):
+    """Write events as a Chrome trace, with unfinished spans closed at the last timestamp"""
+    last = max((event.get('ts', 0) + event.get('dur', 0) for event in events), default=0)
+    for event in events:
+        if event['ph'] == 'X' and 'dur' not in event:
+            Tracer.end(event, last)
+            event.setdefault('args', {})['unfinished'] = 'True'
+    path = Path(path)
+    partial = path.with_name(f'.{path.name}.partial')
+    with open(partial, 'w', encoding='utf-8') as file:
+        json.dump(dict(traceEvents=events, displayTimeUnit='ms'), file, ensure_ascii=False)
+    os.replace(partial, path)
+
+
+_tracer: Tracer | None = None
+
+
+def install(tracer: Tracer | None):
+    """Called by worker processes, so that tasks can record spans"""
+    global _tracer
+    _tracer = tracer
+
+
+def tracer() -> Tracer | None:
+    return _tracer
+
+
+@contextmanager
+def span(name: str, category: str = 'task', **args):
+    """Record the duration of this block, a no-op outside workers"""
+    if _tracer is None:
+        yield
+        return
+    with _tracer.span(name, category, **args):
+        yield
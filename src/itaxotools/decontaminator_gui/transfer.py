@@ -0,0 +1,300 @@
+# -----------------------------------------------------------------------------
+# DecontaminatorGui - GUI for Decontaminator
+# Copyright (C) 2023  Patmanidis Stefanos
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""Transfer result directories with the cheapest method the filesystems allow"""
+
+from __future__ import annotations
+
+import errno
+import os
+import shutil
+import socket
+from collections import Counter
+from enum import Enum
+from pathlib import Path
+from time import perf_counter, time
+from typing import Callable, NamedTuple
+
+# Linux ioctl for cloning a whole file on copy-on-write filesystems
+FICLONE = 0x40049409
+
+# Errors meaning that a method is not supported for the given pair of files
+UNSUPPORTED = {
+    errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK, errno.EINVAL,
+    errno.ENOSYS, errno.ENOTSUP, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF,
+}
+
+CHUNK_SIZE = 1 << 24
+
+STAGING_PREFIX = '.partial_'
+STAGING_OWNER = '.owner'
+
+# Leftovers of owners that cannot be probed are swept once this old, in seconds
+STAGING_EXPIRY = 7 * 24 * 3600
+
+
+class TransferMethod(Enum):
+    Rename = 'rename'
+    Hardlink = 'hardlink'
+    Reflink = 'reflink'
+    CopyRange = 'copy_file_range'
+    Copy = 'copy'
+
+
+class TransferResult(NamedTuple):
+    destination: Path
+    files: int
+    bytes: int
+    seconds: float
+    methods: Counter[TransferMethod]
+
+    def summary(self) -> str:
+        return ', '.join(
+            f'{count} by {method.value}'
+            for method, count in self.methods.most_common())
+
+
+class TransferCancelled(Exception):
+    pass
+
+
+class _Progress:
+    def __init__(self, total: int, callback: Callable[[int, int], None] | None, cancelled: Callable[[], bool] | None):
+        self.total = total
+        self.done = 0
+        self.callback = callback
+        self.cancelled = cancelled
+
+    def advance(self, size: int):
+        self.done += size
+        if self.cancelled and self.cancelled():
+            raise TransferCancelled()
+        if self.callback:
+            self.callback(self.done, self.total)
+
+
+def _unsupported(e: OSError) -> bool:
+    return e.errno in UNSUPPORTED
+
+
+def _try_rename(source: Path, destination: Path) -> bool:
+    try:
+        os.replace(source, destination)
+    except OSError as e:
+        if _unsupported(e):
+            return False
+        raise
+    return True
+
+
+def _try_hardlink(source: Path, destination: Path) -> bool:
+    try:
+        os.link(source, destination)
+    except OSError as e:
+        if _unsupported(e):
+            return False
+        raise
+    return True
+
+
+def _try_reflink(source: Path, destination: Path) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError as e:
+            if _unsupported(e):
+                return False
+            raise
+    return True
+
+
+def _try_copy_range(source: Path, destination: Path, progress: _Progress) -> bool:
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        copied = 0
+        while True:
+            try:
+                count = os.copy_file_range(src.fileno(), dst.fileno(), CHUNK_SIZE)
+            except OSError as e:
+                if copied == 0 and _unsupported(e):
+                    return False
+                raise
+            if not count:
+                break
+            copied += count
+            progress.advance(count)
+    return True
+
+
+def _copy_chunked(source: Path, destination: Path, progress: _Progress):
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            dst.write(chunk)
+            progress.advance(len(chunk))
+
+
+def _transfer_file(source: Path, destination: Path, progress: _Progress, move: bool) -> TransferMethod:
+    size = source.stat().st_size
+    if move and _try_rename(source, destination):
+        progress.advance(size)
+        return TransferMethod.Rename
+
+    if not move:
+        if destination.exists() or destination.is_symlink():
+            destination.unlink()
+        if _try_hardlink(source, destination):
+            progress.advance(size)
+            return TransferMethod.Hardlink
+
+    # Copies are written next to the target and renamed over it when complete
+    partial = destination.with_name(f'{STAGING_PREFIX}{destination.name}')
+    try:
+        if _try_reflink(source, partial):
+            method = TransferMethod.Reflink
+            progress.advance(size)
+        else:
+            done = progress.done
+            if _try_copy_range(source, partial, progress):
+                method = TransferMethod.CopyRange
+            else:
+                progress.done = done
+                _copy_chunked(source, partial, progress)
+                method = TransferMethod.Copy
+        shutil.copystat(source, partial)
+        os.replace(partial, destination)
+    finally:
+        if partial.exists():
+            partial.unlink()
+
+    if move:
+        source.unlink()
+    return method
+
+
+def transfer_tree(
+    source: Path,
+    destination: Path,
+    move: bool = False,
+    progress: Callable[[int, int], None] | None = None,
+    cancelled: Callable[[], bool] | None = None,
+) -> TransferResult:
+    """
+    Copy or move a directory tree, merging into destination if it exists.
+    Files are hardlinked (or renamed when moving) if both sides share a
+    filesystem, otherwise they are cloned or copied in kernel space where
+    supported, falling back to a chunked copy that reports progress.
+    """
+    ts = perf_counter()
+    source = Path(source)
+    destination = Path(destination)
+    if destination.exists() and destination.samefile(source):
+        return TransferResult(destination, 0, 0, perf_counter() - ts, Counter())
+
+    files = [path for path in sorted(source.rglob('*')) if path.is_file()]
+    total = sum(path.stat().st_size for path in files)
+    tracker = _Progress(total, progress, cancelled)
+    methods = Counter()
+
+    destination.mkdir(parents=True, exist_ok=True)
+    for directory in (path for path in source.rglob('*') if path.is_dir()):
+        (destination / directory.relative_to(source)).mkdir(parents=True, exist_ok=True)
+
+    for path in files:
+        target = destination / path.relative_to(source)
+        methods[_transfer_file(path, target, tracker, move)] += 1
+
+    if move:
+        shutil.rmtree(source, ignore_errors=True)
+
+    return TransferResult(destination, len(files), total, perf_counter() - ts, methods)
+
+
+def _is_stale(path: Path) -> bool:
+    try:
+        age = time() - path.stat().st_mtime
+        host, pid = (path / STAGING_OWNER).read_text(encoding='utf-8').split()
+        pid = int(pid)
+    except FileNotFoundError:
+        # Either just created or left without an owner
+        return path.exists() and age >= 60
+    except (OSError, ValueError):
+        return False
+    if host != socket.gethostname() or os.name != 'posix':
+        return age >= STAGING_EXPIRY
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def sweep_staging(destination: Path):
+    """Remove staging directories left behind by processes that are gone"""
+    for path in Path(destination).glob(f'{STAGING_PREFIX}*'):
+        if path.is_dir() and _is_stale(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def staging_directory(destination: Path, name: str) -> Path:
+    """
+    Create a hidden directory inside destination, so that publishing is a
+    rename, after sweeping stale ones. It is marked as owned by this process
+    and named so that it does not clash with runs already published.
+    """
+    destination = Path(destination)
+    destination.mkdir(parents=True, exist_ok=True)
+    sweep_staging(destination)
+    index = 1
+    unique = name
+    while True:
+        path = destination / f'{STAGING_PREFIX}{unique}'
+        if not (destination / unique).exists():
+            try:
+                path.mkdir()
+                break
+            except FileExistsError:
+                pass
+        index += 1
+        unique = f'{name}_{index}'
+    (path / STAGING_OWNER).write_text(f'{socket.gethostname()} {os.getpid()}\n', encoding='utf-8')
+    return path
+
+
+def published_directory(staging: Path) -> Path:
+    """Where the run staged in the given directory is published"""
+    return staging.with_name(staging.name.removeprefix(STAGING_PREFIX))
+
+
+def publish(staging: Path, destination: Path) -> TransferResult:
+    """
+    Move finished files from staging into a new directory for the run inside
+    destination, refusing to overwrite an earlier run. Each file is moved
+    with a single rename, so readers never see partial tables.
+    """
+    target = Path(destination) / published_directory(Path(staging)).name
+    if target.exists():
+        raise FileExistsError(errno.EEXIST, 'Results already exist', str(target))
+    (Path(staging) / STAGING_OWNER).unlink(missing_ok=True)
+    return transfer_tree(staging, target, move=True)
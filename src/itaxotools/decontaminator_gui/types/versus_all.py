@@ -30,6 +30,7 @@ class VersusAllSubtask(Enum):
     AddSequenceFile = auto()
     AddSpeciesFile = auto()
     AddGeneraFile = auto()
+    RenderPlots = auto()
 
 
 @dataclass
@@ -113,6 +114,13 @@ class StatisticsGroup(PropertyEnum):
     Genus = Entry('Per genus', 'per_genus', True)
 
 
+class PlotFormat(PropertyEnum):
+    property_type = lambda: bool
+    Pdf = Entry('PDF', 'pdf', True)
+    Svg = Entry('SVG', 'svg', True)
+    Png = Entry('PNG', 'png', True)
+
+
 class AlignmentMode(Enum):
     NoAlignment = ('Already aligned', 'the sequences will be compared without further alignment')
     PairwiseAlignment = ('Pairwise alignment', 'align each pair of sequences just before calculating distances')
@@ -131,3 +139,23 @@ class ColumnFilter(Enum):
         self.abr = abr
         self.text = text
         self.label = f'{text} ({abr})'
+
+
+class PairPolicy(Enum):
+    All = ('All pairs', 'write every aligned pair')
+    Cutoff = ('Distance cutoff', 'write pairs with a distance up to the cutoff')
+    TopK = ('Closest pairs', 'write the closest pairs for each query sequence')
+
+    def __init__(self, label, description):
+        self.label = label
+        self.description = description
+
+
+class PairCompression(Enum):
+    Uncompressed = ('Uncompressed', '')
+    Gzip = ('gzip', '.gz')
+    Zstd = ('zstd', '.zst')
+
+    def __init__(self, label, suffix):
+        self.label = label
+        self.suffix = suffix
@@ -344,6 +344,15 @@ def type_convert(value, type, default):
         return default
 
 
+def parse_values(text: str, type=float) -> list | None:
+    """Parse a list of values separated by commas or spaces, None if empty or invalid"""
+    try:
+        values = [type(item) for item in text.replace(',', ' ').split()]
+    except ValueError:
+        return None
+    return values or None
+
+
 def human_readable_size(size):
     for unit in ['B', 'KB', 'MB', 'GB']:
         if size < 1000.0 or unit == 'GB':
@@ -18,14 +18,18 @@
 
 from PySide6 import QtCore, QtGui, QtWidgets
 
+from importlib.util import find_spec
 from pathlib import Path
 
 from itaxotools.common.utility import AttrDict, override
 
 from .. import app
 from ..model.common import Item, ItemModel, Object
-from ..types import ComparisonMode, Notification, PairwiseComparisonConfig
-from ..utility import Guard, Binder
+from ..types import ComparisonMode, DistanceMetric, Notification, PairwiseComparisonConfig, PairPolicy, PairCompression
+from ..utility import Guard, Binder, human_readable_seconds, human_readable_size, parse_values
+
+PROGRESS_LIMIT = (1 << 31) - 1
+PROGRESS_SCALE = 1_000_000
 
 
 class VerticalRollAnimation(QtCore.QPropertyAnimation):
@@ -136,6 +140,10 @@ class TaskView(ObjectView):
         self.container.ensureVisible(0, 0)
         self.object.start()
 
+    def resume(self):
+        self.container.ensureVisible(0, 0)
+        self.object.resume()
+
     def stop(self):
         if self.getConfirmation(
             'Stop diagnosis',
@@ -438,6 +446,23 @@ class NoWheelComboBox(QtWidgets.QComboBox):
         event.ignore()
 
 
+class EnumComboBox(NoWheelComboBox):
+    valueChanged = QtCore.Signal(object)
+
+    def __init__(self, members, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for member in members:
+            self.addItem(member.label, member)
+        self.currentIndexChanged.connect(self.handleIndexChanged)
+
+    def handleIndexChanged(self, index):
+        self.valueChanged.emit(self.itemData(index))
+
+    def setValue(self, value):
+        index = self.findData(value)
+        self.setCurrentIndex(index)
+
+
 class GLineEdit(QtWidgets.QLineEdit):
     textEditedSafe = QtCore.Signal(str)
 
@@ -481,6 +506,321 @@ class GSpinBox(QtWidgets.QSpinBox):
         event.ignore()
 
 
+class PairWritingConfig(QtWidgets.QWidget):
+    """
+    Choose which aligned pairs are written and how they are compressed.
+    Tasks that calculate several metrics also choose which one selects pairs.
+    """
+
+    def __init__(self, metrics: list[DistanceMetric] | None = None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.controls = AttrDict()
+
+        compressions = [PairCompression.Uncompressed, PairCompression.Gzip]
+        if find_spec('zstandard') is not None:
+            compressions.append(PairCompression.Zstd)
+
+        policy = EnumComboBox(PairPolicy)
+        cutoff = GLineEdit()
+        cutoff.setValidator(QtGui.QDoubleValidator(0.0, 1.0, 4))
+        cutoff.setFixedWidth(80)
+        top_k = GSpinBox()
+        top_k.setMinimum(1)
+        top_k.setMaximum(9999)
+        top_k.setFixedWidth(80)
+        compression = EnumComboBox(compressions)
+        metric = EnumComboBox(metrics) if metrics else None
+
+        cutoff_label = QtWidgets.QLabel('Cutoff:')
+        top_k_label = QtWidgets.QLabel('Per sequence:')
+        metric_label = QtWidgets.QLabel('By:') if metrics else None
+
+        layout = QtWidgets.QHBoxLayout()
+        layout.addWidget(QtWidgets.QLabel('Pairs:'))
+        layout.addWidget(policy)
+        layout.addSpacing(16)
+        layout.addWidget(cutoff_label)
+        layout.addWidget(cutoff)
+        layout.addWidget(top_k_label)
+        layout.addWidget(top_k)
+        if metric is not None:
+            layout.addWidget(metric_label)
+            layout.addWidget(metric)
+        layout.addSpacing(16)
+        layout.addWidget(QtWidgets.QLabel('Compression:'))
+        layout.addWidget(compression)
+        layout.addStretch(1)
+        layout.setSpacing(8)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+
+        self.controls.policy = policy
+        self.controls.cutoff = cutoff
+        self.controls.cutoff_label = cutoff_label
+        self.controls.top_k = top_k
+        self.controls.top_k_label = top_k_label
+        self.controls.compression = compression
+        self.controls.metric = metric
+        self.controls.metric_label = metric_label
+
+    def showPolicy(self, policy: PairPolicy):
+        self.controls.cutoff.setVisible(policy == PairPolicy.Cutoff)
+        self.controls.cutoff_label.setVisible(policy == PairPolicy.Cutoff)
+        self.controls.top_k.setVisible(policy == PairPolicy.TopK)
+        self.controls.top_k_label.setVisible(policy == PairPolicy.TopK)
+        if self.controls.metric is not None:
+            self.controls.metric.setVisible(policy != PairPolicy.All)
+            self.controls.metric_label.setVisible(policy != PairPolicy.All)
+
+
+class OutputDirectorySelector(Card):
+    """Optionally choose where results are written before running"""
+    directoryChanged = QtCore.Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        title = QtWidgets.QCheckBox('Write results directly to a directory')
+        title.setStyleSheet("""font-size: 16px;""")
+        title.toggled.connect(self.handleToggled)
+
+        description = QtWidgets.QLabel(
+            'Skip the temporary directory and write results to their final location. '
+            'Files appear there only once complete, replacing any previous results with the same name.'
+        )
+        description.setWordWrap(True)
+
+        path = QtWidgets.QLineEdit()
+        path.setReadOnly(True)
+        path.setPlaceholderText('Choose a directory...')
+
+        browse = QtWidgets.QPushButton('Browse')
+        browse.clicked.connect(self.handleBrowse)
+
+        contents = QtWidgets.QHBoxLayout()
+        contents.addWidget(path, 1)
+        contents.addWidget(browse)
+        contents.setSpacing(8)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addWidget(title)
+        layout.addWidget(description)
+        layout.addLayout(contents)
+        layout.setSpacing(8)
+        self.addLayout(layout)
+
+        self.controls.title = title
+        self.controls.path = path
+        self.controls.browse = browse
+
+    def handleToggled(self, checked: bool):
+        self.controls.path.setEnabled(checked)
+        self.controls.browse.setEnabled(checked)
+        if not checked:
+            self.directoryChanged.emit(None)
+        elif self.controls.path.text():
+            self.directoryChanged.emit(Path(self.controls.path.text()))
+        else:
+            self.handleBrowse()
+
+    def handleBrowse(self):
+        filename = QtWidgets.QFileDialog.getExistingDirectory(
+            self.window(), f'{app.title} - Output directory', self.controls.path.text())
+        if filename:
+            self.directoryChanged.emit(Path(filename))
+        elif not self.controls.path.text():
+            self.controls.title.setChecked(False)
+
+    def setPath(self, path: Path | None):
+        with QtCore.QSignalBlocker(self.controls.title):
+            self.controls.title.setChecked(path is not None)
+        if path is not None:
+            self.controls.path.setText(str(path))
+        self.controls.path.setEnabled(path is not None)
+        self.controls.browse.setEnabled(path is not None)
+
+
+class ProfilerSelector(Card):
+    """Toggle profiling of the next run"""
+    toggled = QtCore.Signal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        title = QtWidgets.QCheckBox('Profile this run')
+        title.setStyleSheet("""font-size: 16px;""")
+        title.toggled.connect(self.toggled)
+
+        description = QtWidgets.QLabel(
+            'Save a profile of each step and a text summary of where time was spent, '
+            'next to the task logs. This slows down execution.'
+        )
+        description.setWordWrap(True)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addWidget(title)
+        layout.addWidget(description)
+        layout.setSpacing(8)
+        self.addLayout(layout)
+
+        self.controls.title = title
+
+    def setChecked(self, checked: bool):
+        self.controls.title.setChecked(checked)
+
+
+class SweepCard(Card):
+    """Optional list of values to run a parameter sweep over"""
+    valuesChanged = QtCore.Signal(object)
+
+    def __init__(self, title: str, description: str, placeholder: str = '', parent=None):
+        super().__init__(parent)
+
+        label = QtWidgets.QLabel(title)
+        label.setStyleSheet("""font-size: 16px;""")
+
+        values = GLineEdit()
+        values.setPlaceholderText(placeholder)
+        values.textEditedSafe.connect(self.handleEdit)
+
+        description = QtWidgets.QLabel(description)
+        description.setWordWrap(True)
+
+        layout = QtWidgets.QGridLayout()
+        layout.addWidget(label, 0, 0)
+        layout.addWidget(values, 0, 1)
+        layout.addWidget(description, 1, 0, 1, 2)
+        layout.setColumnStretch(1, 1)
+        layout.setHorizontalSpacing(20)
+        layout.setSpacing(8)
+        self.addLayout(layout)
+
+        self.controls.values = values
+
+    def handleEdit(self, text: str):
+        self.valuesChanged.emit(parse_values(text))
+
+    def setValues(self, values: list[float] | None):
+        self.controls.values.setText(', '.join(f'{value:g}' for value in values or []))
+
+
+def _clock(seconds: float) -> str:
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    return f'{h}:{m:02}:{s:02}' if h else f'{m}:{s:02}'
+
+
+def progress_text(report) -> str:
+    """Phase, step, percentage, rate and ETA of a progress report"""
+    segments = []
+    if report.steps:
+        segments.append(f'[{report.step}/{report.steps}]')
+    segments.append(report.phase or report.text)
+    if report.maximum > report.minimum:
+        segments.append('%p%')
+    if report.rate:
+        segments.append(f'{report.rate:,.0f}/s')
+    if report.eta is not None:
+        segments.append(f'ETA {_clock(report.eta)}')
+    return '  '.join(segment for segment in segments if segment)
+
+
+def show_progress(bar: QtWidgets.QProgressBar, report):
+    """Progress bars hold 32-bit integers, so large ranges are scaled down"""
+    minimum, value, maximum = report.minimum, report.value, report.maximum
+    if maximum - minimum > PROGRESS_LIMIT:
+        value = int(PROGRESS_SCALE * (value - minimum) / (maximum - minimum))
+        minimum, maximum = 0, PROGRESS_SCALE
+    bar.setMaximum(maximum)
+    bar.setMinimum(minimum)
+    bar.setValue(value)
+    bar.setFormat(progress_text(report))
+
+
+class PerformanceCard(Card):
+    """Collapsible table of the performance report of the last run"""
+
+    columns = ['Phase', 'Wall', 'CPU', 'Read', 'Written', 'Items/s']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setVisible(False)
+
+        toggle = QtWidgets.QToolButton()
+        toggle.setText('Performance')
+        toggle.setStyleSheet("""font-size: 16px; border: none;""")
+        toggle.setToolButtonStyle(QtCore.Qt.ToolButtonTextBesideIcon)
+        toggle.setArrowType(QtCore.Qt.RightArrow)
+        toggle.setCheckable(True)
+        toggle.toggled.connect(self.handleToggled)
+
+        summary = QtWidgets.QLabel()
+
+        table = QtWidgets.QTableWidget(0, len(self.columns))
+        table.setHorizontalHeaderLabels(self.columns)
+        for column in (2, 3, 4):
+            table.horizontalHeaderItem(column).setToolTip(
+                'Counted for the whole worker process, including any commands running concurrently')
+        table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        table.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        table.setVisible(False)
+
+        header = QtWidgets.QHBoxLayout()
+        header.addWidget(toggle)
+        header.addWidget(summary, 1)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(header)
+        layout.addWidget(table)
+        layout.setSpacing(8)
+        self.addLayout(layout)
+
+        self.controls.toggle = toggle
+        self.controls.summary = summary
+        self.controls.table = table
+
+    def handleToggled(self, checked: bool):
+        self.controls.toggle.setArrowType(QtCore.Qt.DownArrow if checked else QtCore.Qt.RightArrow)
+        self.controls.table.setVisible(checked)
+
+    def setReport(self, report: dict | None):
+        self.controls.table.setRowCount(0)
+        if not report:
+            self.controls.summary.setText('')
+            return
+
+        total = report['total']
+        scope = 'process ' if report.get('process_wide') else ''
+        summary = f'{human_readable_seconds(total["wall"])} wall, {human_readable_seconds(total["cpu"])} {scope}CPU'
+        if report.get('peak_rss'):
+            summary += f', {scope}peak memory {human_readable_size(report["peak_rss"])}'
+        self.controls.summary.setText(summary)
+
+        table = self.controls.table
+        for row, phase in enumerate(report['phases']):
+            rate = phase['items_per_second']
+            cells = [
+                phase['phase'],
+                f'{phase["wall"]:.2f} s',
+                f'{phase["cpu"]:.2f} s',
+                human_readable_size(phase['bytes_read']),
+                human_readable_size(phase['bytes_written']),
+                f'{rate:,.0f}' if rate else '',
+            ]
+            table.insertRow(row)
+            for column, text in enumerate(cells):
+                item = QtWidgets.QTableWidgetItem(text)
+                if column:
+                    item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                table.setItem(row, column, item)
+        table.resizeColumnsToContents()
+        table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        height = table.horizontalHeader().height() + sum(table.rowHeight(row) for row in range(table.rowCount()))
+        table.setFixedHeight(height + 2 * table.frameWidth())
+
+
 class LongLabel(QtWidgets.QLabel):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -26,7 +26,7 @@ from .. import app
 from ..utility import Guard, Binder, type_convert, human_readable_size
 from ..model import Item, ItemModel, Object, SequenceModel, SequenceModel2, PartitionModel
 from ..types import ColumnFilter, Notification, AlignmentMode, PairwiseComparisonConfig, StatisticsGroup, AlignmentMode, PairwiseScore, DistanceMetric
-from .common import Item, Card, CardCustom, NoWheelRadioButton, NoWheelComboBox, GLineEdit, ObjectView, TaskView, RadioButtonGroup, RichRadioButton, MinimumStackedWidget, VerticalRollAnimation
+from .common import Item, Card, CardCustom, NoWheelRadioButton, NoWheelComboBox, GLineEdit, ObjectView, TaskView, RadioButtonGroup, RichRadioButton, MinimumStackedWidget, VerticalRollAnimation, PairWritingConfig, OutputDirectorySelector, ProfilerSelector, PerformanceCard, show_progress
 
 from ..types import ComparisonMode, DecontaminateMode, Notification, DecontaminateMode
 from .common import (
@@ -402,9 +402,7 @@ class ProgressCard(QtWidgets.QProgressBar):
         self.setVisible(False)
 
     def showProgress(self, report):
-        self.setMaximum(report.maximum)
-        self.setMinimum(report.minimum)
-        self.setValue(report.value)
+        show_progress(self, report)
 
 
 class InputSelector(Card):
@@ -685,9 +683,12 @@ class AlignmentModeSelector(CardCustom):
         self.addLayout(layout)
 
     def draw_pairwise_config(self):
-        write_pairs = QtWidgets.QCheckBox('Write file with all aligned sequence pairs')
+        write_pairs = QtWidgets.QCheckBox('Write file with aligned sequence pairs')
         self.controls.write_pairs = write_pairs
 
+        pairs_config = PairWritingConfig()
+        self.controls.pairs_config = pairs_config
+
         self.controls.score_fields = dict()
         scores = QtWidgets.QGridLayout()
         validator = QtGui.QIntValidator()
@@ -714,6 +715,7 @@ class AlignmentModeSelector(CardCustom):
         reset = QtWidgets.QPushButton('Reset to default scores')
         reset.clicked.connect(self.resetScores)
         layout.addWidget(write_pairs)
+        layout.addWidget(pairs_config)
         layout.addWidget(label)
         layout.addLayout(scores)
         layout.addWidget(reset)
@@ -978,6 +980,7 @@ class DecontaminateView(TaskView):
         self.cards = AttrDict()
         self.cards.title = TitleCard(self)
         self.cards.dummy_results = DummyResultsCard(self)
+        self.cards.performance = PerformanceCard(self)
         self.cards.progress = ProgressCard(self)
         self.cards.input_sequences = SequenceSelector('Input sequence', self)
         self.cards.mode_selector = DecontaminateModeSelector(self)
@@ -988,6 +991,8 @@ class DecontaminateView(TaskView):
         self.cards.distance_metrics = DistanceMetricSelector(self)
         self.cards.similarity = SimilarityThresholdCard(self)
         self.cards.identity = IdentityThresholdCard(self)
+        self.cards.output_directory = OutputDirectorySelector(self)
+        self.cards.profiler = ProfilerSelector(self)
 
         layout = QtWidgets.QVBoxLayout()
         for card in self.cards:
@@ -1032,6 +1037,16 @@ class DecontaminateView(TaskView):
         self.binder.bind(object.properties.alignment_mode, self.cards.alignment_mode.controls.mode.setValue)
         self.binder.bind(self.cards.alignment_mode.controls.write_pairs.toggled, object.properties.alignment_write_pairs)
         self.binder.bind(object.properties.alignment_write_pairs, self.cards.alignment_mode.controls.write_pairs.setChecked)
+        self.binder.bind(object.properties.alignment_write_pairs, self.cards.alignment_mode.controls.pairs_config.setEnabled)
+        self.binder.bind(self.cards.alignment_mode.controls.pairs_config.controls.policy.valueChanged, object.properties.alignment_pairs_policy)
+        self.binder.bind(object.properties.alignment_pairs_policy, self.cards.alignment_mode.controls.pairs_config.controls.policy.setValue)
+        self.binder.bind(object.properties.alignment_pairs_policy, self.cards.alignment_mode.controls.pairs_config.showPolicy)
+        self.binder.bind(self.cards.alignment_mode.controls.pairs_config.controls.cutoff.textEditedSafe, object.properties.alignment_pairs_cutoff, lambda x: type_convert(x, float, None))
+        self.binder.bind(object.properties.alignment_pairs_cutoff, self.cards.alignment_mode.controls.pairs_config.controls.cutoff.setText, lambda x: f'{x:.4f}' if x is not None else '')
+        self.binder.bind(self.cards.alignment_mode.controls.pairs_config.controls.top_k.valueChangedSafe, object.properties.alignment_pairs_top_k)
+        self.binder.bind(object.properties.alignment_pairs_top_k, self.cards.alignment_mode.controls.pairs_config.controls.top_k.setValue)
+        self.binder.bind(self.cards.alignment_mode.controls.pairs_config.controls.compression.valueChanged, object.properties.alignment_pairs_compression)
+        self.binder.bind(object.properties.alignment_pairs_compression, self.cards.alignment_mode.controls.pairs_config.controls.compression.setValue)
         self.binder.bind(self.cards.alignment_mode.resetScores, object.pairwise_scores.reset)
         for score in PairwiseScore:
             self.binder.bind(
@@ -1077,7 +1092,14 @@ class DecontaminateView(TaskView):
         self.binder.bind(self.cards.weight_selector.edited_outgroup, object.properties.outgroup_weight)
         self.binder.bind(self.cards.weight_selector.edited_ingroup, object.properties.ingroup_weight)
 
+        self.binder.bind(self.cards.output_directory.directoryChanged, object.properties.output_directory)
+        self.binder.bind(object.properties.output_directory, self.cards.output_directory.setPath)
+        self.binder.bind(self.cards.profiler.toggled, object.properties.profile)
+        self.binder.bind(object.properties.profile, self.cards.profiler.setChecked)
+
         self.binder.bind(object.properties.dummy_results, self.cards.dummy_results.setPath)
+        self.binder.bind(object.properties.performance, self.cards.performance.setReport)
+        self.binder.bind(object.properties.performance, self.cards.performance.roll_animation.setAnimatedVisible, lambda x: x is not None)
         self.binder.bind(object.properties.dummy_results, self.cards.dummy_results.roll_animation.setAnimatedVisible,  lambda x: x is not None)
 
         self.binder.bind(object.properties.distance_metric, self.update_visible_cards)
@@ -1106,6 +1128,7 @@ class DecontaminateView(TaskView):
             card.setEnabled(editable)
         self.cards.title.setEnabled(True)
         self.cards.dummy_results.setEnabled(True)
+        self.cards.performance.setEnabled(True)
         self.cards.progress.setEnabled(True)
 
     def save(self):
@@ -26,7 +26,7 @@ from .. import app
 from ..utility import Guard, Binder, type_convert, human_readable_size
 from ..model import Item, ItemModel, Object, SequenceModel, SequenceModel2, PartitionModel
 from ..types import ColumnFilter, Notification, AlignmentMode, PairwiseComparisonConfig, StatisticsGroup, AlignmentMode, PairwiseScore, DistanceMetric
-from .common import Item, Card, CardCustom, NoWheelComboBox, GLineEdit, ObjectView, TaskView, RadioButtonGroup, RichRadioButton, MinimumStackedWidget, VerticalRollAnimation
+from .common import Item, Card, CardCustom, NoWheelComboBox, GLineEdit, ObjectView, TaskView, RadioButtonGroup, RichRadioButton, MinimumStackedWidget, VerticalRollAnimation, PairWritingConfig, OutputDirectorySelector, ProfilerSelector, PerformanceCard, SweepCard, show_progress
 
 from ..types import ComparisonMode, Notification
 from .common import (
@@ -268,9 +268,7 @@ class ProgressCard(QtWidgets.QProgressBar):
         self.setVisible(False)
 
     def showProgress(self, report):
-        self.setMaximum(report.maximum)
-        self.setMinimum(report.minimum)
-        self.setValue(report.value)
+        show_progress(self, report)
 
 
 class InputSelector(Card):
@@ -549,9 +547,12 @@ class AlignmentModeSelector(CardCustom):
         self.addLayout(layout)
 
     def draw_pairwise_config(self):
-        write_pairs = QtWidgets.QCheckBox('Write file with all aligned sequence pairs')
+        write_pairs = QtWidgets.QCheckBox('Write file with aligned sequence pairs')
         self.controls.write_pairs = write_pairs
 
+        pairs_config = PairWritingConfig()
+        self.controls.pairs_config = pairs_config
+
         self.controls.score_fields = dict()
         scores = QtWidgets.QGridLayout()
         validator = QtGui.QIntValidator()
@@ -578,6 +579,7 @@ class AlignmentModeSelector(CardCustom):
         reset = QtWidgets.QPushButton('Reset to default scores')
         reset.clicked.connect(self.resetScores)
         layout.addWidget(write_pairs)
+        layout.addWidget(pairs_config)
         layout.addWidget(label)
         layout.addLayout(scores)
         layout.addWidget(reset)
@@ -872,6 +874,7 @@ class DereplicateView(TaskView):
         self.cards = AttrDict()
         self.cards.title = TitleCard(self)
         self.cards.dummy_results = DummyResultsCard(self)
+        self.cards.performance = PerformanceCard(self)
         self.cards.progress = ProgressCard(self)
         self.cards.input_sequences = SequenceSelector('Input sequence', self)
         self.cards.alignment_mode = AlignmentModeSelector(self)
@@ -879,6 +882,14 @@ class DereplicateView(TaskView):
         self.cards.similarity = SimilarityThresholdCard(self)
         self.cards.identity = IdentityThresholdCard(self)
         self.cards.length = LengthThresholdCard(self)
+        self.cards.similarity_sweep = SweepCard(
+            'Similarity Sweep',
+            'Optionally dereplicate at each of these similarity thresholds instead. '
+            'Distances are only calculated once, and results for each threshold '
+            'are written to their own folder.',
+            'e.g. 0.01, 0.02, 0.03', self)
+        self.cards.output_directory = OutputDirectorySelector(self)
+        self.cards.profiler = ProfilerSelector(self)
 
         layout = QtWidgets.QVBoxLayout()
         for card in self.cards:
@@ -910,6 +921,16 @@ class DereplicateView(TaskView):
         self.binder.bind(object.properties.alignment_mode, self.cards.alignment_mode.controls.mode.setValue)
         self.binder.bind(self.cards.alignment_mode.controls.write_pairs.toggled, object.properties.alignment_write_pairs)
         self.binder.bind(object.properties.alignment_write_pairs, self.cards.alignment_mode.controls.write_pairs.setChecked)
+        self.binder.bind(object.properties.alignment_write_pairs, self.cards.alignment_mode.controls.pairs_config.setEnabled)
+        self.binder.bind(self.cards.alignment_mode.controls.pairs_config.controls.policy.valueChanged, object.properties.alignment_pairs_policy)
+        self.binder.bind(object.properties.alignment_pairs_policy, self.cards.alignment_mode.controls.pairs_config.controls.policy.setValue)
+        self.binder.bind(object.properties.alignment_pairs_policy, self.cards.alignment_mode.controls.pairs_config.showPolicy)
+        self.binder.bind(self.cards.alignment_mode.controls.pairs_config.controls.cutoff.textEditedSafe, object.properties.alignment_pairs_cutoff, lambda x: type_convert(x, float, None))
+        self.binder.bind(object.properties.alignment_pairs_cutoff, self.cards.alignment_mode.controls.pairs_config.controls.cutoff.setText, lambda x: f'{x:.4f}' if x is not None else '')
+        self.binder.bind(self.cards.alignment_mode.controls.pairs_config.controls.top_k.valueChangedSafe, object.properties.alignment_pairs_top_k)
+        self.binder.bind(object.properties.alignment_pairs_top_k, self.cards.alignment_mode.controls.pairs_config.controls.top_k.setValue)
+        self.binder.bind(self.cards.alignment_mode.controls.pairs_config.controls.compression.valueChanged, object.properties.alignment_pairs_compression)
+        self.binder.bind(object.properties.alignment_pairs_compression, self.cards.alignment_mode.controls.pairs_config.controls.compression.setValue)
         self.binder.bind(self.cards.alignment_mode.resetScores, object.pairwise_scores.reset)
         for score in PairwiseScore:
             self.binder.bind(
@@ -948,12 +969,21 @@ class DereplicateView(TaskView):
         self.binder.bind(self.cards.similarity.controls.similarityThreshold.textEditedSafe, object.properties.similarity_threshold, lambda x: type_convert(x, float, None))
 
         self.binder.bind(object.properties.similarity_threshold, self.cards.identity.controls.identityThreshold.setValue, lambda x: 100 - round(x * 100))
+        self.binder.bind(self.cards.similarity_sweep.valuesChanged, object.properties.similarity_sweep)
+        self.binder.bind(object.properties.similarity_sweep, self.cards.similarity_sweep.setValues)
         self.binder.bind(self.cards.identity.controls.identityThreshold.valueChangedSafe, object.properties.similarity_threshold, lambda x: (100 - x) / 100)
 
         self.binder.bind(object.properties.length_threshold, self.cards.length.controls.lengthThreshold.setText, lambda x: str(x) if x is not None else '')
         self.binder.bind(self.cards.length.controls.lengthThreshold.textEditedSafe, object.properties.length_threshold, lambda x: type_convert(x, int, 0))
 
+        self.binder.bind(self.cards.output_directory.directoryChanged, object.properties.output_directory)
+        self.binder.bind(object.properties.output_directory, self.cards.output_directory.setPath)
+        self.binder.bind(self.cards.profiler.toggled, object.properties.profile)
+        self.binder.bind(object.properties.profile, self.cards.profiler.setChecked)
+
         self.binder.bind(object.properties.dummy_results, self.cards.dummy_results.setPath)
+        self.binder.bind(object.properties.performance, self.cards.performance.setReport)
+        self.binder.bind(object.properties.performance, self.cards.performance.roll_animation.setAnimatedVisible, lambda x: x is not None)
         self.binder.bind(object.properties.dummy_results, self.cards.dummy_results.setVisible,  lambda x: x is not None)
 
         self.binder.bind(object.properties.distance_metric, self.update_visible_cards)
@@ -973,6 +1003,7 @@ class DereplicateView(TaskView):
             card.setEnabled(editable)
         self.cards.title.setEnabled(True)
         self.cards.dummy_results.setEnabled(True)
+        self.cards.performance.setEnabled(True)
         self.cards.progress.setEnabled(True)
 
     def save(self):
@@ -26,7 +26,7 @@ from .. import app
 from ..utility import Guard, Binder, type_convert, human_readable_size
 from ..model.common import Item, ItemModel
 from ..types import ColumnFilter, Notification, AlignmentMode, PairwiseComparisonConfig, StatisticsGroup, AlignmentMode, PairwiseScore, DistanceMetric
-from .common import Card, CardCustom, NoWheelRadioButton, NoWheelComboBox, GLineEdit, ObjectView, TaskView, RadioButtonGroup, RichRadioButton, MinimumStackedWidget, VerticalRollAnimation
+from .common import Card, CardCustom, SweepCard, NoWheelRadioButton, NoWheelComboBox, GLineEdit, ObjectView, TaskView, RadioButtonGroup, RichRadioButton, MinimumStackedWidget, VerticalRollAnimation
 
 from ..types import ComparisonMode, DecontaminateMode, Notification, DecontaminateMode
 from ..types.length_decontamination import Mode, Symbol
@@ -245,6 +245,11 @@ class LengthDecontaminationView(TaskView):
         self.cards.mode = ModeSelector(self)
         self.cards.symbol = SymbolSelector(self)
         self.cards.threshold = ThresholdSelector(self)
+        self.cards.threshold_sweep = SweepCard(
+            'Threshold sweep:',
+            'Optionally run once for each of these thresholds instead. '
+            'Each run works on a copy of the input folder, named after its threshold.',
+            'e.g. 0.25, 0.5, 0.75', self)
         self.cards.logger = LoggerCard(self)
 
         layout = QtWidgets.QVBoxLayout()
@@ -280,6 +285,9 @@ class LengthDecontaminationView(TaskView):
         self.binder.bind(self.cards.threshold.controls.edit.textEditedSafe, object.properties.threshold, lambda x: float(x))
         self.binder.bind(object.properties.threshold, self.cards.threshold.controls.edit.setText, lambda x: f'{x:.4f}')
 
+        self.binder.bind(self.cards.threshold_sweep.valuesChanged, object.properties.threshold_sweep)
+        self.binder.bind(object.properties.threshold_sweep, self.cards.threshold_sweep.setValues)
+
 
     def setEditable(self, editable: bool):
         for card in self.cards:
@@ -25,8 +25,8 @@ from itaxotools.common.utility import AttrDict, override
 from .. import app
 from ..utility import Guard, Binder, type_convert, human_readable_size
 from ..model import Item, ItemModel, Object, SequenceModel, SequenceModel2, PartitionModel
-from ..types import ColumnFilter, Notification, AlignmentMode, PairwiseComparisonConfig, StatisticsGroup, AlignmentMode, PairwiseScore, DistanceMetric
-from .common import Item, Card, CardCustom, NoWheelComboBox, GLineEdit, ObjectView, TaskView, RadioButtonGroup, RichRadioButton, MinimumStackedWidget, VerticalRollAnimation
+from ..types import ColumnFilter, Notification, AlignmentMode, PairwiseComparisonConfig, StatisticsGroup, AlignmentMode, PairwiseScore, DistanceMetric, PlotFormat
+from .common import Item, Card, CardCustom, NoWheelComboBox, GLineEdit, ObjectView, TaskView, RadioButtonGroup, RichRadioButton, MinimumStackedWidget, VerticalRollAnimation, PairWritingConfig, OutputDirectorySelector, ProfilerSelector, PerformanceCard, show_progress
 
 
 class ItemProxyModel(QtCore.QAbstractProxyModel):
@@ -218,6 +218,8 @@ class TitleCard(Card):
 
 
 class DummyResultsCard(Card):
+    renderPlots = QtCore.Signal()
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setVisible(False)
@@ -233,15 +235,21 @@ class DummyResultsCard(Card):
         browse = QtWidgets.QPushButton('Browse')
         browse.clicked.connect(self.handleBrowse)
 
+        plots = QtWidgets.QPushButton('Render plots')
+        plots.clicked.connect(self.renderPlots)
+        plots.setVisible(False)
+
         layout = QtWidgets.QHBoxLayout()
         layout.addWidget(title)
         layout.addWidget(path, 1)
+        layout.addWidget(plots)
         layout.addWidget(browse)
         layout.setSpacing(16)
         self.addLayout(layout)
 
         self.controls.path = path
         self.controls.browse = browse
+        self.controls.plots = plots
 
     def handleBrowse(self):
         url = QtCore.QUrl.fromLocalFile(str(self.path))
@@ -263,9 +271,7 @@ class ProgressCard(QtWidgets.QProgressBar):
         self.setVisible(False)
 
     def showProgress(self, report):
-        self.setMaximum(report.maximum)
-        self.setMinimum(report.minimum)
-        self.setValue(report.value)
+        show_progress(self, report)
 
 
 class InputSelector(Card):
@@ -790,9 +796,12 @@ class AlignmentModeSelector(CardCustom):
         self.addLayout(layout)
 
     def draw_pairwise_config(self):
-        write_pairs = QtWidgets.QCheckBox('Write file with all aligned sequence pairs')
+        write_pairs = QtWidgets.QCheckBox('Write file with aligned sequence pairs')
         self.controls.write_pairs = write_pairs
 
+        pairs_config = PairWritingConfig(list(DistanceMetric))
+        self.controls.pairs_config = pairs_config
+
         self.controls.score_fields = dict()
         scores = QtWidgets.QGridLayout()
         validator = QtGui.QIntValidator()
@@ -819,6 +828,7 @@ class AlignmentModeSelector(CardCustom):
         reset = QtWidgets.QPushButton('Reset to default scores')
         reset.clicked.connect(self.resetScores)
         layout.addWidget(write_pairs)
+        layout.addWidget(pairs_config)
         layout.addWidget(label)
         layout.addLayout(scores)
         layout.addWidget(reset)
@@ -1031,7 +1041,8 @@ class PlotSelector(Card):
 
         description = QtWidgets.QLabel(
             'Plot histograms of the distribution of sequence distances across species/genera. '
-            'You may customize the width of the bins across the horizontal axis (from 0.0 to 1.0).'
+            'You may customize the width of the bins across the horizontal axis (from 0.0 to 1.0). '
+            'Binned counts are always saved, so plots may also be rendered after the analysis.'
         )
         description.setWordWrap(True)
 
@@ -1045,16 +1056,30 @@ class PlotSelector(Card):
         contents.addWidget(binwidth)
         contents.addStretch(1)
 
+        formats = QtWidgets.QHBoxLayout()
+        formats.addWidget(QtWidgets.QLabel('Formats:'))
+        for format in PlotFormat:
+            widget = QtWidgets.QCheckBox(format.label)
+            formats.addWidget(widget)
+            self.controls[format.key] = widget
+        formats.addStretch(1)
+        formats.setSpacing(8)
+
+        deferred = QtWidgets.QCheckBox('Only render plots when requested from the results')
+
         layout = QtWidgets.QVBoxLayout()
         layout.addWidget(title)
         layout.addWidget(description)
         layout.addLayout(contents)
+        layout.addLayout(formats)
+        layout.addWidget(deferred)
         layout.setSpacing(8)
 
         self.addLayout(layout)
 
         self.controls.plot = title
         self.controls.binwidth = binwidth
+        self.controls.deferred = deferred
 
 
 class VersusAllView(TaskView):
@@ -1067,6 +1092,7 @@ class VersusAllView(TaskView):
         self.cards = AttrDict()
         self.cards.title = TitleCard(self)
         self.cards.dummy_results = DummyResultsCard(self)
+        self.cards.performance = PerformanceCard(self)
         self.cards.progress = ProgressCard(self)
         self.cards.input_sequences = SequenceSelector('Input sequences', self)
         self.cards.perform_species = OptionalCategory(
@@ -1085,6 +1111,8 @@ class VersusAllView(TaskView):
         self.cards.distance_metrics = DistanceMetricSelector(self)
         self.cards.stats_options = StatisticSelector(self)
         self.cards.plot_options = PlotSelector(self)
+        self.cards.output_directory = OutputDirectorySelector(self)
+        self.cards.profiler = ProfilerSelector(self)
 
         layout = QtWidgets.QVBoxLayout()
         for card in self.cards:
@@ -1136,6 +1164,18 @@ class VersusAllView(TaskView):
         self.binder.bind(object.properties.alignment_mode, self.cards.alignment_mode.controls.mode.setValue)
         self.binder.bind(self.cards.alignment_mode.controls.write_pairs.toggled, object.properties.alignment_write_pairs)
         self.binder.bind(object.properties.alignment_write_pairs, self.cards.alignment_mode.controls.write_pairs.setChecked)
+        self.binder.bind(object.properties.alignment_write_pairs, self.cards.alignment_mode.controls.pairs_config.setEnabled)
+        self.binder.bind(self.cards.alignment_mode.controls.pairs_config.controls.policy.valueChanged, object.properties.alignment_pairs_policy)
+        self.binder.bind(object.properties.alignment_pairs_policy, self.cards.alignment_mode.controls.pairs_config.controls.policy.setValue)
+        self.binder.bind(object.properties.alignment_pairs_policy, self.cards.alignment_mode.controls.pairs_config.showPolicy)
+        self.binder.bind(self.cards.alignment_mode.controls.pairs_config.controls.cutoff.textEditedSafe, object.properties.alignment_pairs_cutoff, lambda x: type_convert(x, float, None))
+        self.binder.bind(object.properties.alignment_pairs_cutoff, self.cards.alignment_mode.controls.pairs_config.controls.cutoff.setText, lambda x: f'{x:.4f}' if x is not None else '')
+        self.binder.bind(self.cards.alignment_mode.controls.pairs_config.controls.top_k.valueChangedSafe, object.properties.alignment_pairs_top_k)
+        self.binder.bind(object.properties.alignment_pairs_top_k, self.cards.alignment_mode.controls.pairs_config.controls.top_k.setValue)
+        self.binder.bind(self.cards.alignment_mode.controls.pairs_config.controls.metric.valueChanged, object.properties.alignment_pairs_metric)
+        self.binder.bind(object.properties.alignment_pairs_metric, self.cards.alignment_mode.controls.pairs_config.controls.metric.setValue)
+        self.binder.bind(self.cards.alignment_mode.controls.pairs_config.controls.compression.valueChanged, object.properties.alignment_pairs_compression)
+        self.binder.bind(object.properties.alignment_pairs_compression, self.cards.alignment_mode.controls.pairs_config.controls.compression.setValue)
         self.binder.bind(self.cards.alignment_mode.resetScores, object.pairwise_scores.reset)
         for score in PairwiseScore:
             self.binder.bind(
@@ -1179,9 +1219,24 @@ class VersusAllView(TaskView):
         self.binder.bind(object.properties.plot_binwidth, self.cards.plot_options.controls.binwidth.setText, lambda x: str(x) if x is not None else '')
         self.binder.bind(self.cards.plot_options.controls.plot.toggled, object.properties.plot_histograms)
         self.binder.bind(self.cards.plot_options.controls.binwidth.textEditedSafe, object.properties.plot_binwidth, lambda x: type_convert(x, float, None))
+        self.binder.bind(self.cards.plot_options.controls.deferred.toggled, object.properties.plot_deferred)
+        self.binder.bind(object.properties.plot_deferred, self.cards.plot_options.controls.deferred.setChecked)
+        for format in PlotFormat:
+            self.binder.bind(self.cards.plot_options.controls[format.key].toggled, object.plot_formats.properties[format.key])
+            self.binder.bind(object.plot_formats.properties[format.key], self.cards.plot_options.controls[format.key].setChecked)
+
+        self.binder.bind(self.cards.output_directory.directoryChanged, object.properties.output_directory)
+        self.binder.bind(object.properties.output_directory, self.cards.output_directory.setPath)
+        self.binder.bind(self.cards.profiler.toggled, object.properties.profile)
+        self.binder.bind(object.properties.profile, self.cards.profiler.setChecked)
 
         self.binder.bind(object.properties.dummy_results, self.cards.dummy_results.setPath)
+        self.binder.bind(object.properties.performance, self.cards.performance.setReport)
+        self.binder.bind(object.properties.performance, self.cards.performance.roll_animation.setAnimatedVisible, lambda x: x is not None)
         self.binder.bind(object.properties.dummy_results, self.cards.dummy_results.roll_animation.setAnimatedVisible,  lambda x: x is not None)
+        self.binder.bind(object.properties.plots_pending, self.cards.dummy_results.controls.plots.setVisible)
+        self.binder.bind(object.properties.busy_main, self.cards.dummy_results.controls.plots.setEnabled, lambda busy: not busy)
+        self.binder.bind(self.cards.dummy_results.renderPlots, object.render_plots)
 
         self.binder.bind(object.properties.editable, self.setEditable)
 
@@ -1190,6 +1245,7 @@ class VersusAllView(TaskView):
             card.setEnabled(editable)
         self.cards.title.setEnabled(True)
         self.cards.dummy_results.setEnabled(True)
+        self.cards.performance.setEnabled(True)
         self.cards.progress.setEnabled(True)
 
     def save(self):
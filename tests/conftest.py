@@ -0,0 +1,118 @@
+import pytest
+
+
+@pytest.fixture
+def progress(monkeypatch):
+    """Install a progress tracker, as worker processes do before running tasks"""
+    import itaxotools
+    from itaxotools.decontaminator_gui.progress import ProgressTracker
+
+    tracker = ProgressTracker(lambda report: None)
+    monkeypatch.setattr(itaxotools, 'progress_handler', tracker, raising=False)
+    return tracker
+
+
+@pytest.fixture
+def versus_all_arguments():
+    """Keyword arguments for a Versus All run on the test sequences, given a work directory"""
+    from pathlib import Path
+
+    from itaxotools.common.utility import AttrDict
+    from itaxotools.decontaminator_gui.types import (
+        AlignmentMode, ColumnFilter, DistanceMetric, FileFormat, PairCompression, PairPolicy)
+
+    path = Path(__file__).parent / 'data' / 'sequences.fas'
+
+    def arguments(work_dir: Path, **kwargs) -> dict:
+        work_dir.mkdir(parents=True)
+        return dict(dict(
+            work_dir=work_dir,
+            output_directory=None,
+            perform_species=True,
+            perform_genera=True,
+            input_sequences=AttrDict(type=FileFormat.Fasta, path=path, parse_organism=True),
+            input_species=AttrDict(type=FileFormat.Fasta, path=path, subset_filter=ColumnFilter.All),
+            input_genera=AttrDict(type=FileFormat.Fasta, path=path, subset_filter=ColumnFilter.First),
+            alignment_mode=AlignmentMode.NoAlignment,
+            alignment_write_pairs=True,
+            alignment_pairs_policy=PairPolicy.TopK,
+            alignment_pairs_cutoff=None,
+            alignment_pairs_top_k=3,
+            alignment_pairs_compression=PairCompression.Uncompressed,
+            alignment_pairwise_scores=dict(
+                match=1, mismatch=-1, gap_penalty=-8, gap_extend_penalty=-1,
+                end_gap_penalty=-1, end_gap_extend_penalty=-1),
+            distance_metrics=[DistanceMetric.Uncorrected, DistanceMetric.JukesCantor],
+            distance_metrics_bbc_k=10,
+            distance_linear=True,
+            distance_matricial=True,
+            distance_percentile=False,
+            distance_precision=4,
+            distance_missing='NA',
+            statistics_all=True,
+            statistics_species=True,
+            statistics_genus=True,
+            plot_histograms=False,
+            plot_binwidth=0.05,
+            plot_formats=[],
+        ), **kwargs)
+
+    return arguments
+
+
+
+@pytest.fixture
+def dereplicate_arguments():
+    """Keyword arguments for a Dereplicate run on the test sequences, given a work directory"""
+    from pathlib import Path
+
+    from itaxotools.common.utility import AttrDict
+    from itaxotools.decontaminator_gui.types import (
+        AlignmentMode, DistanceMetric, FileFormat, PairCompression, PairPolicy)
+
+    path = Path(__file__).parent / 'data' / 'sequences.fas'
+
+    def arguments(work_dir: Path, **kwargs) -> dict:
+        work_dir.mkdir(parents=True)
+        return dict(dict(
+            work_dir=work_dir,
+            output_directory=None,
+            input_sequences=AttrDict(type=FileFormat.Fasta, path=path),
+            alignment_mode=AlignmentMode.NoAlignment,
+            alignment_write_pairs=True,
+            alignment_pairs_policy=PairPolicy.All,
+            alignment_pairs_cutoff=None,
+            alignment_pairs_top_k=3,
+            alignment_pairs_compression=PairCompression.Uncompressed,
+            alignment_pairwise_scores=dict(
+                match=1, mismatch=-1, gap_penalty=-8, gap_extend_penalty=-1,
+                end_gap_penalty=-1, end_gap_extend_penalty=-1),
+            distance_metric=DistanceMetric.Uncorrected,
+            distance_metric_bbc_k=10,
+            distance_linear=True,
+            distance_matricial=True,
+            distance_percentile=False,
+            distance_precision=4,
+            distance_missing='NA',
+            length_threshold=0,
+        ), **kwargs)
+
+    return arguments
+
+
+@pytest.fixture
+def tree_contents():
+    """Contents of the files under a directory by relative path, optionally only the given ones"""
+    from pathlib import Path
+    from typing import Iterable
+
+    def contents(directory: Path, names: Iterable[str] | None = None) -> dict[str, bytes]:
+        files = {
+            str(path.relative_to(directory)): path
+            for path in sorted(directory.rglob('*'))
+            if path.is_file() and path.name != 'performance.json'}
+        return {
+            name: path.read_bytes() for name, path in files.items()
+            if names is None or name in names}
+
+    return contents
@@ -0,0 +1,64 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from itaxotools.decontaminator_gui.batch import SUMMARY_NAME, BatchError, load_jobs, main
+
+SEQUENCES = Path(__file__).parent / 'data' / 'sequences.fas'
+
+
+def job_file(tmp_path: Path, *jobs: dict, **options) -> Path:
+    path = tmp_path / 'jobs.json'
+    path.write_text(json.dumps(dict(options, jobs=list(jobs))))
+    return path
+
+
+def versus_all_job(**properties) -> dict:
+    return dict(dict(
+        task='versus_all',
+        input_sequences=dict(path=str(SEQUENCES), type='Fasta'),
+        alignment_mode='NoAlignment',
+        distance_metrics=['p'],
+        plot_histograms=False,
+    ), **properties)
+
+
+def test_load_jobs(tmp_path):
+    jobs, workers = load_jobs(job_file(tmp_path, versus_all_job(name='first'), versus_all_job(), workers=3))
+    assert [job.name for job in jobs] == ['first', '002_versus_all']
+    assert jobs[0].output == tmp_path / 'batch_results' / 'first'
+    assert workers == 3
+
+
+@pytest.mark.parametrize('jobs, message', [
+    ([dict(task='nothing')], "unknown task 'nothing'"),
+    ([versus_all_job(name='twice'), versus_all_job(name='twice')], "duplicate name 'twice'"),
+    ([dict(task='versus_all', name='empty')], 'Job empty: missing input_sequences'),
+])
+def test_load_jobs_rejects_invalid_jobs(tmp_path, jobs, message):
+    with pytest.raises(BatchError, match=message):
+        load_jobs(job_file(tmp_path, *jobs))
+
+
+def test_dry_run_only_validates(tmp_path, capsys):
+    path = job_file(tmp_path, versus_all_job(name='barcodes'))
+    assert main([str(path), '--dry-run']) == 0
+    assert capsys.readouterr().out.startswith('[barcodes] versus_all -> ')
+    assert not (tmp_path / 'batch_results').exists()
+
+    path = job_file(tmp_path, versus_all_job(name='barcodes', alignment_mode='Unknown'))
+    assert main([str(path), '--dry-run']) == 2
+    assert 'Invalid AlignmentMode' in capsys.readouterr().err
+
+
+def test_versus_all_job_writes_summary(tmp_path):
+    path = job_file(tmp_path, versus_all_job(name='barcodes'))
+    assert main([str(path), '--workers', '1']) == 0
+
+    [result] = json.loads((tmp_path / 'batch_results' / SUMMARY_NAME).read_text())
+    assert result['name'] == 'barcodes'
+    assert result['ok'], result['error']
+    output = Path(result['output'])
+    assert output.parent == tmp_path / 'batch_results' / 'barcodes'
+    assert (output / 'distances' / 'linear.tsv').exists()
@@ -0,0 +1,90 @@
+import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+from itaxotools.decontaminator_gui import channel as channel_module
+from itaxotools.decontaminator_gui.channel import SHARED_THRESHOLD, Channel, Kind
+from itaxotools.decontaminator_gui.threading_loop import ReportProgress
+
+
+@pytest.fixture
+def channels():
+    """Both ends of a channel that only flushes posted messages when asked"""
+    left, right = mp.Pipe(duplex=True)
+    sender = Channel(left, delay=60.0)
+    receiver = Channel(right, delay=60.0)
+    yield sender, receiver
+    sender.close()
+    receiver.close()
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    """Names of the shared memory blocks created while sending"""
+    names = []
+    share = channel_module.SharingPickler.share
+
+    def spy(self, data):
+        block = share(self, data)
+        names.append(block.name)
+        return block
+
+    monkeypatch.setattr(channel_module.SharingPickler, 'share', spy)
+    return names
+
+
+def exists(name: str) -> bool:
+    try:
+        SharedMemory(name).close()
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def test_mixed_kinds_round_trip_in_one_batch(channels):
+    sender, receiver = channels
+    progress = ReportProgress('Calculating', 1, 0, 10, id='task')
+
+    sender.post(Kind.Stdout, 'hello ')
+    sender.post(Kind.Stdout, 'world')
+    sender.post(Kind.Progress, progress)
+    sender.post(Kind.Stderr, 'ωarning')
+    sender.send(Kind.Result, (7, dict(values=[1, 2.5, None])))
+
+    assert not sender.pending
+    messages = receiver.receive()
+    assert messages == [
+        (Kind.Stdout, 'hello world'),
+        (Kind.Progress, progress),
+        (Kind.Stderr, 'ωarning'),
+        (Kind.Result, (7, dict(values=[1, 2.5, None]))),
+    ]
+    assert all(isinstance(kind, Kind) for kind, _ in messages)
+    assert not receiver.poll()
+
+
+def test_large_payloads_are_unlinked_once_received(channels, shared):
+    sender, receiver = channels
+    data = bytes(range(256)) * (SHARED_THRESHOLD // 256 + 1)
+    array = np.arange(SHARED_THRESHOLD // 8 + 1, dtype=np.float64).reshape(-1, 1)
+
+    sender.send(Kind.Result, (1, data, array))
+    assert len(shared) == 2
+    assert all(exists(name) for name in shared)
+
+    [(kind, (request, received_data, received_array))] = receiver.receive()
+    assert received_data == data
+    assert np.array_equal(received_array, array)
+    assert not any(exists(name) for name in shared)
+
+
+def test_large_payloads_are_unlinked_when_sending_fails(channels, shared):
+    sender, _ = channels
+    sender.connection.close()
+
+    with pytest.raises(OSError):
+        sender.send(Kind.Result, (1, bytes(SHARED_THRESHOLD)))
+    assert len(shared) == 1
+    assert not exists(shared[0])
@@ -0,0 +1,52 @@
+import io
+import time
+from pathlib import Path
+
+from itaxotools.decontaminator_gui.distributed import BlockScheduler, parse_endpoints
+from itaxotools.decontaminator_gui.threading_loop import LocalExecutor
+
+
+def slow_first_block(output_directory: Path, start: int, stop: int, delay: float = 0.2):
+    """Straggles on the first attempt of the first block only"""
+    if start == 0 and output_directory.suffix == '.1':
+        time.sleep(60)
+    time.sleep(delay)
+    (output_directory / 'rows.txt').write_text(f'{start} {stop}')
+
+
+def schedule(tmp_path: Path, blocks: list[tuple[int, int]], **kwargs) -> tuple[list[Path], str]:
+    output = io.StringIO()
+    scheduler = BlockScheduler([LocalExecutor(), LocalExecutor()], output=output)
+    ready = []
+    try:
+        scheduler.run(
+            slow_first_block, blocks,
+            lambda start, attempt: tmp_path / f'rows_{start}.{attempt}',
+            ready.extend, **kwargs)
+    finally:
+        scheduler.close()
+    return ready, output.getvalue()
+
+
+def test_straggler_is_duplicated(tmp_path):
+    blocks = [(index, index + 1) for index in range(6)]
+    ts = time.monotonic()
+    ready, output = schedule(tmp_path, blocks)
+    assert time.monotonic() - ts < 30
+    assert [path.name for path in ready] == ['rows_0.2', *(f'rows_{index}.1' for index in range(1, 6))]
+    assert [(path / 'rows.txt').read_text() for path in ready] == [f'{start} {stop}' for start, stop in blocks]
+    assert 'Block of rows 0-1 has been running' in output
+
+
+def test_blocks_on_time_are_not_duplicated(tmp_path):
+    blocks = [(index, index + 1) for index in range(1, 7)]
+    ready, output = schedule(tmp_path, blocks)
+    assert [path.name for path in ready] == [f'rows_{index}.1' for index in range(1, 7)]
+    assert 'running' not in output
+
+
+def test_parse_endpoints():
+    endpoints = parse_endpoints('local*2, server:6000', authkey=b'key')
+    assert len(endpoints) == 3
+    assert endpoints[2].address == ('server', 6000)
+
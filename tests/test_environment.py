@@ -0,0 +1,26 @@
+from itaxotools.decontaminator_gui.scratch import ENV_QUOTA, ScratchManager
+
+
+def test_scratch_quota(monkeypatch):
+    monkeypatch.setenv(ENV_QUOTA, '2G')
+    assert ScratchManager.from_environment().quota == 2 * 10 ** 9
+
+
+def test_malformed_scratch_quota(monkeypatch, capsys):
+    monkeypatch.setenv(ENV_QUOTA, 'lots')
+    assert ScratchManager.from_environment().quota is None
+    assert ENV_QUOTA in capsys.readouterr().err
+
+
+def test_malformed_worker_limits(monkeypatch, capsys):
+    from itaxotools.decontaminator_gui import limits
+
+    monkeypatch.setenv(limits.ENV_NICE, 'x')
+    monkeypatch.setenv(limits.ENV_CPUS, 'a-b')
+    monkeypatch.setenv(limits.ENV_THREADS, '2')
+    monkeypatch.setenv(limits.ENV_MEMORY, '1Q')
+    assert limits.WorkerLimits.from_environment() == limits.WorkerLimits(threads=2)
+    errors = capsys.readouterr().err
+    assert limits.ENV_NICE in errors
+    assert limits.ENV_CPUS in errors
+    assert limits.ENV_MEMORY in errors
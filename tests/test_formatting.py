@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from itaxotools.decontaminator_gui.tasks.formatting import FloatFormatter
+
+
+def render(formatter: FloatFormatter, values: list[float]) -> list[str]:
+    cells = formatter.format(np.array(values, dtype=float))
+    return [bytes(cell[cell != 0]).decode() for cell in cells]
+
+
+@pytest.mark.parametrize('precision', [0, 1, 2, 4, 6, 15])
+def test_random_values_match_str_format(precision):
+    template = f'{{:.{precision}f}}'
+    rng = np.random.default_rng(precision)
+    values = list(np.round(rng.random(5000), precision + 1))
+    values += list(rng.random(1000) * 1e6 - 5e5)
+    assert render(FloatFormatter(template, 'NA'), values) == [template.format(v) for v in values]
+
+
+@pytest.mark.parametrize('value', [
+    0.00005, 0.12345, 0.15455, 0.5, 1.5, 2.5, -3.25, 123456.5,
+    -0.00001, -0.0, 0.0, 1e17, 1e300])
+def test_ties_match_str_format(value):
+    for precision in [0, 1, 4]:
+        template = f'{{:.{precision}f}}'
+        assert render(FloatFormatter(template, 'NA'), [value]) == [template.format(value)]
+
+
+def test_special_values():
+    formatter = FloatFormatter('{:.4f}', 'NA')
+    assert render(formatter, [float('nan'), float('inf'), -float('inf'), 1.0]) == ['NA', 'inf', '-inf', '1.0000']
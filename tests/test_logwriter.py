@@ -0,0 +1,34 @@
+import time
+
+from itaxotools.decontaminator_gui.logwriter import LogWriter
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_flush_writes_out_buffered_text(tmp_path):
+    writer = LogWriter(interval=60.0)
+    file = writer.open(tmp_path / 'log.txt')
+    file.write('hello\n')
+    file.flush()
+    assert wait_for(lambda: (tmp_path / 'log.txt').exists() and (tmp_path / 'log.txt').read_text() == 'hello\n')
+    file.close()
+    writer.close()
+
+
+def test_rotation(tmp_path):
+    writer = LogWriter(max_bytes=100, backups=2)
+    file = writer.open(tmp_path / 'log.txt')
+    for index in range(30):
+        file.write(f'line {index:04d}\n')
+    file.close()
+    writer.close()
+    assert (tmp_path / 'log.txt.1.gz').exists()
+    assert (tmp_path / 'log.txt.2.gz').exists()
+    assert not (tmp_path / 'log.txt.3.gz').exists()
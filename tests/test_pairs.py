@@ -0,0 +1,70 @@
+from pathlib import Path
+
+import pytest
+
+from itaxotools.common.utility import AttrDict
+from itaxotools.taxi2.distances import DistanceMetric
+from itaxotools.taxi2.pairs import SequencePair, SequencePairs
+from itaxotools.taxi2.sequences import Sequence
+
+from itaxotools.decontaminator_gui.tasks.pairs import PairSelection
+from itaxotools.decontaminator_gui.types import PairCompression, PairPolicy
+
+SEQUENCES = [
+    Sequence('a', 'ACGTACGTAC'),
+    Sequence('b', 'ACGTACGTAA'),
+    Sequence('c', 'ACGTACGAAA'),
+    Sequence('d', 'TCGTTCGAAA'),
+]
+
+
+def select(tmp_path: Path, **params) -> tuple[list[str], list[SequencePair]]:
+    params = AttrDict(dict(policy=PairPolicy.All, cutoff=0.15, top_k=2, compression=PairCompression.Uncompressed) | params)
+    metric = DistanceMetric.Uncorrected()
+    selection = PairSelection(tmp_path / 'pairs.txt', params, metric)
+    passed = []
+    for pair in selection.pairs(iter(SequencePairs.fromProduct(SEQUENCES, SEQUENCES))):
+        passed.append(pair)
+        selection.judge(metric.calculate(pair.x, pair.y))
+    text = (tmp_path / 'pairs.txt').read_text()
+    written = [line for line in text.splitlines() if ' / ' in line]
+    return written, passed
+
+
+def test_all_pairs_pass_through(tmp_path):
+    written, passed = select(tmp_path)
+    assert len(passed) == 16
+    assert len(written) == 16
+
+
+def test_cutoff(tmp_path):
+    written, _ = select(tmp_path, policy=PairPolicy.Cutoff)
+    assert written == ['a / b', 'b / a', 'b / c', 'c / b']
+
+
+def test_top_k(tmp_path):
+    written, passed = select(tmp_path, policy=PairPolicy.TopK)
+    assert len(passed) == 16
+    assert written == ['a / b', 'a / c', 'b / a', 'b / c', 'c / b', 'c / a', 'd / c', 'd / b']
+
+
+def test_missing_cutoff(tmp_path):
+    with pytest.raises(ValueError):
+        select(tmp_path, policy=PairPolicy.Cutoff, cutoff=None)
+
+
+def test_versus_all_selects_pairs_by_the_chosen_metric(tmp_path, versus_all_arguments):
+    from itaxotools.decontaminator_gui.tasks import versus_all
+    from itaxotools.decontaminator_gui.tasks.backend import VersusAll
+    from itaxotools.decontaminator_gui.types import DistanceMetric as Metric
+
+    task = VersusAll()
+    versus_all.configure(task, **versus_all_arguments(tmp_path / 'first'))
+    assert task.params.pairs.metric is task.params.distances.metrics[0]
+
+    task = VersusAll()
+    versus_all.configure(task, **versus_all_arguments(tmp_path / 'chosen', alignment_pairs_metric=Metric.JukesCantor))
+    assert task.params.pairs.metric is task.params.distances.metrics[1]
+
+    with pytest.raises(ValueError):
+        versus_all.configure(VersusAll(), **versus_all_arguments(tmp_path / 'missing', alignment_pairs_metric=Metric.NCD))
@@ -0,0 +1,32 @@
+from itaxotools.decontaminator_gui.performance import PerformanceRecorder, load_report
+
+
+def test_report_labels_process_wide_counters(tmp_path):
+    recorder = PerformanceRecorder()
+    recorder.enter('phase')
+    recorder.count('phase', 3)
+    recorder.exit('phase')
+    recorder.save(tmp_path / 'performance.json')
+    report = load_report(tmp_path)
+    assert set(report['process_wide']) == {'cpu', 'bytes_read', 'bytes_written', 'peak_rss'}
+    assert [phase['phase'] for phase in report['phases']] == ['phase']
+    assert report['phases'][0]['items'] == 3
+
+
+def test_append_report_adds_phases_of_a_later_command(tmp_path, progress):
+    from itaxotools.decontaminator_gui.performance import append_report, save_report
+    from itaxotools.decontaminator_gui.progress import phase
+
+    with phase('Main'):
+        pass
+    save_report(tmp_path)
+    first = load_report(tmp_path)
+
+    progress.reset()
+    with phase('Rendering plots'):
+        pass
+    append_report(tmp_path)
+    report = load_report(tmp_path)
+
+    assert [phase['phase'] for phase in report['phases']] == ['Main', 'Rendering plots']
+    assert report['total']['wall'] > first['total']['wall']
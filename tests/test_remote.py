@@ -0,0 +1,99 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from itaxotools.decontaminator_gui.channel import CHUNK_SIZE, Channel, Kind
+from itaxotools.decontaminator_gui.remote import RemoteExecutor, parse_address
+from itaxotools.decontaminator_gui.threading_loop import Command, ReportDone
+
+SOURCE = Path(__file__).parent.parent / 'src'
+
+
+def edit(source: Path, data: Path, output_directory: Path) -> Path:
+    """Copy a file to the output, then change, remove and add files in data"""
+    result = output_directory / 'copy.bin'
+    result.write_bytes(source.read_bytes())
+    (data / 'changed.txt').write_text('after')
+    (data / 'removed.txt').unlink()
+    (data / 'sub').mkdir()
+    (data / 'sub' / 'added.txt').write_text('added')
+    return result
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Address of a worker server on localhost, on a port of its choosing"""
+    env = dict(os.environ, DECONTAMINATOR_AUTHKEY='secret')
+    env['PYTHONPATH'] = os.pathsep.join([str(SOURCE), str(Path(__file__).parent), env.get('PYTHONPATH', '')])
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'itaxotools.decontaminator_gui.remote', 'localhost:0', '--root', str(tmp_path / 'remote')],
+        env=env, stdout=subprocess.PIPE, text=True)
+    try:
+        line = process.stdout.readline()
+        assert line.startswith('Serving workers on '), line
+        yield parse_address(line.split()[3].rstrip(','))
+    finally:
+        process.kill()
+        process.wait()
+
+
+def run(executor: RemoteExecutor, command: Command):
+    connection, process = executor.start('Test', 1, None)
+    channel = Channel(connection, threshold=executor.threshold, sink=executor.sink())
+    try:
+        command = executor.prepare(command._replace(request=1))
+        executor.send(channel, command)
+        while True:
+            for kind, message in channel.receive():
+                if kind == Kind.Result:
+                    return executor.finish(command, message[1])
+    finally:
+        process.terminate()
+        channel.close()
+
+
+def test_staged_command_streams_files_both_ways(tmp_path, server):
+    source = tmp_path / 'source.bin'
+    source.write_bytes(os.urandom(CHUNK_SIZE * 2 + 123))
+    data = tmp_path / 'data'
+    data.mkdir()
+    (data / 'changed.txt').write_text('before')
+    (data / 'removed.txt').write_text('removed')
+    (data / 'kept.txt').write_text('kept')
+    output = tmp_path / 'output'
+    output.mkdir()
+
+    executor = RemoteExecutor(server, b'secret')
+    report = run(executor, Command('edit', edit, (), dict(source=source, data=data, output_directory=output)))
+
+    assert isinstance(report, ReportDone), report
+    assert report.result == output / 'copy.bin'
+    assert (output / 'copy.bin').read_bytes() == source.read_bytes()
+    assert sorted(path.relative_to(data).as_posix() for path in data.rglob('*') if path.is_file()) == [
+        'changed.txt', 'kept.txt', 'sub/added.txt']
+    assert (data / 'changed.txt').read_text() == 'after'
+    assert not executor.transfers
+    assert not list((tmp_path / 'remote').iterdir())
+
+
+def test_profile_is_streamed_back(tmp_path, server):
+    source = tmp_path / 'source.bin'
+    source.write_bytes(b'data')
+    data = tmp_path / 'data'
+    data.mkdir()
+    (data / 'changed.txt').write_text('before')
+    (data / 'removed.txt').write_text('removed')
+    output = tmp_path / 'output'
+    output.mkdir()
+    prefix = tmp_path / 'logs' / 'edit'
+    prefix.parent.mkdir()
+
+    executor = RemoteExecutor(server, b'secret')
+    command = Command('edit', edit, (), dict(source=source, data=data, output_directory=output), profile=str(prefix))
+    report = run(executor, command)
+
+    assert isinstance(report, ReportDone), report
+    assert (tmp_path / 'logs' / 'edit.profile.txt').read_text()
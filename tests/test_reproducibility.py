@@ -0,0 +1,82 @@
+from functools import partial
+from pathlib import Path
+
+import pytest
+
+from itaxotools.decontaminator_gui import checkpoint
+from itaxotools.decontaminator_gui.tasks import backend, dereplicate, versus_all
+
+
+def resumed_versus_all(tmp_path: Path, monkeypatch, request) -> tuple[Path, Path, list[str] | None]:
+    """Interrupted after five blocks of a row each, then resumed"""
+    versus_all_arguments = request.getfixturevalue('versus_all_arguments')
+    initialize = backend.VersusAll.__init__
+
+    def checkpoint_every_row(self):
+        initialize(self)
+        self.params.checkpoint.interval = 0.0
+
+    monkeypatch.setattr(backend.VersusAll, '__init__', checkpoint_every_row)
+
+    plain = versus_all.versus_all(**versus_all_arguments(tmp_path / 'plain'))
+
+    arguments = versus_all_arguments(tmp_path / 'resumed')
+    key = checkpoint.parameter_hash('versus_all', arguments)
+    commit = checkpoint.Checkpoint.commit
+
+    def interrupting_commit(self, **fields):
+        commit(self, **fields)
+        if len(self) == 5:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(checkpoint.Checkpoint, 'commit', interrupting_commit)
+    with pytest.raises(KeyboardInterrupt):
+        versus_all.versus_all(**arguments, checkpoint_key=key)
+    assert checkpoint.is_resumable(arguments['work_dir'], key)
+    assert not checkpoint.is_resumable(arguments['work_dir'], 'other')
+
+    monkeypatch.setattr(checkpoint.Checkpoint, 'commit', commit)
+    calculated = []
+    calculate_block = backend.Checkpointing.calculate_block
+
+    def counting_block(self, *args):
+        calculated.append(args)
+        return (yield from calculate_block(self, *args))
+
+    monkeypatch.setattr(backend.Checkpointing, 'calculate_block', counting_block)
+    resumed = versus_all.versus_all(**arguments, checkpoint_key=key)
+
+    # Seven rows were left, then a last call finds none
+    assert len(calculated) == 12 - 5 + 1
+    return plain.output_directory, resumed.output_directory, None
+
+
+def distributed_versus_all(tmp_path: Path, monkeypatch, request) -> tuple[Path, Path, list[str] | None]:
+    """Calculated in blocks on two local endpoints"""
+    versus_all_arguments = request.getfixturevalue('versus_all_arguments')
+    plain = versus_all.versus_all(**versus_all_arguments(tmp_path / 'plain'))
+    distributed = versus_all.versus_all_distributed(
+        **versus_all_arguments(tmp_path / 'distributed'), endpoints='local*2', blocks_per_endpoint=2)
+    return plain.output_directory, distributed.output_directory, None
+
+
+def dereplicate_sweep(threshold: float, tmp_path: Path, monkeypatch, request) -> tuple[Path, Path, list[str] | None]:
+    """A threshold of a sweep, which only keeps the results of dereplication"""
+    dereplicate_arguments = request.getfixturevalue('dereplicate_arguments')
+    thresholds = [0.03, 0.08]
+    sweep = dereplicate.dereplicate(**dereplicate_arguments(
+        tmp_path / 'sweep', similarity_threshold=thresholds[0], similarity_sweep=thresholds))
+    plain = dereplicate.dereplicate(**dereplicate_arguments(tmp_path / 'plain', similarity_threshold=threshold))
+    names = ['dereplicated.fas', 'excluded.fas', 'summary.tsv']
+    return plain.output_directory, sweep.output_directory / f'similarity_{threshold}', names
+
+
+@pytest.mark.parametrize('run', [
+    pytest.param(resumed_versus_all, id='resumed'),
+    pytest.param(distributed_versus_all, id='distributed'),
+    pytest.param(partial(dereplicate_sweep, 0.03), id='sweep-0.03'),
+    pytest.param(partial(dereplicate_sweep, 0.08), id='sweep-0.08'),
+])
+def test_reproduces_a_plain_run(tmp_path, monkeypatch, request, progress, tree_contents, run):
+    plain, variant, names = run(tmp_path, monkeypatch, request)
+    assert tree_contents(variant) == tree_contents(plain, names)
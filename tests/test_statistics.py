@@ -0,0 +1,78 @@
+import random
+import statistics
+
+import pytest
+
+from itaxotools.taxi2.distances import DistanceMetric
+from itaxotools.taxi2.tasks.versus_all import DistanceAggregator, GenericDistance
+
+from itaxotools.decontaminator_gui.tasks.statistics import GroupLabels, QuantileSketch, SubsetStatistics, Welford
+
+
+def sample(count: int, seed: int = 0) -> tuple[dict[str, str], list[tuple[str, str, float | None]]]:
+    rng = random.Random(seed)
+    partition = {f'id{i}': f'subset{rng.randint(0, 5)}' for i in range(count)}
+    ids = list(partition) + ['unknown']
+    distances = [
+        (x, y, None if rng.random() < 0.05 else rng.random())
+        for x in ids for y in ids]
+    return partition, distances
+
+
+def test_matches_taxi2():
+    metric = DistanceMetric.Uncorrected()
+    partition, distances = sample(40)
+    labels = GroupLabels(partition)
+    ours = SubsetStatistics(metric, labels)
+    theirs = DistanceAggregator(metric)
+    for x, y, d in distances:
+        ours.add(labels.code(x), labels.code(y), d)
+        theirs.add(GenericDistance(metric, partition.get(x), partition.get(y), d))
+    assert list(ours) == list(theirs)
+
+
+def test_sample_deviation():
+    rng = random.Random(1)
+    values = [rng.random() for _ in range(100)]
+    moments = Welford()
+    for value in values:
+        moments.add(value)
+    assert moments.stdev == pytest.approx(statistics.stdev(values))
+    assert moments.mean == sum(values) / len(values)
+
+
+def test_merge():
+    rng = random.Random(2)
+    values = [rng.random() for _ in range(100)]
+    left, right, whole = Welford(), Welford(), Welford()
+    for index, value in enumerate(values):
+        (left if index % 3 else right).add(value)
+        whole.add(value)
+    left.merge(right)
+    assert left.n == whole.n
+    assert left.variance == pytest.approx(whole.variance)
+
+
+def test_quantiles_within_accuracy():
+    rng = random.Random(3)
+    values = [rng.uniform(0.01, 1.0) for _ in range(10000)]
+    sketch = QuantileSketch(0.01)
+    for value in values:
+        sketch.add(value)
+    for q in [0.25, 0.5, 0.75]:
+        exact = statistics.quantiles(values, n=100, method='inclusive')[int(q * 100) - 1]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.02)
+
+
+def test_spread_is_opt_in():
+    metric = DistanceMetric.Uncorrected()
+    partition, distances = sample(10)
+    labels = GroupLabels(partition)
+    without = SubsetStatistics(metric, labels)
+    within = SubsetStatistics(metric, labels, accuracy=0.01)
+    for x, y, d in distances:
+        without.add(labels.code(x), labels.code(y), d)
+        within.add(labels.code(x), labels.code(y), d)
+    with pytest.raises(ValueError):
+        next(without.spread())
+    assert [(s.idx, s.idy) for s in within.spread()] == [(s.idx, s.idy) for s in within]
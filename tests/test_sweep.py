@@ -0,0 +1,39 @@
+from pathlib import Path
+
+from itaxotools.decontaminator_gui.tasks import dereplicate, length_decontamination
+
+
+def test_dereplicate_sweep_calculates_every_distance(tmp_path, progress, dereplicate_arguments):
+    thresholds = [0.03, 0.08]
+    sweep = dereplicate.dereplicate(**dereplicate_arguments(
+        tmp_path / 'sweep', similarity_threshold=thresholds[0], similarity_sweep=thresholds))
+
+    # Single runs skip pairs with excluded sequences, the sweep calculates them all
+    everything = dereplicate.dereplicate(**dereplicate_arguments(tmp_path / 'everything', similarity_threshold=0.0))
+    assert not (everything.output_directory / 'excluded.fas').read_text().strip()
+    for name in ['aligned_pairs.txt', 'distances/p.linear.tsv', 'distances/p.matricial.tsv']:
+        assert (sweep.output_directory / name).read_bytes() == (everything.output_directory / name).read_bytes()
+
+    rows = (sweep.output_directory / 'sweep.tsv').read_text().splitlines()
+    assert rows[0].split('\t') == ['similarity_threshold', 'kept', 'excluded', 'directory']
+    assert [row.split('\t')[0] for row in rows[1:]] == ['0.03', '0.08']
+    kept = [int(row.split('\t')[1]) for row in rows[1:]]
+    assert kept[0] > kept[1]
+
+
+def test_length_decontamination_sweep_runs_each_threshold_on_a_copy(tmp_path, monkeypatch, progress):
+    source = tmp_path / 'input'
+    source.mkdir()
+    (source / 'gene.fas').write_text('>a\nACGT\n')
+    calls = []
+
+    def execute(dir: str, thresh: str, **kwargs):
+        calls.append((Path(dir).name, thresh))
+        (Path(dir) / 'gene.fas').write_text(f'>a\n{thresh}\n')
+
+    monkeypatch.setattr(length_decontamination, 'execute', execute)
+    length_decontamination.execute_sweep([0.2, 0.5], dir=str(source))
+
+    assert calls == [('input_threshold_0.2', '0.2'), ('input_threshold_0.5', '0.5')]
+    assert (source / 'gene.fas').read_text() == '>a\nACGT\n'
+    assert (tmp_path / 'input_threshold_0.5' / 'gene.fas').read_text() == '>a\n0.5\n'
@@ -0,0 +1,55 @@
+import io
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from PySide6 import QtCore
+
+from itaxotools.decontaminator_gui.threading import Worker
+
+
+def wait_for(path: Path) -> str:
+    """Only returns once released, after the other command is done"""
+    deadline = time.monotonic() + 10
+    while not path.exists():
+        if time.monotonic() > deadline:
+            raise TimeoutError(path)
+        time.sleep(0.01)
+    return 'slow'
+
+
+def fast() -> str:
+    return 'fast'
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """Writes to streams of its own, since they are closed when it quits"""
+    monkeypatch.setattr('sys.stdout', io.StringIO())
+    monkeypatch.setattr('sys.stderr', io.StringIO())
+    QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    worker = Worker('Test', eager=False)
+    yield worker
+    worker.quit()
+
+
+def test_concurrent_reports_are_routed_by_id(tmp_path, worker):
+    reports = []
+    received = [threading.Event(), threading.Event()]
+
+    def collect(report):
+        reports.append(report)
+        received[len(reports) - 1].set()
+
+    worker.done.connect(collect, QtCore.Qt.DirectConnection)
+    worker.fail.connect(collect, QtCore.Qt.DirectConnection)
+
+    worker.exec_concurrent('first', wait_for, tmp_path / 'release')
+    worker.exec_concurrent('second', fast)
+
+    assert received[0].wait(30)
+    (tmp_path / 'release').touch()
+    assert received[1].wait(30)
+    assert [(report.id, report.result) for report in reports] == [('second', 'fast'), ('first', 'slow')]
+    assert not worker.pending
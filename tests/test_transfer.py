@@ -0,0 +1,49 @@
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+from itaxotools.decontaminator_gui.transfer import STAGING_OWNER, STAGING_PREFIX, publish, staging_directory
+
+
+def stage(destination, name, files):
+    staging = staging_directory(destination, name)
+    for path, text in files.items():
+        (staging / path).parent.mkdir(parents=True, exist_ok=True)
+        (staging / path).write_text(text)
+    return staging
+
+
+def test_runs_are_published_apart(tmp_path):
+    first = publish(stage(tmp_path, 'run', {'a.txt': '1', 'sub/b.txt': '2'}), tmp_path)
+    second = publish(stage(tmp_path, 'run', {'a.txt': '3'}), tmp_path)
+    assert first.destination == tmp_path / 'run'
+    assert second.destination == tmp_path / 'run_2'
+    assert (first.destination / 'a.txt').read_text() == '1'
+    assert (first.destination / 'sub' / 'b.txt').read_text() == '2'
+    assert (second.destination / 'a.txt').read_text() == '3'
+    assert not (first.destination / STAGING_OWNER).exists()
+    assert not list(tmp_path.glob(f'{STAGING_PREFIX}*'))
+
+
+def test_publish_refuses_to_overwrite(tmp_path):
+    staging = stage(tmp_path, 'run', {'a.txt': '1'})
+    (tmp_path / 'run').mkdir()
+    with pytest.raises(FileExistsError):
+        publish(staging, tmp_path)
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='owners are only probed on posix')
+def test_stale_staging_is_swept(tmp_path):
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    live = stage(tmp_path, 'live', {})
+    os.utime(live, (0, 0))
+    stale = tmp_path / f'{STAGING_PREFIX}old'
+    stale.mkdir()
+    (stale / STAGING_OWNER).write_text(f'{socket.gethostname()} {process.pid}\n')
+    stage(tmp_path, 'new', {})
+    assert not stale.exists()
+    assert live.exists()